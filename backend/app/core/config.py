@@ -1,11 +1,140 @@
 from pydantic_settings import BaseSettings
 import os
+from typing import Optional
 
 class Settings(BaseSettings):
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "your_google_api_key_here")
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "your_anthropic_api_key_here")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "your_openai_api_key_here")
 
+    # --- Server (python -m app.serve) ---
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    # uvicorn worker processes; 0 = one per CPU core. With more than one, the session store
+    # is switched to SQLite so every worker sees every conversation.
+    WORKERS: int = 1
+
+    # --- PDF ingestion and vector index ---
+    PDF_DIRECTORY: str = "pdf/"
+    # On-disk cache of per-file embeddings and the combined FAISS index.
+    # Entries are keyed by file content hash + the splitter/embedding settings below,
+    # so changing any of them simply produces new cache keys.
+    INDEX_CACHE_DIR: str = "index_cache/"
+    CHUNK_SIZE: int = 600
+    CHUNK_OVERLAP: int = 200
+    INGEST_WORKERS: int = 0 # Processes parsing and splitting PDFs; 0 = one per CPU core
+    # Below this many bytes of PDFs to parse, parsing runs in-process: starting the worker
+    # processes takes seconds, longer than parsing a few CVs. 0 always uses the workers.
+    INGEST_POOL_MIN_BYTES: int = 4_000_000
+    # Chunks per embedding call while indexing; batches span files. Local providers split
+    # each call over their EMBEDDING_WORKERS processes.
+    INGEST_EMBED_BATCH_SIZE: int = 256
+    # FAISS index type: "flat" (exact), "hnsw" (graph, approximate) or "ivf" (clustered,
+    # approximate; falls back to flat when there are too few chunks to train it).
+    VECTOR_INDEX_TYPE: str = "flat"
+    HNSW_M: int = 32
+    HNSW_EF_SEARCH: int = 64
+    IVF_NLIST: int = 0 # 0 picks about 4 * sqrt(chunks)
+    IVF_NPROBE: int = 8
+
+    # Poll pdf/ every this many seconds and hot-reload the index on changes; 0 disables.
+    INDEX_WATCH_INTERVAL_SECONDS: float = 0
+    # Token for /api/admin/* (X-Admin-Token header); admin endpoints are disabled while unset.
+    ADMIN_TOKEN: Optional[str] = None
+
+    # --- Embeddings ---
+    # "google" (Gemini API), "sentence-transformers" (local CPU model, optional package)
+    # or "hashing" (dependency-free feature hashing for tests and offline use).
+    EMBEDDING_PROVIDER: str = "google"
+    EMBEDDING_MODEL: str = "models/embedding-001" # Google provider
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    HASHING_EMBEDDING_DIM: int = 768
+    EMBEDDING_BATCH_SIZE: int = 64 # Texts per call for local providers
+    EMBEDDING_WORKERS: int = 0 # Ingestion processes for local providers; 0 = one per CPU core
+
+    # --- Retrieval ---
+    # "vector" (FAISS), "lexical" (BM25, no embedding call), "hybrid" (both, reciprocal rank
+    # fusion) or "auto" (lexical for short keyword lookups, hybrid otherwise). Requests
+    # may override it with retrievalMode.
+    RETRIEVAL_MODE: str = "auto"
+    RETRIEVAL_K: int = 3 # Chunks passed to the LLM
+    RETRIEVAL_CANDIDATES: int = 20 # Taken from each ranker before fusion
+    RRF_K: int = 60
+    LEXICAL_MAX_QUERY_TERMS: int = 2 # Longest query (in content words) that auto mode answers from BM25 alone
+
+    # --- Async chat pipeline ---
+    # Threads used for blocking FAISS searches; bounds how many run at once.
+    RETRIEVAL_MAX_WORKERS: int = 4
+    # Query embeddings: LRU of recent questions, and concurrent questions that arrive
+    # within the window are embedded together in one request.
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096
+    QUERY_EMBEDDING_BATCH_WINDOW_MS: float = 5.0
+    QUERY_EMBEDDING_MAX_BATCH: int = 64
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 100
+
+    # --- LLM client (created once per process and shared by all requests) ---
+    LLM_MODEL: str = "gemini-2.0-flash"
+    # "grpc" keeps a multiplexed HTTP/2 channel alive; "rest" is also accepted.
+    LLM_TRANSPORT: str = "grpc"
+    LLM_TIMEOUT_SECONDS: Optional[float] = 60.0
+    LLM_MAX_RETRIES: int = 2
+    # Retries wait a random time up to min(max, base * 2**attempt) ("full jitter").
+    LLM_RETRY_BASE_SECONDS: float = 0.5
+    LLM_RETRY_MAX_SECONDS: float = 8.0
+
+    # --- Admission control ---
+    LLM_MAX_CONCURRENCY: int = 16 # Simultaneous LLM calls across all requests
+    # Turns allowed to wait for an LLM slot; beyond that requests get 429 with Retry-After.
+    LLM_MAX_QUEUE: int = 64
+    # Per-user token bucket for chat requests; 0 disables it.
+    USER_RATE_LIMIT_PER_MINUTE: float = 20
+    USER_RATE_LIMIT_BURST: int = 5
+
+    # --- Conversation memory ---
+    # Tokens of recent history sent per turn; older turns are replaced by a rolling summary.
+    HISTORY_TOKEN_BUDGET: int = 2000
+    # When the budget is exceeded the window is cut back to this fraction of it.
+    HISTORY_KEEP_RATIO: float = 0.5
+    TOKENIZER_ENCODING: str = "cl100k_base"
+    # Whole prompt of one LLM step: instructions, retrieved context, job description,
+    # summary and history. The largest sections are truncated first to fit.
+    PROMPT_TOKEN_BUDGET: int = 4000
+
+    # --- Session store (chat histories, summaries, users) ---
+    # "memory": per-process LRU with TTL. "sqlite": WAL database shared by all workers.
+    SESSION_BACKEND: str = "memory"
+    SESSION_DB_PATH: str = "data/sessions.sqlite3"
+    SESSION_TTL_SECONDS: int = 7 * 24 * 3600 # Idle sessions are dropped after this long
+    SESSION_MAX_SESSIONS: int = 10000 # Memory backend only
+    SESSION_MAX_MESSAGES: int = 200 # Oldest messages beyond this are trimmed
+
+    # --- Job description fetching ---
+    WEB_FETCH_MAX_BYTES: int = 2_000_000 # Stop downloading a page after this many bytes
+    WEB_FETCH_MAX_TOKENS: int = 3000 # Extracted text is cut to this many tokens
+    WEB_CACHE_TTL_SECONDS: int = 3600 # Then revalidated with ETag / Last-Modified
+    WEB_CACHE_MAX_ENTRIES: int = 256
+    # Links in a user message are fetched alongside retrieval, before the first LLM call,
+    # so the model can answer without a tool round trip. At most this many; 0 disables.
+    URL_PREFETCH_MAX_URLS: int = 3
+    # Batch job matching (/api/match/stream): postings per request, and how many of one
+    # batch's LLM calls run at once (each also takes one of the LLM_MAX_CONCURRENCY slots).
+    MATCH_MAX_JOBS: int = 20
+    MATCH_MAX_CONCURRENCY: int = 4
+    MATCH_QUERY_MAX_CHARS: int = 500 # Start of each posting added to its retrieval query
+
+    # --- Semantic response cache (opt-in) ---
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95 # Minimum cosine similarity for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 24 * 3600
+
+    # --- Observability ---
+    LOG_LEVEL: str = "INFO" # DEBUG adds per-node tracing and full LLM prompts/responses
+    LOG_FORMAT: str = "text" # "text" or "json" (one object per line)
+    METRICS_ENABLED: bool = True # Prometheus text format at GET /metrics
+    SERVER_TIMING_HEADER: bool = False # Per-span timings in a Server-Timing response header
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,187 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# --- Metrics and timing spans ---
+# A minimal Prometheus registry (counters, histograms and callback metrics that read
+# existing stats dicts at scrape time) rendered in the text exposition format at /metrics,
+# plus span() for timing a block of code. Spans feed a histogram and, while a request is
+# being served, that request's Server-Timing header.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock() # Updated from the event loop and from worker threads
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {} # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(state)) for labels, state in self._values.items()]
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, state in values:
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (repr(bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Values read at scrape time, for stats that are already counted elsewhere."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str], read: Callable[[], Dict[LabelValues, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.read()
+        except Exception as e:
+            logger.warning("Could not read metric %s: %s", self.name, e)
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Re-registering (e.g. a module reloaded in tests) replaces the old metric.
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            samples = metric.samples()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+def callback(name: str, documentation: str, kind: str, labelnames: Sequence[str], read: Callable[[], Dict[LabelValues, float]]) -> CallbackMetric:
+    return registry.register(CallbackMetric(name, documentation, kind, labelnames, read))
+
+
+# --- Spans ---
+SPAN_SECONDS = histogram("nebula_span_seconds", "Duration of instrumented operations.", ["span"])
+
+# (span, seconds) pairs of the request being served; None outside requests.
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Server-Timing value; repeated spans (e.g. two llm_call steps) are summed."""
+    totals: Dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+        logger.debug("%s took %.1f ms", name, elapsed * 1000)
+
+
+def timed(name: str):
+    """Decorator running an async function inside span(name); keeps its signature, so
+    LangGraph still injects config/writer into decorated nodes."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
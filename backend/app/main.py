@@ -1,46 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from typing import List, Dict, Optional
+import json
+import logging
+import secrets
+import time
+from typing import List, Dict, Literal, Optional
 
 from . import models
 from pydantic import BaseModel
 # Removed SQLAlchemy imports: SessionLocal, engine, create_db_and_tables, get_db
 # Removed sqlalchemy.orm.Session import
-from .services import chat_service # Imports the whole module
+# chat_service (LangGraph, langchain_community, FAISS, Gemini) is imported by the background warm-up,
+# not here, so the server accepts connections without waiting for it.
+from .services import admission, session_store, warmup, web_fetch
+from .core import metrics
 from .core.config import settings # For API key check before init
+from .core.logging_config import configure_logging
 
 # Langchain message types for history
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 
-# In-memory storage for chat histories (user_id -> List[BaseMessage])
-# In a production app, this should be a more persistent store (Redis, DB, etc.)
-chat_histories: Dict[str, List[BaseMessage]] = {}
-
-# In-memory storage for users (email -> User model)
-in_memory_users_db: Dict[str, models.User] = {}
-next_user_id: int = 1
-# import threading # For future thread safety if needed
-# user_id_lock = threading.Lock()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Application startup...")
+    logger.info("Application startup...")
     # Removed create_db_and_tables() call
 
-    # Initialize PDF processing and vector store
-    chat_service.load_and_process_pdfs()
-    print("PDF processing attempted.")
+    # Chat histories and users live in the session store (in-memory LRU or shared SQLite)
+    session_store.initialize_session_store()
 
-    # Initialize ChatService (which builds the LangGraph)
-    if not settings.GOOGLE_API_KEY or settings.GOOGLE_API_KEY == "your_google_api_key_here":
-        print("CRITICAL WARNING: GOOGLE_API_KEY is not set in environment or .env file.")
-        print("Chat functionality will be severely impaired or non-functional.")
-    chat_service.initialize_chat_service()
-    print("Chat service initialized.")
+    # Loading the index and building the ChatService (and its LangGraph) run in the
+    # background; /readyz reports when they are done.
+    warmup.start()
 
     yield
-    print("Application shutdown...")
+    logger.info("Application shutdown...")
+    await warmup.shutdown()
+    await session_store.close_session_store()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -53,13 +53,65 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+HTTP_REQUESTS = metrics.counter("nebula_http_requests_total", "HTTP requests by route and status.", ["method", "route", "status"])
+HTTP_SECONDS = metrics.histogram("nebula_http_request_seconds", "Time to the response headers, by route.", ["method", "route"])
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    # Spans recorded while this request runs are collected for its Server-Timing header.
+    timings = metrics.start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    # Route templates, not raw paths, keep the label set bounded.
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_REQUESTS.inc(request.method, path, str(response.status_code))
+    HTTP_SECONDS.observe(elapsed, request.method, path)
+    # Streamed bodies are still running when the headers go out, so only complete responses get the header.
+    if settings.SERVER_TIMING_HEADER and not response.headers.get("content-type", "").startswith("text/event-stream"):
+        timings.append(("total", elapsed))
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings)
+    return response
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process serves requests. Fails only if warm-up crashed."""
+    if warmup.status["state"] == "failed":
+        raise HTTPException(status_code=503, detail=f"Warm-up failed: {warmup.status['error']}")
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: the index is loaded and the chat service is built."""
+    report = warmup.readiness()
+    if not report["ready"]:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+WARMUP_RETRY_AFTER_SECONDS = 2
+
+def loaded_chat_service():
+    """The chat_service module, or 503 while warm-up is still running."""
+    if warmup.chat_service is None:
+        if warmup.status["state"] == "failed":
+            raise HTTPException(status_code=503, detail="Service failed to start.")
+        raise HTTPException(status_code=503, detail="Service is starting up.", headers={"Retry-After": str(WARMUP_RETRY_AFTER_SECONDS)})
+    return warmup.chat_service
+
+def get_chat_service():
+    service = loaded_chat_service().get_chat_service()
+    if not service:
+        raise HTTPException(status_code=503, detail="Chat service is not available.")
+    return service
+
 @app.post("/api/chat/start", response_model=models.UserResponse)
-def start_chat(user_data: models.UserCreate): # Removed db: Session = Depends(get_db)
-    global next_user_id, in_memory_users_db
+async def start_chat(user_data: models.UserCreate): # Removed db: Session = Depends(get_db)
+    store = session_store.get_session_store()
 
-    if user_data.email in in_memory_users_db:
-        existing_user = in_memory_users_db[user_data.email]
-        print(f"Existing user found: {existing_user.userID}")
+    existing_user = await store.get_user(user_data.email)
+    if existing_user:
+        logger.info("Existing user found: %s", existing_user.userID)
         # Ensure all fields are populated for the response
         return models.UserResponse(
             userID=existing_user.userID,
@@ -69,19 +121,9 @@ def start_chat(user_data: models.UserCreate): # Removed db: Session = Depends(ge
             position=existing_user.position
         )
 
-    # with user_id_lock: # If using threading.Lock
-    current_id = next_user_id
-    next_user_id += 1
-
-    new_user = models.User(
-        userID=str(current_id), # Assign the new userID
-        name=user_data.name,
-        email=user_data.email,
-        organisation=user_data.organisation,
-        position=user_data.position
-    )
-    in_memory_users_db[new_user.email] = new_user
-    print(f"New user created with ID: {new_user.userID}")
+    # The store allocates the userID atomically (also across workers for SQLite)
+    new_user = await store.create_user(user_data)
+    logger.info("New user created with ID: %s", new_user.userID)
 
     return models.UserResponse(
         userID=new_user.userID,
@@ -95,10 +137,11 @@ def start_chat(user_data: models.UserCreate): # Removed db: Session = Depends(ge
 class ChatRequest(BaseModel):
     message: str
     userId: str # Changed from userID to userId to match frontend examples if any, stick to camelCase
+    retrievalMode: Optional[Literal["auto", "vector", "lexical", "hybrid"]] = None # Defaults to settings.RETRIEVAL_MODE
 
 class ChatResponse(BaseModel):
     response: str
-    history: List[Dict] # For frontend to reconstruct (sender, text)
+    history: List[Dict] # Messages added by this turn (sender, text); earlier turns are not resent
 
 def convert_messages_to_dict(messages: List[BaseMessage]) -> List[Dict]:
     output = []
@@ -116,6 +159,24 @@ def convert_messages_to_dict(messages: List[BaseMessage]) -> List[Dict]:
         # ToolMessage is not directly shown to user, it's part of the AI's internal thought process
     return output
 
+def admit_turn(user_id: str, key) -> Optional[admission.Ticket]:
+    """Admission for one chat turn: None if an identical request is already running (this
+    one will share its result), else a ticket to release when the turn ends.
+
+    Raises 429 with Retry-After when the user is over their rate or the LLM queue is full.
+    """
+    if admission.coalescer.in_flight(key):
+        return None
+    try:
+        admission.user_limiter.check(user_id)
+        try:
+            return admission.llm_limiter.admit()
+        except admission.Rejected:
+            admission.user_limiter.refund(user_id) # A busy server should not use up the user's rate
+            raise
+    except admission.Rejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest): # Removed db: Session = Depends(get_db)
     user_id_str = str(request.userId)
@@ -124,28 +185,165 @@ async def chat_endpoint(request: ChatRequest): # Removed db: Session = Depends(g
     if not user_id_str or not user_message_content:
         raise HTTPException(status_code=400, detail="userId and message are required")
 
-    # Retrieve or initialize chat history for the user
-    current_history = chat_histories.get(user_id_str, [])
+    # Get the chat service instance (503 with Retry-After during warm-up)
+    service = get_chat_service()
 
-    # Get the chat service instance
-    service = chat_service.get_chat_service()
-    if not service:
-        raise HTTPException(status_code=503, detail="Chat service is not available.")
+    # Double submits of the same message share one run and get the same response.
+    key = ("chat", user_id_str, user_message_content, request.retrievalMode)
+    ticket = admit_turn(user_id_str, key)
+
+    async def run_turn() -> ChatResponse:
+        with ticket:
+            # Retrieve the stored conversation (empty for new or expired sessions)
+            store = session_store.get_session_store()
+            session = await store.get_session(user_id_str)
+
+            ai_response_content, new_messages = await service.process_message(
+                user_id=user_id_str,
+                user_message_content=user_message_content,
+                session=session,
+                retrieval_mode=request.retrievalMode
+            )
+
+            # Append this turn to the stored history (no copy of earlier turns)
+            await store.append_messages(user_id_str, new_messages)
+
+            return ChatResponse(
+                response=ai_response_content,
+                history=convert_messages_to_dict(new_messages) # Only the messages added by this turn
+            )
+
+    return await admission.coalescer.run(key, run_turn)
+
+def format_sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Same turn as /api/chat, streamed as Server-Sent Events.
 
-    ai_response_content, updated_history = service.process_message(
-        user_id=user_id_str,
-        user_message_content=user_message_content,
-        current_history=current_history
+    Emits "progress" and "token" events while the graph runs, then a single "done"
+    (response + history) or "error" event. History is committed only on "done".
+    """
+    user_id_str = str(request.userId)
+    user_message_content = request.message
+
+    if not user_id_str or not user_message_content:
+        raise HTTPException(status_code=400, detail="userId and message are required")
+
+    service = get_chat_service()
+
+    key = ("stream", user_id_str, user_message_content, request.retrievalMode)
+    ticket = admit_turn(user_id_str, key)
+
+    async def event_stream():
+        with ticket:
+            store = session_store.get_session_store()
+            session = await store.get_session(user_id_str)
+            async for event, payload in service.stream_message(
+                user_id=user_id_str,
+                user_message_content=user_message_content,
+                session=session,
+                retrieval_mode=request.retrievalMode
+            ):
+                if event == "done":
+                    # Commit exactly once, when the run has completed successfully.
+                    await store.append_messages(user_id_str, payload["messages"])
+                    payload = {
+                        "response": payload["response"],
+                        "history": convert_messages_to_dict(payload["messages"])
+                    }
+                yield format_sse(event, payload)
+
+    # The run is shared with identical requests and replayed to each from the first event;
+    # it finishes (and commits the turn) even if a client disconnects.
+    return StreamingResponse(
+        admission.coalescer.stream(key, event_stream),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Disable proxy buffering
     )
 
-    # Store the updated history
-    chat_histories[user_id_str] = updated_history
+class MatchRequest(BaseModel):
+    userId: str
+    jobs: List[str] # Job posting URLs or pasted job descriptions, one per entry
+    question: Optional[str] = None # Asked about every job; defaults to an overall fit assessment
+    retrievalMode: Optional[Literal["auto", "vector", "lexical", "hybrid"]] = None
+
+@app.post("/api/match/stream")
+async def match_stream_endpoint(request: MatchRequest):
+    """Matches Nebula against many job postings at once, streamed as Server-Sent Events.
+
+    Emits one "match" event per job (index, url, response, error) as soon as it is
+    ready, so in order of completion, then a single "done" event. The batch is one
+    admitted request and is not added to the user's chat history.
+    """
+    user_id_str = str(request.userId)
+    jobs = [job.strip() for job in request.jobs]
+
+    if not user_id_str or not jobs or not all(jobs):
+        raise HTTPException(status_code=400, detail="userId and at least one non-empty job are required")
+    if len(jobs) > settings.MATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MATCH_MAX_JOBS} jobs can be matched per request")
+
+    service = get_chat_service()
 
-    return ChatResponse(
-        response=ai_response_content,
-        history=convert_messages_to_dict(updated_history) # Send full history for this turn
+    key = ("match", user_id_str, tuple(jobs), request.question, request.retrievalMode)
+    ticket = admit_turn(user_id_str, key)
+
+    async def event_stream():
+        with ticket:
+            async for event, payload in service.stream_job_matches(jobs, request.question, request.retrievalMode):
+                yield format_sse(event, payload)
+
+    return StreamingResponse(
+        admission.coalescer.stream(key, event_stream),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Disable proxy buffering
     )
 
+@app.get("/api/cache/stats")
+def cache_stats():
+    chat_service = warmup.chat_service
+    service = chat_service.get_chat_service() if chat_service else None
+    semantic = service.semantic_cache.stats() if service and service.semantic_cache else {"enabled": False}
+    embeddings = chat_service.embeddings_instance if chat_service else None
+    query_embeddings = embeddings.stats if embeddings is not None else {}
+    return {
+        "semantic": semantic,
+        "query_embeddings": query_embeddings,
+        "job_pages": web_fetch.stats,
+        "admission": dict(admission.llm_limiter.stats(), rate_limited=admission.user_limiter.rejected, coalesced=admission.coalescer.coalesced),
+    }
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them.")
+    if not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+@app.post("/api/admin/reload-index", dependencies=[Depends(require_admin)])
+async def reload_index(wait: bool = False):
+    """Rebuilds the PDF index and swaps it in without interrupting requests.
+
+    Runs in the background and returns immediately unless wait=true; poll
+    GET /api/admin/index for the outcome.
+    """
+    chat_service = loaded_chat_service()
+    if wait:
+        return await chat_service.reload_index()
+    started = chat_service.schedule_index_reload()
+    return {"status": "started" if started else "already_running"}
+
+@app.get("/api/admin/index", dependencies=[Depends(require_admin)])
+def index_status():
+    return loaded_chat_service().index_status()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Nebula AI Chat API - V2 with LangGraph"}
@@ -0,0 +1,45 @@
+"""Runs the API under uvicorn with settings.WORKERS worker processes.
+
+Usage (from backend/):
+    python -m app.serve [--host 0.0.0.0] [--port 8000] [--workers 4]
+
+Workers share the on-disk index cache: the first one to start builds a missing index and
+the others memory-map the saved copy, so the FAISS vectors and chunk texts are held once
+in the OS page cache rather than once per process.
+"""
+import argparse
+import logging
+import os
+
+import uvicorn
+
+from .core.config import settings
+from .core.logging_config import configure_logging
+
+logger = logging.getLogger("app.serve") # __name__ is "__main__" under python -m
+
+
+def worker_count(requested: int) -> int:
+    return requested if requested > 0 else (os.cpu_count() or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WORKERS, help="0: one per CPU core")
+    args = parser.parse_args()
+
+    configure_logging()
+    workers = worker_count(args.workers)
+    if workers > 1 and settings.SESSION_BACKEND.lower() == "memory":
+        # Consecutive turns of one user can reach different workers, so sessions must be
+        # shared. Workers are spawned and read their settings from the environment.
+        logger.warning("%d workers need a shared session store; using SESSION_BACKEND=sqlite at %s.", workers, settings.SESSION_DB_PATH)
+        os.environ["SESSION_BACKEND"] = "sqlite"
+    logger.info("Starting %d worker(s) on %s:%d.", workers, args.host, args.port)
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple, TypeVar
+
+from ..core import metrics
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Admission control ---
+# Turns are admitted up to LLM_MAX_CONCURRENCY running plus LLM_MAX_QUEUE waiting; beyond
+# that a request is turned away at once with a Retry-After estimate instead of queueing
+# until it times out. Inside a turn every LLM call takes one of LLM_MAX_CONCURRENCY slots,
+# and failed calls are retried with jittered backoff outside the slot. Each user also has
+# a token bucket, and identical requests that arrive while one is running share its run.
+
+T = TypeVar("T")
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after)) # Whole seconds for the Retry-After header
+
+
+class Ticket:
+    """An admitted turn; release() is idempotent."""
+
+    def __init__(self, limiter: "LLMLimiter"):
+        self._limiter = limiter
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._finish_turn(time.monotonic() - self._started)
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LLMLimiter:
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.admitted = 0 # Turns running or waiting
+        self.active_calls = 0
+        self.rejected = 0
+        # Moving average of a turn's duration, for Retry-After. Starts at a typical turn.
+        self._turn_seconds = 2.0
+        self._semaphore: Optional[asyncio.Semaphore] = None # Created on the serving loop
+
+    def admit(self) -> Ticket:
+        """Admits a turn or raises Rejected when the queue is full."""
+        if self.admitted >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            # The queue drains max_concurrency turns per turn duration.
+            waiting = self.admitted - self.max_concurrency + 1
+            raise Rejected("Server busy", self._turn_seconds * waiting / self.max_concurrency)
+        self.admitted += 1
+        return Ticket(self)
+
+    def _finish_turn(self, seconds: float):
+        self.admitted -= 1
+        self._turn_seconds = 0.9 * self._turn_seconds + 0.1 * seconds
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self.active_calls += 1
+            try:
+                yield
+            finally:
+                self.active_calls -= 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "admitted": self.admitted,
+            "active_calls": self.active_calls,
+            "rejected": self.rejected,
+            "turn_seconds": round(self._turn_seconds, 3),
+        }
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: uniform over [0, min(cap, base * 2**attempt)], so clients that failed
+    together do not retry together."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def call_with_retries(
+    call: Callable[[], Awaitable[T]],
+    limiter: LLMLimiter,
+    retryable: Callable[[BaseException], bool],
+    retries: Optional[int] = None,
+    on_retry: Optional[Callable[[int, BaseException], None]] = None,
+) -> T:
+    """Runs call inside an LLM slot, retrying retryable errors with jittered backoff.
+    The slot is released while waiting, so a backing-off call does not hold up others.
+    on_retry(attempt, error) is called before each retry."""
+    retries = settings.LLM_MAX_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            async with limiter.slot():
+                return await call()
+        except Exception as e:
+            if attempt >= retries or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, settings.LLM_RETRY_BASE_SECONDS, settings.LLM_RETRY_MAX_SECONDS)
+            logger.warning("LLM call failed (%s: %s), retry %d/%d in %.2fs.", type(e).__name__, e, attempt + 1, retries, delay)
+            attempt += 1
+            if on_retry is not None:
+                on_retry(attempt, e)
+            await asyncio.sleep(delay)
+
+
+class UserRateLimiter:
+    """Token bucket per user: burst requests at once, refilled at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_users: int = 100_000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_users = max_users
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict() # user -> (tokens, updated)
+
+    def check(self, user_id: str):
+        """Takes a token for user_id or raises Rejected. A rate of 0 disables the limit."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(user_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            self.rejected += 1
+            raise Rejected("Too many requests", (1 - tokens) / self.rate)
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False) # Least recently seen user; a fresh bucket is full anyway
+
+    def refund(self, user_id: str):
+        """Gives back the token taken by check() for a request that was rejected later on."""
+        if user_id in self._buckets:
+            tokens, updated = self._buckets[user_id]
+            self._buckets[user_id] = (min(float(self.burst), tokens + 1), updated)
+
+
+class _Broadcast:
+    """Items of one stream, replayed to every subscriber from the start."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, item: Any):
+        self.items.append(item)
+        self._notify()
+
+    def close(self, error: Optional[BaseException] = None):
+        self.error = error
+        self.closed = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.items):
+                yield self.items[position]
+                position += 1
+            if self.closed:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class Coalescer:
+    """Identical requests that arrive while one is running share its result.
+
+    The shared work runs in its own task, so it completes (and commits the turn) even if
+    the client that started it disconnects while others are still waiting.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            task = asyncio.get_running_loop().create_task(self._pump(key, broadcast, factory()))
+            self._tasks.add(task) # Keep a reference until it finishes
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.coalesced += 1
+        return broadcast.subscribe()
+
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, items: AsyncIterator[Any]):
+        try:
+            async for item in items:
+                broadcast.publish(item)
+        except asyncio.CancelledError:
+            broadcast.close(RuntimeError("Stream cancelled"))
+            raise
+        except Exception as e:
+            broadcast.close(e)
+        else:
+            broadcast.close()
+        finally:
+            self._streams.pop(key, None)
+
+
+llm_limiter = LLMLimiter(settings.LLM_MAX_CONCURRENCY, settings.LLM_MAX_QUEUE)
+user_limiter = UserRateLimiter(settings.USER_RATE_LIMIT_PER_MINUTE, settings.USER_RATE_LIMIT_BURST)
+coalescer = Coalescer()
+
+metrics.callback(
+    "nebula_admission_turns", "Admitted chat turns (running or waiting) and LLM calls in progress.", "gauge", ["state"],
+    lambda: {("admitted",): llm_limiter.admitted, ("llm_calls",): llm_limiter.active_calls},
+)
+metrics.callback(
+    "nebula_admission_rejections_total", "Chat requests answered with 429.", "counter", ["reason"],
+    lambda: {("queue_full",): llm_limiter.rejected, ("rate_limited",): user_limiter.rejected},
+)
+metrics.callback(
+    "nebula_coalesced_requests_total", "Requests that joined an identical request already running.", "counter", [],
+    lambda: {(): coalescer.coalesced},
+)
@@ -0,0 +1,85 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+# --- Lexical (BM25) index over the indexed chunks ---
+# Rows are the FAISS rows of the same store, so lexical and vector results can be fused
+# and mapped back to documents through index_to_docstore_id. Built in memory from the
+# docstore at ingestion time (also when the FAISS index comes from the cache); a few
+# thousand CV chunks take milliseconds.
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+# Dropped from queries only: they say nothing about which chunk is relevant.
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have he her his how i if in is it its
+me my of on or our she so tell that the their them they this to us was we were what when where which who why
+will with would you your about any anything know experience nebula s t
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct content terms of a query, in order."""
+    return list(dict.fromkeys(t for t in tokenize(query) if t not in STOPWORDS))
+
+
+class BM25Index:
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, tf))
+        self.avg_length = float(lengths.mean()) if self.size else 0.0
+        # Length normalization is per document, so it is folded in once here.
+        norms = k1 * (1 - b + b * lengths / (self.avg_length or 1.0))
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            rows = np.fromiter((r for r, _ in entries), dtype=np.int64, count=len(entries))
+            tf = np.fromiter((f for _, f in entries), dtype=np.float32, count=len(entries))
+            idf = math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[term] = (rows, (idf * tf * (k1 + 1) / (tf + norms[rows])).astype(np.float32))
+
+    @classmethod
+    def from_vector_store(cls, vector_store: FAISS) -> "BM25Index":
+        texts = []
+        for row in range(len(vector_store.index_to_docstore_id)):
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[row])
+            texts.append(doc.page_content if hasattr(doc, "page_content") else "")
+        return cls(texts)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._postings
+
+    def is_keyword_query(self, query: str, max_terms: int) -> bool:
+        """A short lookup whose every term occurs in the corpus, e.g. 'Kubernetes' or
+        'PyTorch at Acme' -- BM25 answers these as well as a vector search would."""
+        terms = query_terms(query)
+        return 0 < len(terms) <= max_terms and all(t in self._postings for t in terms)
+
+    def search(self, query: str, k: int, terms: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """Top k (row, score) pairs; rows without any query term are never returned."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in terms if terms is not None else query_terms(query):
+            posting = self._postings.get(term)
+            if posting is not None:
+                rows, weights = posting
+                scores[rows] += weights
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(row), float(scores[row])) for row in ranked]
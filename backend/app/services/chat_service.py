@@ -1,229 +1,544 @@
+import asyncio
+import logging
 import os
-import httpx
-from typing import List, Optional, TypedDict, Annotated
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, TypedDict, Annotated
+import operator
+from dataclasses import dataclass
 from operator import itemgetter
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI # Reverted to Google
+import numpy as np
+from langchain_google_genai import ChatGoogleGenerativeAI # Reverted to Google
 from langchain_community.vectorstores import FAISS
 # Removed OpenAIEmbeddings and ChatAnthropic imports as they are no longer used
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.runnables import RunnablePassthrough, RunnableLambda, RunnableConfig
 from langchain_core.tools import tool
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import StreamWriter
 # from langgraph.checkpoint.sqlite import SqliteSaver # For more robust history/state if needed later
 from langchain_experimental.pydantic_v1 import BaseModel, Field # Use v1 for Langchain compatibility
+from google.api_core import exceptions as google_exceptions
 
+from ..core import metrics
 from ..core.config import settings
+from . import admission, context, ingestion
+from . import session_store, web_fetch
+from .bm25 import BM25Index
+from .embeddings import CachedQueryEmbeddings, create_embeddings
+from .memory import ConversationMemory, ConversationSummary, count_tokens, message_text
+from .semantic_cache import SemanticCache
+from .session_store import Session
 import glob
 
 import getpass
 
+logger = logging.getLogger(__name__)
+
 # --- PDF Processing and Vector Store (from previous step) ---
-vector_store_instance: Optional[FAISS] = None
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """A built index and its version, replaced as a whole on reload.
+
+    Each request reads the current snapshot once and keeps it, so an index swapped in
+    while the request runs never changes its retrieval or semantic cache version.
+    """
+    vector_store: Optional[FAISS] = None
+    # Changes whenever the indexed PDFs change; answers cached against an older version are dropped.
+    version: Optional[str] = None
+    report: Optional[ingestion.IngestionReport] = None # Per-file status and timings of the build
+    loaded_at: float = 0.0
+    lexical_index: Optional[BM25Index] = None # Same rows as vector_store's FAISS index
+
+index_snapshot = IndexSnapshot()
+embeddings_instance: Optional[CachedQueryEmbeddings] = None
+
+def get_embeddings() -> CachedQueryEmbeddings:
+    """Embedding client shared by indexing, retrieval and the semantic cache.
+
+    The provider comes from settings.EMBEDDING_PROVIDER. Query embeddings are cached and
+    micro-batched, so the semantic cache lookup and the retrieval step of the same turn
+    cost a single embedding call between them.
+    """
+    global embeddings_instance
+    if embeddings_instance is None:
+        embeddings_instance = CachedQueryEmbeddings(
+            create_embeddings(),
+            cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            batch_window_ms=settings.QUERY_EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=settings.QUERY_EMBEDDING_MAX_BATCH,
+            # Gemini embeds questions with a different task type than documents
+            query_task_type="retrieval_query" if settings.EMBEDDING_PROVIDER.lower() == "google" else None,
+        )
+    return embeddings_instance
+
+def _pdf_files() -> List[str]:
+    return sorted(glob.glob(os.path.join(settings.PDF_DIRECTORY, "*.pdf")))
+
+def _build_snapshot(pdf_files: List[str]) -> IndexSnapshot:
+    # Only PDFs that are new or changed since the last build are parsed and embedded;
+    # an unchanged pdf/ directory loads the saved FAISS index straight from disk.
+    report = ingestion.ingest(pdf_files, get_embeddings())
+    get_embeddings().close() # Ingestion is done; release any local embedding worker processes
+    return IndexSnapshot(
+        report.vector_store, report.version, report, loaded_at=time.time(), lexical_index=report.lexical_index
+    )
 
 def load_and_process_pdfs():
-    global vector_store_instance
-    if vector_store_instance is not None:
-        print("Vector store already initialized.")
-        return vector_store_instance
+    global index_snapshot
+    if index_snapshot.vector_store is not None:
+        logger.info("Vector store already initialized.")
+        return index_snapshot.vector_store
 
-    pdf_directory = "pdf/"
-    pdf_files = glob.glob(os.path.join(pdf_directory, "*.pdf"))
+    pdf_files = _pdf_files()
     if not pdf_files:
-        print("No PDF files found. Vector store will be empty or not initialized.")
-        documents = []
-    else:
-        all_docs = []
-        for pdf_path in pdf_files:
-            try:
-                loader = PyPDFLoader(pdf_path)
-                docs = loader.load()
-                all_docs.extend(docs)
-            except Exception as e:
-                print(f"Error loading PDF {pdf_path}: {e}")
-
-        if not all_docs: documents = []
-        else:
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=200)
-            documents = text_splitter.split_documents(all_docs)
-            print(f"Split into {len(documents)} chunks.")
-
-    if not documents:
-        print("No documents to process. Vector store cannot be created.")
-        vector_store_instance = None
+        logger.warning("No PDF files found. Vector store will be empty or not initialized.")
         return None
 
     try:
-        print(f"Initializing GoogleGenerativeAIEmbeddings with API key: {settings.GOOGLE_API_KEY[:15]}...") # Reverted
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=settings.GOOGLE_API_KEY) # Reverted
-        vector_store_instance = FAISS.from_documents(documents, embeddings)
-        print("FAISS vector store created with Google embeddings.") # Reverted
+        index_snapshot = _build_snapshot(pdf_files)
     except Exception as e:
-        print(f"Error during embedding or FAISS creation: {e}")
-        vector_store_instance = None
+        logger.exception("Error during embedding or FAISS creation: %s", e)
 
-    return vector_store_instance
+    return index_snapshot.vector_store
 
 def get_vector_store():
-    return vector_store_instance
+    return index_snapshot.vector_store
+
+# --- Hot reload ---
+# The index is rebuilt on a worker thread while requests keep using the current snapshot;
+# the new one is swapped in with a single assignment once it is complete.
+_reload_lock: Optional[asyncio.Lock] = None
+_reload_task: Optional[asyncio.Task] = None
+_watcher_task: Optional[asyncio.Task] = None
+reload_status: Dict[str, Any] = {"running": False, "started_at": None, "finished_at": None, "result": None}
+
+def swap_index_snapshot(snapshot: IndexSnapshot):
+    global index_snapshot
+    index_snapshot = snapshot
+    if chat_service_instance is not None and chat_service_instance.semantic_cache is not None:
+        # Cached answers may quote documents that are no longer indexed
+        chat_service_instance.semantic_cache.reset(snapshot.version)
+
+async def reload_index() -> Dict[str, Any]:
+    """Rebuilds the index from pdf/ and swaps it in if it changed. One reload runs at a time."""
+    global _reload_lock
+    if _reload_lock is None:
+        _reload_lock = asyncio.Lock()
+    async with _reload_lock:
+        reload_status.update(running=True, started_at=time.time())
+        previous = index_snapshot
+        try:
+            pdf_files = _pdf_files()
+            loop = asyncio.get_running_loop()
+            snapshot = await loop.run_in_executor(None, _build_snapshot, pdf_files)
+            if snapshot.version == previous.version:
+                result = {"status": "unchanged", "version": previous.version}
+            elif snapshot.vector_store is None and pdf_files:
+                # Every PDF failed; keep serving the previous index rather than an empty one.
+                result = {"status": "failed", "version": previous.version}
+            else:
+                swap_index_snapshot(snapshot)
+                result = {"status": "swapped", "version": snapshot.version, "previous_version": previous.version}
+            result["ingestion"] = snapshot.report.summary() if snapshot.report else None
+        except Exception as e:
+            logger.exception("Error reloading the PDF index: %s", e)
+            result = {"status": "failed", "version": previous.version, "error": str(e)}
+        logger.info("Index reload finished: %s (version %.12s).", result["status"], result["version"])
+        reload_status.update(running=False, finished_at=time.time(), result=result)
+        return result
+
+def schedule_index_reload() -> bool:
+    """Starts reload_index in the background. False if a reload is already running."""
+    global _reload_task
+    if _reload_task is not None and not _reload_task.done():
+        return False
+    _reload_task = asyncio.get_running_loop().create_task(reload_index())
+    return True
+
+def index_status() -> Dict[str, Any]:
+    snapshot = index_snapshot
+    return {
+        "version": snapshot.version,
+        "chunks": snapshot.vector_store.index.ntotal if snapshot.vector_store is not None else 0,
+        "loaded_at": snapshot.loaded_at,
+        "ingestion": snapshot.report.summary() if snapshot.report else None,
+        "reload": reload_status,
+    }
+
+def _pdf_directory_signature() -> Tuple:
+    signature = []
+    for path in _pdf_files():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+async def watch_pdf_directory(interval: float):
+    """Polls pdf/ and reloads once a change has been stable for one interval,
+    so a PDF that is still being copied in is not indexed half-written."""
+    seen = _pdf_directory_signature()
+    candidate = seen
+    while True:
+        await asyncio.sleep(interval)
+        current = _pdf_directory_signature()
+        if current != seen and current == candidate:
+            logger.info("Change in the PDF directory detected, reloading the index.")
+            await reload_index()
+            seen = current
+        candidate = current
+
+def start_index_watcher():
+    global _watcher_task
+    if settings.INDEX_WATCH_INTERVAL_SECONDS > 0 and _watcher_task is None:
+        _watcher_task = asyncio.get_running_loop().create_task(watch_pdf_directory(settings.INDEX_WATCH_INTERVAL_SECONDS))
+        logger.info("Watching %s for changes every %ss.", settings.PDF_DIRECTORY, settings.INDEX_WATCH_INTERVAL_SECONDS)
 
 # --- Tool Definition ---
 class FetchWebsiteArgs(BaseModel):
     url: str = Field(..., description="The URL of the website to fetch content from, specifically for a job description.")
 
 @tool("fetch_job_description_content", args_schema=FetchWebsiteArgs)
-def fetch_website_content(url: str) -> str:
+async def fetch_website_content(url: str) -> str:
     '''Fetches plain text content from a given URL, intended for job descriptions.
     Args: url (str): The URL of the job description.
     Returns: str: The text content of the page or an error message.
     '''
-    try:
-        print(f"Fetching website content from URL: {url}")
-        # Some websites block default user-agents, so use a common one.
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        with httpx.Client(timeout=10.0, follow_redirects=True) as client:
-            response = client.get(url, headers=headers)
-            response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-            # Basic content extraction, could be improved with BeautifulSoup for complex sites
-            # For now, assume it's mostly text or use response.text directly.
-            # Let's try to get text, might need a more sophisticated parser for complex HTML.
-            # For now, just returning .text is fine.
-            print(f"Successfully fetched content from {url}.") # Get text with newlines for readability
-            return response.text
-    except httpx.HTTPStatusError as e:
-        print(f"HTTP error fetching {url}: {e.response.status_code} - {e.response.text}")
-        return f"Error: Could not fetch content due to HTTP status {e.response.status_code}."
-    except httpx.RequestError as e:
-        print(f"Request error fetching {url}: {e}")
-        return f"Error: Could not fetch content from URL {url}. Request failed: {type(e).__name__}"
-    except Exception as e:
-        print(f"Unexpected error fetching {url}: {e}")
-        return f"Error: An unexpected error occurred while fetching content from {url}."
+    # Pooled client, cached per URL and reduced to readable text within a token cap
+    return await web_fetch.fetch_text(url)
+
+URL_PATTERN = re.compile(r"https?://\S+", re.IGNORECASE)
+
+def normalize_url(url: str) -> str:
+    """Drops punctuation that ends a sentence rather than the URL ("see https://x/job.")."""
+    return url.strip().rstrip(".,;:!?)]}>'\"")
+
+def extract_urls(text: str, limit: int) -> List[str]:
+    """Distinct URLs in text, in order of appearance, at most limit."""
+    urls: List[str] = []
+    for match in URL_PATTERN.finditer(text):
+        url = normalize_url(match.group(0))
+        if url not in urls:
+            urls.append(url)
+    return urls[:max(limit, 0)]
+
+def is_fetch_error(text: str) -> bool:
+    return text.startswith("Error:") # fetch_text reports failures as text for the LLM
 
 # --- LangGraph State Definition ---
 class GraphState(TypedDict):
-    messages: List[BaseMessage]
+    # Messages of the current turn only (user message, AI replies, tool results). Nodes
+    # return just what they add; the reducer appends it to this short list.
+    messages: Annotated[List[BaseMessage], operator.add]
+    # Token-budgeted window of earlier turns, passed by reference and never rewritten.
+    history: List[BaseMessage]
+    conversation_summary: Optional[str] # Rolling summary of turns outside the history window
     retrieved_docs: Optional[List[str]] # Storing content of docs
     job_url: Optional[str] # If user provides a URL for a job
+    # URL -> page text fetched in this turn (prefetched or by the tool), so a URL the model
+    # asks for again is not fetched twice.
+    fetched_pages: Optional[Dict[str, str]]
     # user_info: Optional[dict] # Example: {"name": "John Doe"}
     # Store the invocation of the tool to pass back to the LLM
     tool_invocations: Optional[List[ToolMessage]]
 
 
+# --- Metrics ---
+RETRIEVALS = metrics.counter("nebula_retrievals_total", "Retrieval steps by the mode actually used.", ["mode"])
+LLM_CALLS = metrics.counter("nebula_llm_calls_total", "LLM steps by outcome.", ["outcome"])
+# source="usage" when the model reported the counts, "estimate" when they were counted locally
+LLM_TOKENS = metrics.counter("nebula_llm_tokens_total", "Prompt and completion tokens of LLM steps.", ["kind", "source"])
+# stage="raw" is what the section held, "sent" what was left after deduplication and the budget
+PROMPT_SECTION_TOKENS = metrics.counter("nebula_prompt_section_tokens_total", "Prompt tokens of LLM steps by section.", ["section", "stage"])
+
+def record_token_usage(prompt: context.PromptContext, response_message: BaseMessage):
+    for section in context.SECTIONS:
+        PROMPT_SECTION_TOKENS.inc(section, "raw", amount=prompt.raw_tokens[section])
+        PROMPT_SECTION_TOKENS.inc(section, "sent", amount=prompt.tokens[section])
+    usage = getattr(response_message, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        LLM_TOKENS.inc("prompt", "usage", amount=usage["input_tokens"])
+        LLM_TOKENS.inc("completion", "usage", amount=usage.get("output_tokens") or 0)
+        return
+    LLM_TOKENS.inc("prompt", "estimate", amount=sum(prompt.tokens.values()))
+    LLM_TOKENS.inc("completion", "estimate", amount=count_tokens(message_text(response_message)))
+
+def _index_metrics() -> Dict[Tuple[str, ...], float]:
+    snapshot = index_snapshot
+    return {(): snapshot.vector_store.index.ntotal if snapshot.vector_store is not None else 0}
+
+def _query_embedding_metrics() -> Dict[Tuple[str, ...], float]:
+    stats = embeddings_instance.stats if embeddings_instance is not None else {}
+    return {(result,): stats.get(key, 0) for result, key in (("hit", "hits"), ("miss", "misses"))}
+
+def _semantic_cache_metrics() -> Dict[Tuple[str, ...], float]:
+    cache = chat_service_instance.semantic_cache if chat_service_instance is not None else None
+    stats = cache.stats() if cache is not None else {}
+    return {(result,): stats.get(key, 0) for result, key in (("hit", "hits"), ("miss", "misses"), ("bypass", "bypassed"))}
+
+metrics.callback("nebula_index_chunks", "Chunks in the serving FAISS index.", "gauge", [], _index_metrics)
+metrics.callback("nebula_query_embedding_cache_total", "Query embedding cache lookups.", "counter", ["result"], _query_embedding_metrics)
+metrics.callback("nebula_semantic_cache_total", "Semantic response cache lookups.", "counter", ["result"], _semantic_cache_metrics)
+
+
 # --- LangGraph Nodes ---
-def retrieve_documents_node(state: GraphState):
-    print("---NODE: Retrieving documents---")
+# The query is embedded asynchronously (cached and batched with concurrent turns), then the
+# blocking FAISS search runs on a small bounded pool instead of stalling the event loop.
+# BM25 lookups are in-memory array sums and run inline.
+_retrieval_executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval")
+
+def request_snapshot(config: Optional[RunnableConfig]) -> IndexSnapshot:
+    """The snapshot pinned for this request by ChatService, else the current one."""
+    snapshot = ((config or {}).get("configurable") or {}).get("index_snapshot")
+    return snapshot if snapshot is not None else index_snapshot
+
+# "vector": FAISS only. "lexical": BM25 only, no embedding call. "hybrid": both, fused
+# with reciprocal rank fusion. "auto": lexical for short keyword lookups, else hybrid.
+RETRIEVAL_MODES = ("auto", "vector", "lexical", "hybrid")
+
+def reciprocal_rank_fusion(rankings: List[List[int]], limit: int, k: Optional[int] = None) -> List[int]:
+    """The limit best rows by sum of 1 / (k + rank) over rankings; k defaults to RRF_K."""
+    k = settings.RRF_K if k is None else k
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+def _vector_rows(vector_store: FAISS, query_vector: List[float], n: int) -> List[int]:
+    _, rows = vector_store.index.search(np.asarray([query_vector], dtype=np.float32), n)
+    return [int(row) for row in rows[0] if row >= 0]
+
+async def retrieve(snapshot: IndexSnapshot, query: str, mode: Optional[str] = None, k: Optional[int] = None) -> Tuple[List[Document], str]:
+    """Top k chunks for query from snapshot, and the mode that was actually used."""
+    vector_store = snapshot.vector_store
+    if vector_store is None:
+        return [], "none"
+    mode = (mode or settings.RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'.")
+    k = k or settings.RETRIEVAL_K
+    lexical = snapshot.lexical_index
+    if lexical is None:
+        mode = "vector"
+    elif mode == "auto":
+        mode = "lexical" if lexical.is_keyword_query(query, settings.LEXICAL_MAX_QUERY_TERMS) else "hybrid"
+
+    if mode == "lexical":
+        rows = [row for row, _ in lexical.search(query, k)]
+    else:
+        loop = asyncio.get_running_loop()
+        embeddings = vector_store.embeddings
+        if embeddings is not None:
+            query_vector = await embeddings.aembed_query(query)
+        else:
+            query_vector = await loop.run_in_executor(_retrieval_executor, vector_store.embedding_function, query)
+        candidates = k if mode == "vector" else max(k, settings.RETRIEVAL_CANDIDATES)
+        vector_rows = await loop.run_in_executor(_retrieval_executor, _vector_rows, vector_store, query_vector, candidates)
+        if mode == "hybrid":
+            lexical_rows = [row for row, _ in lexical.search(query, candidates)]
+            rows = reciprocal_rank_fusion([vector_rows, lexical_rows], limit=k)
+        else:
+            rows = vector_rows[:k]
+    docs = [vector_store.docstore.search(vector_store.index_to_docstore_id[row]) for row in rows]
+    return docs, mode
+
+@metrics.timed("retrieve_docs")
+async def retrieve_documents_node(state: GraphState, config: RunnableConfig, writer: StreamWriter):
+    logger.debug("---NODE: Retrieving documents---")
+    writer({"stage": "retrieving", "message": "Retrieving relevant documents"})
     current_user_message = state["messages"][-1].content
     docs_found = []
-    if vector_store_instance:
+    snapshot = request_snapshot(config)
+    if snapshot.vector_store:
         try:
-            retrieved = vector_store_instance.similarity_search(current_user_message, k=3)
+            mode = ((config or {}).get("configurable") or {}).get("retrieval_mode")
+            retrieved, used_mode = await retrieve(snapshot, current_user_message, mode)
             docs_found = [doc.page_content for doc in retrieved]
-            print(f"Retrieved {len(docs_found)} documents.")
+            RETRIEVALS.inc(used_mode)
+            logger.debug("Retrieved %d documents (%s).", len(docs_found), used_mode)
         except Exception as e:
-            print(f"Error during similarity search: {e}")
+            logger.exception("Error during similarity search: %s", e)
     else:
-        print("Vector store not available for retrieval.")
+        logger.warning("Vector store not available for retrieval.")
     return {"retrieved_docs": docs_found}
 
-def llm_call_node(state: GraphState):
-    print("---NODE: Calling LLM---")
-    # Construct prompt
-    system_prompt_template = (
-        "You are Nebula's AI assistant, speaking to a prospective hiring manager or engineering. Your goal is to help Nebula get the job by brining forward relevant information from the context and job description."
-        "You should be friendly, helpful, and informative. Always be confident in Nebula's abilities and experiences."
-        "Maintain a confident tone that Nebula will be a great hire for the job, backing up your statements with some meaningful reasons."
-        "Nebula is an AI Engieer, with 13 years of experience at the intersection of AI and software engineering. For more context, look up Nebula's document."
-        "Use relevant technologies, skills and experiences from Nebula's documents to convince the user why Nebula would be a good hire."
-        "Use the provided context from Nebula's documents and any job description to answer questions."
-        "If asked about any particular technology, skill or experience, use the context to provide detailed answer, specifically focusing on any experience and results achieved."
-        "If you are asked to look up a job description from a URL, use the 'fetch_job_description_content' tool. "
-        "Do not make up information if it's not in the context or job description. "
-        "If there isn't great amount of overlap between the job description and Nebula's documents, you should focus on transferable skills which are common between the roles and can say that Nebula is a quick learner and can adapt to new technologies and skills."
-        "If you don't know the answer, say so. "
-        "Keep your answers to 100 to 200 tokents, unless the user asks for more details or a longer answer."
-        "You should also know that Nebula has built you - an AI assistant with a RAG (retrieval-augmented generation) system to fetch data from his pdf cv, stored in a FAISS vector database. You should also know that Nebula has built you as an Agentic AI, capable to fetching data from external webpages."
-        "Relevant context from Nebula's documents:\n{context}\n\n"
-        "Job description (if provided by user and fetched):\n{job_description}\n\n"
-        "Begin!"
-    )
-
-    context_str = "\n".join(state.get("retrieved_docs") or [])
+@metrics.timed("prefetch_urls")
+async def prefetch_urls_node(state: GraphState, writer: StreamWriter):
+    """Fetches job links in the user's message while retrieve_docs runs.
+
+    The pages are added to the turn as a tool call and its results, as if the model had
+    asked for them, so the first LLM call can answer without a second round trip and the
+    pages are stored with the turn for follow-up questions. Failed or empty fetches are
+    left for the tool to retry.
+    """
+    urls = extract_urls(message_text(state["messages"][-1]), settings.URL_PREFETCH_MAX_URLS)
+    if not urls:
+        return {}
+    logger.debug("---NODE: Prefetching %d URL(s)---", len(urls))
+    writer({"stage": "fetching_job_description", "message": "Fetching job description", "url": urls[0]})
+    texts = await asyncio.gather(*(web_fetch.fetch_text(url) for url in urls))
+    # Failed and empty pages (e.g. job boards rendered by JavaScript) are left for the tool.
+    pages = {url: text for url, text in zip(urls, texts) if text.strip() and not is_fetch_error(text)}
+    if not pages:
+        return {}
+    calls = [
+        {"name": fetch_website_content.name, "args": {"url": url}, "id": f"prefetch_{uuid.uuid4().hex[:12]}"}
+        for url in pages
+    ]
+    results = [
+        ToolMessage(content=text, tool_call_id=call["id"], name=fetch_website_content.name)
+        for call, text in zip(calls, pages.values())
+    ]
+    return {"messages": [AIMessage(content="", tool_calls=calls)] + results, "fetched_pages": pages, "job_url": next(iter(pages))}
+
+# --- Prompt and LLM client ---
+# Built once at import time; only the variables are filled in per LLM step.
+SYSTEM_PROMPT_TEMPLATE = (
+    "You are Nebula's AI assistant, speaking to a prospective hiring manager or engineering. Your goal is to help Nebula get the job by brining forward relevant information from the context and job description."
+    "You should be friendly, helpful, and informative. Always be confident in Nebula's abilities and experiences."
+    "Maintain a confident tone that Nebula will be a great hire for the job, backing up your statements with some meaningful reasons."
+    "Nebula is an AI Engieer, with 13 years of experience at the intersection of AI and software engineering. For more context, look up Nebula's document."
+    "Use relevant technologies, skills and experiences from Nebula's documents to convince the user why Nebula would be a good hire."
+    "Use the provided context from Nebula's documents and any job description to answer questions."
+    "If asked about any particular technology, skill or experience, use the context to provide detailed answer, specifically focusing on any experience and results achieved."
+    "If you are asked to look up a job description from a URL, use the 'fetch_job_description_content' tool. "
+    "If the content of that URL has already been fetched in this conversation, answer from it instead of calling the tool again. "
+    "Do not make up information if it's not in the context or job description. "
+    "If there isn't great amount of overlap between the job description and Nebula's documents, you should focus on transferable skills which are common between the roles and can say that Nebula is a quick learner and can adapt to new technologies and skills."
+    "If you don't know the answer, say so. "
+    "Keep your answers to 100 to 200 tokents, unless the user asks for more details or a longer answer."
+    "You should also know that Nebula has built you - an AI assistant with a RAG (retrieval-augmented generation) system to fetch data from his pdf cv, stored in a FAISS vector database. You should also know that Nebula has built you as an Agentic AI, capable to fetching data from external webpages."
+    "Relevant context from Nebula's documents:\n{context}\n\n"
+    "Job description (if provided by user and fetched):\n{job_description}\n\n"
+    "Summary of the earlier conversation (if any):\n{conversation_summary}\n\n"
+    "Begin!"
+)
+
+CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT_TEMPLATE),
+    MessagesPlaceholder(variable_name="messages") # For history and current tool messages
+])
+
+_system_prompt_tokens: Optional[int] = None
+
+def assemble_prompt(state: GraphState) -> context.PromptContext:
+    """CHAT_PROMPT variables from the graph state, with retrieved chunks deduplicated and
+    every section fitted into PROMPT_TOKEN_BUDGET."""
+    global _system_prompt_tokens
+    if _system_prompt_tokens is None:
+        _system_prompt_tokens = count_tokens(SYSTEM_PROMPT_TEMPLATE.format(context="", job_description="", conversation_summary=""))
     job_desc_str = ""
     if state.get("tool_invocations"):
-        # If tool was called, its output is in tool_invocations
-        # We assume the LLM will incorporate this when it processes the ToolMessage
-        # So, we don't explicitly put tool_invocations content into job_desc_str for the *next* prompt here.
-        # The history (state["messages"]) will contain the ToolMessage.
-        # However, if we want to display it in the prompt for clarity or if the LLM needs it explicitly:
-        tool_outputs_str = "\n".join([msg.content for msg in state.get("tool_invocations", []) if isinstance(msg, ToolMessage)])
-        if tool_outputs_str:
-             job_desc_str = tool_outputs_str # Or combine with previous job_url content if any
-
-    current_prompt = ChatPromptTemplate.from_messages([ # Last user message
-        SystemMessage(content=system_prompt_template.format(context=context_str, job_description=job_desc_str)),
-        MessagesPlaceholder(variable_name="messages") # For history and current tool messages
-    ])
+        # Tool results normally reach the model as the ToolMessages in state["messages"];
+        # results handed over in tool_invocations are also put in the prompt explicitly.
+        job_desc_str = "\n".join([msg.content for msg in state.get("tool_invocations", []) if isinstance(msg, ToolMessage)])
+    return context.assemble(
+        _system_prompt_tokens,
+        state.get("retrieved_docs") or [],
+        job_desc_str,
+        state.get("conversation_summary") or "",
+        state.get("history", []),
+        state["messages"],
+    )
 
-    if state.get("tool_invocations"):
-        current_prompt = current_prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_prompt_template.format(context=context_str, job_description=job_desc_str)),
-        MessagesPlaceholder(variable_name="messages") # For history and current tool messages
-    ])
+def build_prompt_inputs(state: GraphState) -> dict:
+    """Variables for CHAT_PROMPT from the graph state."""
+    return assemble_prompt(state).inputs
+
+def create_llm() -> Optional[ChatGoogleGenerativeAI]:
+    """Long-lived Gemini client shared by every request.
 
-    # Initialize LLM with tools
+    The gRPC transport keeps one HTTP/2 channel open and multiplexes concurrent calls
+    over it, so reusing this instance avoids a new connection and handshake per turn.
+    """
     # Ensure GOOGLE_API_KEY is available
-    if not settings.GOOGLE_API_KEY or settings.GOOGLE_API_KEY == "your_google_api_key_here": # Reverted
-        print("ERROR: GOOGLE_API_KEY not configured. LLM call will fail.") # Reverted
-        # Return a message indicating this failure.
-        ai_response = AIMessage(content="I cannot process your request right now as my connection to the language model is not configured (API key missing). Please contact support.")
-        return {"messages": state["messages"] + [ai_response]}
-
-    llm = ChatGoogleGenerativeAI( # Reverted to ChatGoogleGenerativeAI
-        model="gemini-2.0-flash", # Reverted model
-        google_api_key=settings.GOOGLE_API_KEY, # Reverted API key
-        convert_system_message_to_human=True # Reinstated
+    if not settings.GOOGLE_API_KEY or settings.GOOGLE_API_KEY == "your_google_api_key_here":
+        logger.error("GOOGLE_API_KEY not configured. LLM calls will fail.")
+        return None
+    return ChatGoogleGenerativeAI(
+        model=settings.LLM_MODEL,
+        google_api_key=settings.GOOGLE_API_KEY,
+        transport=settings.LLM_TRANSPORT,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        # One attempt per call: the client's own retries back off without jitter and can
+        # sleep on the event loop, so call_with_retries does the retrying instead.
+        max_retries=1,
+        convert_system_message_to_human=True
     )
-    llm_with_tools = llm.bind_tools([fetch_website_content], tool_choice=None) # None means LLM decides
 
-    chain = current_prompt | llm_with_tools
+# Rate limits, overload and transient failures; bad requests and auth errors are final.
+RETRYABLE_LLM_ERRORS = (
+    google_exceptions.TooManyRequests, # Includes ResourceExhausted (quota)
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    asyncio.TimeoutError,
+    ConnectionError,
+)
 
-    # The 'messages' in state should already include previous turns and the latest user message.
-    # If a tool was called, the ToolMessage should also be in 'messages'.
-    print(f"LLM Input Messages: {state['messages']}")
-    try:
-        response_message = chain.invoke({"messages": state["messages"]}) # LangGraph manages history
-        print(f"LLM Raw Response: {response_message}")
-    except Exception as e:
-        print(f"Error calling LLM: {e}")
-        # This could be due to API key issues, model errors, etc.
-        response_message = AIMessage(content=f"Sorry, I encountered an error trying to process your request with the language model: {e}")
+def is_retryable_llm_error(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE_LLM_ERRORS)
 
-    return {"messages": state["messages"] + [response_message]} # Add LLM's response to history
+async def invoke_llm(runnable, *args, on_retry: Optional[Callable[[int, BaseException], None]] = None):
+    """runnable.ainvoke(*args) within the shared LLM concurrency limit, with jittered retries."""
+    return await admission.call_with_retries(lambda: runnable.ainvoke(*args), admission.llm_limiter, is_retryable_llm_error, on_retry=on_retry)
 
 
-def tool_node(state: GraphState) -> dict:
-    print("---NODE: Executing Tool---")
+@metrics.timed("tool_executor")
+async def tool_node(state: GraphState, writer: StreamWriter) -> dict:
+    logger.debug("---NODE: Executing Tool---")
     tool_invocations_results = []
     # The LLM response is the last message. Check if it has tool calls.
     last_message = state["messages"][-1]
     if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
-        print("No tool calls found in LLM response.")
+        logger.warning("No tool calls found in LLM response.")
         return {"tool_invocations": []} # Or handle as no-op
 
+    # All requested pages are fetched concurrently, each distinct URL once; pages already
+    # fetched in this turn are reused.
+    pages = dict(state.get("fetched_pages") or {})
+    urls = []
+    for tool_call in last_message.tool_calls:
+        url = tool_call["args"].get("url") if tool_call["name"] == fetch_website_content.name else None
+        if url and normalize_url(url) not in pages and normalize_url(url) not in urls:
+            urls.append(normalize_url(url))
+
+    async def fetch(url: str) -> str:
+        writer({"stage": "fetching_job_description", "message": "Fetching job description", "url": url})
+        return await fetch_website_content.ainvoke({"url": url}) # Invoke the tool correctly
+
+    fetched = dict(zip(urls, await asyncio.gather(*(fetch(url) for url in urls))))
+    answered = set()
+
     for tool_call in last_message.tool_calls:
         tool_name = tool_call["name"]
         tool_args = tool_call["args"]
-        print(f"Executing tool: {tool_name} with args: {tool_args}")
+        logger.info("Executing tool: %s with args: %s", tool_name, tool_args)
         if tool_name == "fetch_job_description_content":
             # Ensure args is a dict, sometimes it might be a string that needs parsing
             # Pydantic in @tool decorator should handle this if input is from LLM
             url = tool_args.get("url")
             if url:
-                content = fetch_website_content.invoke({"url": url}) # Invoke the tool correctly
+                url = normalize_url(url)
+                if url in pages or url in answered:
+                    # Prefetched, fetched by an earlier call in this turn or by another call in
+                    # this response, so the page is already in the prompt; sending it again
+                    # would only double its tokens.
+                    content = f"The job posting at {url} is already provided above."
+                else:
+                    content = fetched[url]
+                    answered.add(url)
                 tool_invocations_results.append(
                     ToolMessage(content=content, tool_call_id=tool_call["id"], name=tool_name)
                 )
@@ -237,38 +552,126 @@ def tool_node(state: GraphState) -> dict:
                 ToolMessage(content=f"Error: Unknown tool '{tool_name}' called.", tool_call_id=tool_call["id"], name=tool_name)
             )
 
-    print(f"Tool invocation results: {tool_invocations_results}")
-    return {"messages": state["messages"] + tool_invocations_results}
+    logger.debug("Tool invocation results: %s", tool_invocations_results)
+    pages.update((url, text) for url, text in fetched.items() if not is_fetch_error(text))
+    return {"messages": tool_invocations_results, "fetched_pages": pages}
 
 
 # --- Conditional Edges ---
 def should_continue(state: GraphState) -> str:
-    print("---EDGE: Deciding to continue or end---")
+    logger.debug("---EDGE: Deciding to continue or end---")
     # Check if the last AI message (from llm_call_node) has tool calls
     last_message = state["messages"][-1]
     if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        print("Tool call detected, routing to tool_node.")
+        logger.debug("Tool call detected, routing to tool_node.")
         return "use_tool"
     else:
-        print("No tool call, ending graph.")
+        logger.debug("No tool call, ending graph.")
         return END
 
+# --- Semantic cache bypass rules ---
+# Messages with a job link (URL_PATTERN) always bypass the cache.
+# Words that usually point back at earlier turns ("tell me more about that")
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|this|that|these|those|he|him|his|they|them|their|above|previous|earlier|again|more|else|also|elaborate|expand)\b",
+    re.IGNORECASE,
+)
+
+# --- Batch job matching ---
+DEFAULT_MATCH_QUESTION = "How well does Nebula fit this role? Point out the strongest matches and any gaps."
+JOB_MATCHES = metrics.counter("nebula_job_matches_total", "Postings matched in batches, by outcome.", ["outcome"])
+
+def job_url(job: str) -> Optional[str]:
+    """The URL when a job is given as a link, None for a pasted description."""
+    job = job.strip()
+    return normalize_url(job) if URL_PATTERN.fullmatch(job) else None
+
+def _no_progress(chunk: Any):
+    pass # Graph nodes reused outside the graph have no stream to report stages to
+
 # --- Graph Assembly ---
 class ChatService:
-    def __init__(self):
+    def __init__(self, llm: Optional[BaseChatModel] = None, embeddings: Optional[Embeddings] = None):
+        # The model client, its tool binding and the prompt|model chain live as long as the
+        # service, so every turn and every request reuses the same pooled connections.
+        self.llm = llm if llm is not None else create_llm()
+        self.llm_with_tools = None
+        self.chain = None
+        self.match_chain = None # Same prompt without tools: batch matching hands the posting over itself
+        if self.llm is not None:
+            self.llm_with_tools = self.llm.bind_tools([fetch_website_content], tool_choice=None) # None means LLM decides
+            self.chain = CHAT_PROMPT | self.llm_with_tools
+            self.match_chain = CHAT_PROMPT | self.llm
+        self.memory = ConversationMemory()
+        self.semantic_cache: Optional[SemanticCache] = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                embeddings or get_embeddings(),
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            )
+            self.semantic_cache.reset(index_snapshot.version)
         self.graph = self._build_graph()
 
+    @metrics.timed("llm_call")
+    async def llm_call_node(self, state: GraphState, config: RunnableConfig, writer: StreamWriter):
+        logger.debug("---NODE: Calling LLM---")
+        prompt = assemble_prompt(state)
+        # Per-section token counts let clients relate prompt size to time-to-first-token.
+        writer({"stage": "generating", "message": "Generating response", "prompt_tokens": prompt.tokens})
+
+        # The 'messages' in state should already include previous turns and the latest user message.
+        # If a tool was called, the ToolMessage should also be in 'messages'.
+        # The full prompt is only rendered when debug logging is on.
+        logger.debug("LLM input messages: %s", state["messages"])
+        # A retry streams its tokens from the start; stream_message tells the client to reset.
+        def on_retry(attempt: int, error: BaseException):
+            writer({"stage": "retrying", "message": "Retrying the language model", "attempt": attempt})
+        response_message = await self._generate(self.chain, prompt, config, on_retry=on_retry)
+        return {"messages": [response_message]} # Add LLM's response to history
+
+    async def _generate(
+        self,
+        chain,
+        prompt: context.PromptContext,
+        config: Optional[RunnableConfig] = None,
+        on_retry: Optional[Callable[[int, BaseException], None]] = None,
+    ) -> BaseMessage:
+        """Runs chain on the assembled prompt; failures come back as an AIMessage flagged "error"."""
+        if chain is None:
+            # Return a message indicating this failure.
+            return AIMessage(content="I cannot process your request right now as my connection to the language model is not configured (API key missing). Please contact support.", additional_kwargs={"error": True})
+        logger.debug("Prompt tokens by section: %s (before assembly %s, %d chunks merged)", prompt.tokens, prompt.raw_tokens, prompt.chunks_merged)
+        try:
+            # config is passed through explicitly so callbacks/streaming also work on Python < 3.11
+            response_message = await invoke_llm(chain, prompt.inputs, config, on_retry=on_retry) # LangGraph manages history
+            logger.debug("LLM raw response: %s", response_message)
+        except Exception as e:
+            logger.exception("Error calling LLM: %s", e)
+            LLM_CALLS.inc("error")
+            # This could be due to API key issues, model errors, etc.
+            return AIMessage(content=f"Sorry, I encountered an error trying to process your request with the language model: {e}", additional_kwargs={"error": True})
+        LLM_CALLS.inc("ok")
+        record_token_usage(prompt, response_message)
+        return response_message
+
     def _build_graph(self): # Set LangChain endpoint if needed
 
         graph_builder = StateGraph(GraphState)
 
         graph_builder.add_node("retrieve_docs", retrieve_documents_node)
-        graph_builder.add_node("llm_call", llm_call_node)
+        graph_builder.add_node("llm_call", self.llm_call_node)
         graph_builder.add_node("tool_executor", tool_node)
 
+        # Retrieval and fetching job links in the message run in parallel; llm_call waits for both.
         graph_builder.set_entry_point("retrieve_docs")
-
-        graph_builder.add_edge("retrieve_docs", "llm_call")
+        if settings.URL_PREFETCH_MAX_URLS > 0:
+            graph_builder.add_node("prefetch_urls", prefetch_urls_node)
+            graph_builder.add_edge(START, "prefetch_urls")
+            graph_builder.add_edge(["retrieve_docs", "prefetch_urls"], "llm_call")
+        else:
+            graph_builder.add_edge("retrieve_docs", "llm_call")
 
         graph_builder.add_conditional_edges(
             "llm_call", # Source node
@@ -283,38 +686,250 @@ class ChatService:
         # memory = SqliteSaver.from_conn_string(":memory:") # In-memory SQLite for checkpoints
         # compiled_graph = graph_builder.compile(checkpointer=memory)
         compiled_graph = graph_builder.compile() # Compile without checkpointer for now for simplicity
-        print("LangGraph compiled.")
+        logger.info("LangGraph compiled.")
         return compiled_graph
 
-    def process_message(self, user_id: str, user_message_content: str, current_history: List[BaseMessage]):
-        print(f"Processing message for user_id: {user_id}, message: '{user_message_content}'")
-
-        # Append current user message to the history passed in
-        updated_history = current_history + [HumanMessage(content=user_message_content)]
-
-        graph_input = {"messages": updated_history}
+    async def _summarize(self, prompt: str) -> str:
+        response = await invoke_llm(self.llm, prompt)
+        return message_text(response)
+
+    async def _save_summary(self, user_id: str, summary: ConversationSummary):
+        store = session_store.get_session_store()
+        if store is not None:
+            await store.save_summary(user_id, summary)
+
+    def _prepare_input(self, user_id: str, user_message_content: str, session: Optional[Session]) -> dict:
+        # Only a token-budgeted window of recent messages is sent; older turns reach the
+        # model through the rolling summary, which is refreshed in the background.
+        session = session or Session()
+        window, summary = self.memory.prepare(
+            user_id,
+            session.messages,
+            session.summary,
+            offset=session.offset,
+            summarizer=self._summarize if self.llm is not None else None,
+            on_summary=self._save_summary,
+        )
+        return {
+            "messages": [HumanMessage(content=user_message_content)],
+            "history": window,
+            "conversation_summary": summary,
+        }
+
+    def _is_cacheable(self, user_message_content: str, history: List[BaseMessage]) -> bool:
+        """Whether this turn may be answered from / stored in the semantic cache.
+
+        Job links always need a fresh fetch, and follow-ups or turns with a fetched job
+        description in the window depend on the conversation, not just the question.
+        """
+        if self.semantic_cache is None:
+            return False
+        if URL_PATTERN.search(user_message_content) or (
+            history and (FOLLOW_UP_PATTERN.search(user_message_content) or any(isinstance(m, ToolMessage) for m in history))
+        ):
+            self.semantic_cache.record_bypass()
+            return False
+        return True
+
+    async def _cached_answer(self, user_message_content: str, index_version: Optional[str]) -> Optional[str]:
+        try:
+            cached = await self.semantic_cache.lookup(user_message_content, index_version)
+        except Exception as e:
+            logger.exception("Error looking up semantic cache: %s", e)
+            return None
+        if cached is None:
+            return None
+        logger.info("Semantic cache hit (matched %r).", cached.question)
+        return cached.answer
+
+    async def _remember_answer(self, user_message_content: str, new_messages: List[BaseMessage], latency: float, index_version: Optional[str]):
+        # Only a direct answer is reusable: no tool round-trip and no error reply.
+        if len(new_messages) != 2 or new_messages[-1].tool_calls or new_messages[-1].additional_kwargs.get("error"):
+            return
+        try:
+            await self.semantic_cache.store(user_message_content, new_messages[-1].content, latency, index_version)
+        except Exception as e:
+            logger.exception("Error storing answer in semantic cache: %s", e)
+
+    async def process_message(self, user_id: str, user_message_content: str, session: Optional[Session] = None, retrieval_mode: Optional[str] = None):
+        """Runs one turn. Returns (AI response text, new messages of this turn).
+
+        The new messages start with the user's message; the caller appends them to the
+        session store. session itself is never modified. retrieval_mode overrides
+        settings.RETRIEVAL_MODE for this turn.
+        """
+        logger.info("Processing message for user_id: %s", user_id)
+        logger.debug("Message: %r", user_message_content)
+
+        # The whole turn uses the index that is current now, even if a reload swaps it midway.
+        snapshot = index_snapshot
+        config = {"configurable": {"index_snapshot": snapshot, "retrieval_mode": retrieval_mode}}
+        graph_input = self._prepare_input(user_id, user_message_content, session)
+        cacheable = self._is_cacheable(user_message_content, graph_input["history"])
+        if cacheable:
+            cached_answer = await self._cached_answer(user_message_content, snapshot.version)
+            if cached_answer is not None:
+                return cached_answer, graph_input["messages"] + [AIMessage(content=cached_answer)]
+        started = time.perf_counter()
 
         # For graphs with checkpointers, config is important for threading conversations
         # config = {"configurable": {"thread_id": str(user_id)}}
         # For now, without checkpointer, config is not strictly needed for thread_id unless graph uses it.
 
         try:
-            # response_state = self.graph.invoke(graph_input, config=config)
-            response_state = self.graph.invoke(graph_input) # Invoke without config if no checkpointer
-            final_messages = response_state.get("messages", [])
-            if final_messages and isinstance(final_messages[-1], AIMessage):
-                ai_response_content = final_messages[-1].content
-                # The history for the *next* turn should include the AI's response.
-                # The caller of process_message will be responsible for updating their stored history.
-                # We return the AI's response and the full history of *this* turn.
-                return ai_response_content, final_messages
+            # Every node is async, so slow LLM/tool/retrieval calls only suspend this request.
+            response_state = await self.graph.ainvoke(graph_input, config)
+            new_messages = response_state.get("messages", [])
+            if new_messages and isinstance(new_messages[-1], AIMessage):
+                if cacheable:
+                    await self._remember_answer(user_message_content, new_messages, time.perf_counter() - started, snapshot.version)
+                return new_messages[-1].content, new_messages
             else:
-                return "Error: Could not get a valid AI response.", final_messages
+                return "Error: Could not get a valid AI response.", new_messages
+        except Exception as e:
+            logger.exception("Error invoking LangGraph: %s", e)
+            return f"Sorry, an error occurred while processing your request: {e}", graph_input["messages"]
+
+
+    async def stream_message(self, user_id: str, user_message_content: str, session: Optional[Session] = None, retrieval_mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Runs one turn and yields (event, payload) pairs as it progresses.
+
+        Events: "progress" (node/tool stage), "token" (text from llm_call), "reset" when a
+        retried LLM call makes the tokens sent so far void, then exactly one of "done"
+        ({"response", "messages"} with the new messages of this turn) or "error".
+        """
+        logger.info("Streaming message for user_id: %s", user_id)
+        logger.debug("Message: %r", user_message_content)
+        snapshot = index_snapshot
+        config = {"configurable": {"index_snapshot": snapshot, "retrieval_mode": retrieval_mode}}
+        graph_input = self._prepare_input(user_id, user_message_content, session)
+        cacheable = self._is_cacheable(user_message_content, graph_input["history"])
+        if cacheable:
+            cached_answer = await self._cached_answer(user_message_content, snapshot.version)
+            if cached_answer is not None:
+                yield "progress", {"stage": "cache_hit", "message": "Found a previous answer"}
+                yield "token", {"text": cached_answer}
+                yield "done", {"response": cached_answer, "messages": graph_input["messages"] + [AIMessage(content=cached_answer)]}
+                return
+        started = time.perf_counter()
+
+        final_state = None
+        streamed = False
+        try:
+            async for mode, chunk in self.graph.astream(graph_input, config, stream_mode=["custom", "messages", "values"]):
+                if mode == "custom":
+                    if chunk.get("stage") == "retrying" and streamed:
+                        streamed = False
+                        yield "reset", {}
+                    yield "progress", chunk
+                elif mode == "messages":
+                    message_chunk, metadata = chunk
+                    if metadata.get("langgraph_node") != "llm_call" or not isinstance(message_chunk, AIMessageChunk):
+                        continue
+                    text = message_text(message_chunk)
+                    if text:
+                        streamed = True
+                        yield "token", {"text": text}
+                elif mode == "values":
+                    final_state = chunk
         except Exception as e:
-            print(f"Error invoking LangGraph: {e}")
-            import traceback
-            traceback.print_exc()
-            return f"Sorry, an error occurred while processing your request: {e}", updated_history
+            logger.exception("Error streaming LangGraph: %s", e)
+            yield "error", {"detail": f"Sorry, an error occurred while processing your request: {e}"}
+            return
+
+        new_messages = (final_state or {}).get("messages", [])
+        if new_messages and isinstance(new_messages[-1], AIMessage):
+            if cacheable:
+                await self._remember_answer(user_message_content, new_messages, time.perf_counter() - started, snapshot.version)
+            yield "done", {"response": new_messages[-1].content, "messages": new_messages}
+        else:
+            yield "error", {"detail": "Error: Could not get a valid AI response."}
+
+    async def stream_job_matches(self, jobs: List[str], question: Optional[str] = None, retrieval_mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Answers question for each job (a URL or a pasted description) and yields
+        ("match", {"index", "url", "response", "error", "elapsed_ms"}) per job in order of
+        completion, then ("done", summary).
+
+        Each job runs fetch, retrieval and one LLM call on its own, so a slow page holds up
+        only its own result. Identical jobs are answered once, distinct URLs are fetched
+        concurrently through the pooled client, CV chunks are retrieved once per distinct
+        query, and at most MATCH_MAX_CONCURRENCY of the batch's LLM calls run at once.
+        Nothing is stored in the user's session.
+        """
+        question = question or DEFAULT_MATCH_QUESTION
+        logger.info("Matching %d job(s).", len(jobs))
+        # The whole batch uses the index that is current now, like a single turn.
+        config = {"configurable": {"index_snapshot": index_snapshot, "retrieval_mode": retrieval_mode}}
+        retrievals: Dict[str, asyncio.Task] = {}
+        llm_slots = asyncio.Semaphore(max(1, settings.MATCH_MAX_CONCURRENCY))
+        started = time.perf_counter()
+
+        def retrieval(query: str) -> asyncio.Task:
+            if query not in retrievals:
+                state = {"messages": [HumanMessage(content=query)]}
+                retrievals[query] = asyncio.ensure_future(retrieve_documents_node(state, config, _no_progress))
+            return retrievals[query]
+
+        async def match(job: str) -> Dict[str, Any]:
+            url = job_url(job)
+            try:
+                if url is not None:
+                    text = await fetch_website_content.ainvoke({"url": url})
+                    if is_fetch_error(text):
+                        JOB_MATCHES.inc("fetch_error")
+                        return {"url": url, "response": text, "error": True}
+                    posting = f"Job posting at {url}:\n{text}"
+                else:
+                    text = job.strip()
+                    posting = f"Job description:\n{text}"
+                # The start of a posting usually carries the title and key requirements.
+                retrieved = await retrieval(f"{question}\n{text[:settings.MATCH_QUERY_MAX_CHARS]}")
+                prompt = assemble_prompt({
+                    "messages": [HumanMessage(content=question)],
+                    "history": [],
+                    "conversation_summary": None,
+                    "retrieved_docs": retrieved["retrieved_docs"],
+                    "tool_invocations": [ToolMessage(content=posting, tool_call_id="match", name=fetch_website_content.name)],
+                })
+                async with llm_slots:
+                    message = await self._generate(self.match_chain, prompt)
+                error = bool(message.additional_kwargs.get("error"))
+                JOB_MATCHES.inc("llm_error" if error else "ok")
+                return {"url": url, "response": message_text(message), "error": error}
+            except Exception as e:
+                logger.exception("Error matching job %s: %s", url or "description", e)
+                JOB_MATCHES.inc("error")
+                return {"url": url, "response": f"Sorry, an error occurred while matching this job: {e}", "error": True}
+
+        # A URL and a description pasted twice are matched once and reported at each index.
+        keys = [job_url(job) or job.strip() for job in jobs]
+        indices: Dict[str, List[int]] = {}
+        for index, key in enumerate(keys):
+            indices.setdefault(key, []).append(index)
+
+        async def keyed(key: str) -> Tuple[str, Dict[str, Any]]:
+            return key, await match(key)
+
+        tasks = [asyncio.ensure_future(keyed(key)) for key in indices]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, result = await next_done
+                result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                for index in indices[key]:
+                    failed += result["error"]
+                    yield "match", dict(result, index=index)
+        finally:
+            # Only left running when the consumer stops early
+            for task in tasks + list(retrievals.values()):
+                task.cancel()
+        yield "done", {
+            "jobs": len(jobs),
+            "distinct_jobs": len(indices),
+            "retrievals": len(retrievals),
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
 
 
 # Global instance, initialized on startup
@@ -324,20 +939,29 @@ def initialize_chat_service():
     global chat_service_instance
     # Reverted to check for GOOGLE_API_KEY as it's now the primary LLM
     if not settings.GOOGLE_API_KEY or settings.GOOGLE_API_KEY == "your_google_api_key_here":
-        print("WARNING: GOOGLE_API_KEY is not set. Chat service LLM calls will fail.")
+        logger.warning("GOOGLE_API_KEY is not set. Chat service LLM calls will fail.")
         # We can still initialize the service, but it will return errors.
 
     # Ensure vector store is loaded before ChatService initialization if it depends on it
     # load_and_process_pdfs() # This is called in main.py lifespan already
 
-    print("Initializing ChatService...")
+    logger.info("Initializing ChatService...")
     chat_service_instance = ChatService()
-    print("ChatService initialized.")
+    logger.info("ChatService initialized.")
 
 def get_chat_service():
     if chat_service_instance is None:
         # This might happen if accessed before lifespan event, or if init failed.
         # For robustness, could try initializing here, but better to ensure it's done in lifespan.
-        print("Warning: ChatService accessed before full initialization.")
+        logger.warning("ChatService accessed before full initialization.")
         # initialize_chat_service() # Avoid re-init if it's complex or stateful beyond this
     return chat_service_instance
+
+
+async def shutdown_chat_service():
+    """Releases pooled resources; called from the app lifespan on shutdown."""
+    for task in (_watcher_task, _reload_task):
+        if task is not None and not task.done():
+            task.cancel()
+    await web_fetch.close_http_client()
+    _retrieval_executor.shutdown(wait=False)
@@ -0,0 +1,212 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from ..core.config import settings
+from .memory import count_tokens, message_text, message_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# --- Prompt context assembly ---
+# Everything one LLM step sends, split into sections:
+#   system           fixed instructions (never cut)
+#   context          retrieved chunks, deduplicated
+#   job_description  fetched job pages (ToolMessages in this turn and in the history)
+#   summary          rolling summary of older turns
+#   history          the rest of the history window
+#   question         the current turn's user message (never cut)
+# When the sections exceed PROMPT_TOKEN_BUDGET, the cuttable ones are capped at a common
+# limit, so the largest parts are truncated first and small ones are left whole.
+
+SECTIONS = ("system", "context", "job_description", "summary", "history", "question")
+
+# Shorter suffix/prefix matches between chunks are treated as coincidence, not splitter overlap.
+MIN_OVERLAP_CHARS = 20
+
+
+@dataclass
+class PromptContext:
+    inputs: Dict # Variables for CHAT_PROMPT
+    tokens: Dict[str, int] # Per section, as sent
+    raw_tokens: Dict[str, int] # Per section, before deduplication and the budget
+    chunks_merged: int = 0 # Retrieved chunks dropped as duplicates or merged into a neighbour
+    truncated: List[str] = field(default_factory=list) # Sections cut to fit the budget
+
+
+def _overlap(head: str, tail: str, max_overlap: int) -> int:
+    """Length of the longest suffix of head that is also a prefix of tail."""
+    for size in range(min(len(head), len(tail), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+def _merge_spans(chunks: List[str], max_overlap: int) -> List[str]:
+    spans: List[str] = []
+    for chunk in chunks:
+        chunk = chunk.strip()
+        if not chunk or any(chunk in span for span in spans):
+            continue
+        for i, span in enumerate(spans):
+            if span in chunk:
+                spans[i] = chunk
+                break
+            size = _overlap(span, chunk, max_overlap)
+            if size:
+                spans[i] = span + chunk[size:]
+                break
+            size = _overlap(chunk, span, max_overlap)
+            if size:
+                spans[i] = chunk + span[size:]
+                break
+        else:
+            spans.append(chunk)
+    return spans
+
+
+def dedupe_chunks(chunks: List[str], max_overlap: Optional[int] = None) -> List[str]:
+    """Drops repeated chunks and joins neighbours that share the splitter's overlap.
+
+    Chunks that were cut from the same page with CHUNK_OVERLAP repeat up to that many
+    characters; they are merged into one span so the repeat is sent only once. Order
+    follows the first chunk of each span, i.e. retrieval rank.
+    """
+    max_overlap = settings.CHUNK_OVERLAP if max_overlap is None else max_overlap
+    spans = _merge_spans(chunks, max_overlap)
+    # A merged span can now contain or run into another one; repeat until nothing changes.
+    while len(spans) > 1:
+        merged = _merge_spans(spans, max_overlap)
+        if len(merged) == len(spans):
+            break
+        spans = merged
+    return spans
+
+
+def section_caps(sizes: Dict[str, int], available: int) -> Dict[str, int]:
+    """Largest-first allocation: every section keeps min(size, cap), with the common cap
+    chosen so the total fits available."""
+    if sum(sizes.values()) <= available:
+        return dict(sizes)
+    remaining = max(available, 0)
+    ordered = sorted(sizes.items(), key=lambda item: item[1])
+    caps: Dict[str, int] = {}
+    for i, (name, size) in enumerate(ordered):
+        share = remaining // (len(ordered) - i)
+        caps[name] = min(size, share)
+        remaining -= caps[name]
+    return caps
+
+
+def _fit_history(history: List[BaseMessage], cap: int) -> List[BaseMessage]:
+    """Newest history messages whose non-tool tokens fit cap, starting at a HumanMessage so
+    no tool call loses its result."""
+    total = 0
+    start = len(history)
+    while start > 0:
+        message = history[start - 1]
+        tokens = 0 if isinstance(message, ToolMessage) else message_tokens(message)
+        if total + tokens > cap:
+            break
+        total += tokens
+        start -= 1
+    while start < len(history) and not isinstance(history[start], HumanMessage):
+        start += 1
+    return history[start:]
+
+
+def _fit_tool_messages(messages: List[BaseMessage], cap: int) -> List[BaseMessage]:
+    """Cuts ToolMessage contents to cap tokens in total, newest first. The messages stay,
+    as the model expects a result for every tool call."""
+    fitted = list(messages)
+    for i in range(len(fitted) - 1, -1, -1):
+        message = fitted[i]
+        if not isinstance(message, ToolMessage):
+            continue
+        text = message_text(message)
+        tokens = count_tokens(text)
+        if tokens > cap:
+            # A few tokens are left for the marker and the message framing.
+            text = truncate_to_tokens(text, cap - 8) if cap > 8 else ""
+            fitted[i] = ToolMessage(content=text + "\n[truncated]", tool_call_id=message.tool_call_id, name=message.name)
+            tokens = cap
+        cap = max(cap - tokens, 0)
+    return fitted
+
+
+def _tool_tokens(messages: List[BaseMessage]) -> int:
+    return sum(message_tokens(m) for m in messages if isinstance(m, ToolMessage))
+
+
+def _measure(system_tokens: int, context: str, job_description: str, summary: str,
+             history: List[BaseMessage], messages: List[BaseMessage]) -> Dict[str, int]:
+    return {
+        "system": system_tokens,
+        "context": count_tokens(context) if context else 0,
+        "job_description": (count_tokens(job_description) if job_description else 0) + _tool_tokens(history) + _tool_tokens(messages),
+        "summary": count_tokens(summary) if summary else 0,
+        "history": sum(message_tokens(m) for m in history if not isinstance(m, ToolMessage)),
+        "question": sum(message_tokens(m) for m in messages if not isinstance(m, ToolMessage)),
+    }
+
+
+def assemble(
+    system_tokens: int,
+    retrieved_docs: List[str],
+    job_description: str,
+    summary: str,
+    history: List[BaseMessage],
+    messages: List[BaseMessage],
+    budget: Optional[int] = None,
+) -> PromptContext:
+    """Prompt variables for one LLM step, deduplicated and fitted into budget tokens.
+
+    system_tokens is the size of the fixed instructions; messages are the current turn's
+    (user message, then any tool calls and results).
+    """
+    budget = budget or settings.PROMPT_TOKEN_BUDGET
+    raw_context = "\n".join(retrieved_docs)
+    raw = _measure(system_tokens, raw_context, job_description, summary, history, messages)
+
+    spans = dedupe_chunks(retrieved_docs)
+    context = "\n".join(spans)
+    tokens = dict(raw, context=count_tokens(context) if context else 0)
+
+    fixed = tokens["system"] + tokens["question"]
+    cuttable = {name: tokens[name] for name in ("context", "job_description", "summary", "history")}
+    caps = section_caps(cuttable, budget - fixed)
+    truncated = [name for name in cuttable if caps[name] < cuttable[name]]
+    if "context" in truncated:
+        # Spans are in rank order, so the lowest-ranked text is cut first.
+        context = truncate_to_tokens(context, caps["context"]) if caps["context"] > 0 else ""
+    if "summary" in truncated:
+        summary = truncate_to_tokens(summary, caps["summary"]) if caps["summary"] > 0 else ""
+    if "history" in truncated:
+        history = _fit_history(history, caps["history"])
+    if "job_description" in truncated:
+        # Text passed as job_description goes first; what is left of the cap is shared by
+        # the tool results, newest first.
+        cap = caps["job_description"]
+        if job_description:
+            job_description = truncate_to_tokens(job_description, cap) if cap > 0 else ""
+            cap -= count_tokens(job_description) if job_description else 0
+        messages = _fit_tool_messages(messages, max(cap, 0))
+        cap -= _tool_tokens(messages)
+        history = _fit_tool_messages(history, max(cap, 0))
+    if truncated:
+        tokens = _measure(system_tokens, context, job_description, summary, history, messages)
+        logger.info("Prompt over budget (%d tokens), truncated %s.", budget, ", ".join(truncated))
+
+    return PromptContext(
+        inputs={
+            "context": context,
+            "job_description": job_description,
+            "conversation_summary": summary,
+            "messages": history + messages,
+        },
+        tokens=tokens,
+        raw_tokens=raw,
+        chunks_merged=len([d for d in retrieved_docs if d.strip()]) - len(spans),
+        truncated=truncated,
+    )
@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..core import metrics
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Embedding providers ---
+# EMBEDDING_PROVIDER picks who turns text into vectors:
+#   google                 Gemini embedding API (EMBEDDING_MODEL)
+#   sentence-transformers  local CPU model (LOCAL_EMBEDDING_MODEL), optional dependency
+#   hashing                dependency-free feature hashing; deterministic, for tests/offline
+# Local providers embed in batches, and large ingestion jobs are spread over a process
+# pool. Every provider has an embedder id, recorded in the index cache so vectors from
+# different models are never mixed.
+
+
+def embedder_id(embeddings: Embeddings) -> str:
+    """Identifies the model behind embeddings, e.g. 'hashing:v1:768'."""
+    explicit = getattr(embeddings, "embedder_id", None)
+    if explicit:
+        return explicit
+    # Checked by module, so the Gemini client library is only imported when it is used.
+    if type(embeddings).__module__.startswith("langchain_google_genai") and type(embeddings).__name__ == "GoogleGenerativeAIEmbeddings":
+        return f"google:{embeddings.model}"
+    model = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    return f"{type(embeddings).__name__}:{model}" if isinstance(model, str) else type(embeddings).__name__
+
+
+# Set in each pool process by _init_worker; the parent's instance is never pickled.
+_worker_embeddings: Optional["LocalEmbeddings"] = None
+
+def _init_worker(provider: str, options: dict):
+    global _worker_embeddings
+    _worker_embeddings = create_local_embeddings(provider, workers=1, **options)
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings._embed_batch(texts)
+
+
+class LocalEmbeddings(Embeddings):
+    """Base for in-process embedders: fixed-size batches, optional process pool."""
+    provider = ""
+
+    def __init__(self, batch_size: int, workers: int):
+        self.batch_size = max(1, batch_size)
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def embedder_id(self) -> str:
+        raise NotImplementedError
+
+    def _options(self) -> dict:
+        """Constructor arguments that recreate this embedder in a pool process."""
+        raise NotImplementedError
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that already runs uvicorn/asyncio threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.provider, self._options()),
+            )
+        return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.workers > 1 and len(batches) > 1:
+            results = self._get_pool().map(_embed_in_worker, batches)
+        else:
+            results = map(self._embed_batch, batches)
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+    def close(self):
+        """Stops the ingestion processes; they are started again when needed."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+
+class HashingEmbeddings(LocalEmbeddings):
+    """Signed feature hashing of words and word bigrams, L2-normalized.
+
+    No model and no network: similar wording gives similar vectors, which is enough
+    for tests, benchmarks and offline development, not for paraphrases.
+    """
+    provider = "hashing"
+
+    def __init__(self, dim: int, batch_size: int = 64, workers: int = 1):
+        super().__init__(batch_size, workers)
+        self.dim = dim
+
+    @property
+    def embedder_id(self) -> str:
+        return f"hashing:v1:{self.dim}"
+
+    def _options(self) -> dict:
+        return {"dim": self.dim, "batch_size": self.batch_size}
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            # blake2b, not hash(): the value must be identical in every process and run
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t).tolist() for t in texts]
+
+
+class SentenceTransformerEmbeddings(LocalEmbeddings):
+    """Local sentence-transformers model on CPU; needs `pip install sentence-transformers`."""
+    provider = "sentence-transformers"
+
+    def __init__(self, model_name: str, batch_size: int = 64, workers: int = 1):
+        super().__init__(batch_size, workers)
+        self.model_name = model_name
+        self._model = None
+
+    @property
+    def embedder_id(self) -> str:
+        return f"sentence-transformers:{self.model_name}"
+
+    def _options(self) -> dict:
+        return {"model_name": self.model_name, "batch_size": self.batch_size}
+
+    @property
+    def model(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "EMBEDDING_PROVIDER=sentence-transformers requires the sentence-transformers package: "
+                    "pip install sentence-transformers"
+                ) from e
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32).tolist()
+
+
+def create_local_embeddings(provider: str, **options) -> LocalEmbeddings:
+    if provider == HashingEmbeddings.provider:
+        return HashingEmbeddings(**options)
+    if provider == SentenceTransformerEmbeddings.provider:
+        return SentenceTransformerEmbeddings(**options)
+    raise ValueError(f"Unknown local embedding provider '{provider}'.")
+
+
+def create_embeddings() -> Embeddings:
+    """The embedder selected by settings.EMBEDDING_PROVIDER."""
+    provider = settings.EMBEDDING_PROVIDER.lower()
+    if provider == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings # Slow to import; only this provider needs it
+        logger.info("Initializing GoogleGenerativeAIEmbeddings (%s).", settings.EMBEDDING_MODEL)
+        return GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL, google_api_key=settings.GOOGLE_API_KEY)
+    if provider == "hashing":
+        options = {"dim": settings.HASHING_EMBEDDING_DIM}
+    elif provider == "sentence-transformers":
+        options = {"model_name": settings.LOCAL_EMBEDDING_MODEL}
+    else:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{settings.EMBEDDING_PROVIDER}'.")
+    logger.info("Initializing local %s embeddings.", provider)
+    return create_local_embeddings(
+        provider, batch_size=settings.EMBEDDING_BATCH_SIZE, workers=settings.EMBEDDING_WORKERS, **options
+    )
+
+# --- Query embedding cache and micro-batching ---
+# Every chat turn embeds its question before FAISS is searched. CachedQueryEmbeddings
+# keeps an LRU of normalized query -> vector, and coalesces concurrent aembed_query
+# calls that arrive within a few milliseconds into one batched embedding request.
+# Document embedding (indexing) is passed straight through to the wrapped model.
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    def __init__(
+        self,
+        inner: Embeddings,
+        cache_size: int,
+        batch_window_ms: float,
+        max_batch_size: int,
+        query_task_type: Optional[str] = None,
+    ):
+        self.inner = inner
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        # Asymmetric models (Gemini) embed queries with a different task type than documents.
+        self.query_task_type = query_task_type
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._waiting: Dict[str, "asyncio.Future[List[float]]"] = {} # queued or in flight
+        self._batch: List[Tuple[str, str]] = [] # (cache key, text to embed)
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set() # The loop only keeps weak references to tasks
+        self.stats = {"hits": 0, "misses": 0, "batches": 0, "batched_queries": 0}
+
+    @property
+    def embedder_id(self) -> str:
+        return embedder_id(self.inner)
+
+    def close(self):
+        if hasattr(self.inner, "close"):
+            self.inner.close()
+
+    # --- Documents: no caching, no batching beyond what the model does ---
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    # --- Queries ---
+    def _cached(self, key: str) -> Optional[List[float]]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+        return vector
+
+    def _remember(self, key: str, vector: List[float]):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # Queries differing only in case or spacing share a cache entry, but the model is sent
+    # the text as asked, so the vectors are the ones retrieval would get without the cache.
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._cached(key)
+        if vector is None:
+            self.stats["misses"] += 1
+            if self.query_task_type:
+                vector = self.inner.embed_query(text, task_type=self.query_task_type)
+            else:
+                vector = self.inner.embed_query(text)
+            self._remember(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._cached(key)
+        if vector is not None:
+            return vector
+        waiting = self._waiting.get(key)
+        if waiting is None:
+            # First request for this query: join the batch being collected.
+            self.stats["misses"] += 1
+            loop = asyncio.get_running_loop()
+            waiting = self._waiting[key] = loop.create_future()
+            self._batch.append((key, text))
+            if len(self._batch) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        else:
+            self.stats["hits"] += 1
+        # shield: one cancelled request must not cancel the vector others are waiting for
+        return await asyncio.shield(waiting)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._embed_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, batch: List[Tuple[str, str]]):
+        keys = [key for key, _ in batch]
+        texts = [text for _, text in batch]
+        self.stats["batches"] += 1
+        self.stats["batched_queries"] += len(keys)
+        try:
+            with metrics.span("embed_queries"):
+                if self.query_task_type:
+                    vectors = await self.inner.aembed_documents(texts, task_type=self.query_task_type)
+                else:
+                    vectors = await self.inner.aembed_documents(texts)
+        except Exception as e:
+            for key in keys:
+                future = self._waiting.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        for key, vector in zip(keys, vectors):
+            self._remember(key, vector)
+            future = self._waiting.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(vector)
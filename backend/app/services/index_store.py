@@ -0,0 +1,302 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import uuid
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ..core.config import settings
+from .embeddings import embedder_id
+
+logger = logging.getLogger(__name__)
+
+# --- On-disk, content-addressed index cache ---
+#
+# Layout of settings.INDEX_CACHE_DIR:
+#   files/<file_key>.json       chunk texts + metadata of one PDF
+#   files/<file_key>.npy        float32 embeddings of those chunks (same order)
+#   index/<manifest_key>/       combined FAISS index for an exact set of file keys
+#       index.faiss             raw FAISS index, memory-mapped on load
+#       chunks.jsonl            one chunk (text + metadata) per line, in FAISS row order
+#       offsets.npy             byte offset of every line in chunks.jsonl, plus the end
+#       meta.json               embedder id, dimension and chunk count
+#   build.lock                  held while an index is loaded or built
+#
+# A file key is sha256(settings fingerprint + file content hash), so an edited PDF, a
+# changed CHUNK_SIZE/CHUNK_OVERLAP or a different embedder produces new keys instead of
+# stale hits. The embedder id is also stored next to the vectors and checked on load, so
+# an index built by one model is never searched with another model's query vectors.
+# The manifest key is the hash of the sorted file keys and the index structure settings,
+# so an unchanged pdf/ directory maps straight to a saved combined index and startup
+# needs no embedding calls at all. Switching VECTOR_INDEX_TYPE only rebuilds the index
+# from the cached vectors.
+#
+# A loaded index and its chunks are memory-mapped read-only, so worker processes serving
+# the same cache share one copy in the OS page cache instead of each holding its own.
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, each process may build on its own
+    fcntl = None
+
+# IO_FLAG_MMAP only maps IVF lists; flat and HNSW vectors are copied into the process
+# unless IO_FLAG_MMAP_IFC (faiss >= 1.10) is available too.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+CACHE_FORMAT_VERSION = 2
+INDEX_FORMAT_VERSION = 2 # Layout of index/<manifest_key>/; bumping it only rebuilds from cached vectors
+
+
+def settings_fingerprint(embedder: str) -> str:
+    """Everything besides the file content that changes the chunks or their vectors."""
+    return json.dumps({
+        "version": CACHE_FORMAT_VERSION,
+        "splitter": "RecursiveCharacterTextSplitter",
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "embedder": embedder,
+    }, sort_keys=True)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_cache_key(content_hash: str, fingerprint: str) -> str:
+    return hashlib.sha256(f"{fingerprint}\n{content_hash}".encode("utf-8")).hexdigest()
+
+
+def index_fingerprint() -> str:
+    """Settings that change how the combined index is structured (not the vectors in it)."""
+    return json.dumps({
+        "format": INDEX_FORMAT_VERSION,
+        "type": settings.VECTOR_INDEX_TYPE.lower(),
+        "hnsw_m": settings.HNSW_M,
+        "ivf_nlist": settings.IVF_NLIST,
+    }, sort_keys=True)
+
+
+def manifest_key(file_keys: List[str]) -> str:
+    return hashlib.sha256("\n".join([index_fingerprint()] + sorted(file_keys)).encode("utf-8")).hexdigest()
+
+
+def create_faiss_index(vectors: np.ndarray) -> faiss.Index:
+    """Raw FAISS index over vectors, of the kind selected by VECTOR_INDEX_TYPE."""
+    count, dim = vectors.shape
+    kind = settings.VECTOR_INDEX_TYPE.lower()
+    if kind == "ivf":
+        nlist = settings.IVF_NLIST or max(1, int(4 * math.sqrt(count)))
+        # k-means needs a few dozen points per list; a handful of CVs is better served by flat.
+        if count >= nlist * 39:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+            index.train(vectors)
+        else:
+            logger.info("Only %d chunks for %d IVF lists, using a flat index instead.", count, nlist)
+            index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings.HNSW_M)
+    else:
+        if kind != "flat":
+            logger.warning("Unknown VECTOR_INDEX_TYPE '%s', using a flat index.", settings.VECTOR_INDEX_TYPE)
+        index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    apply_search_params(index)
+    return index
+
+
+def apply_search_params(index: faiss.Index):
+    """Search-time knobs are not part of the cache key; they are set again on every load."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = settings.IVF_NPROBE
+
+
+def _atomic_write_bytes(path: str, data: bytes):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ChunkStore(Docstore):
+    """Docstore over a saved index's chunks.jsonl, memory-mapped and decoded per lookup.
+
+    Documents are keyed by FAISS row, so no id mapping is kept in memory.
+    """
+
+    def __init__(self, path: str):
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "chunks.jsonl"), "rb") as f:
+            # The mapping stays valid after the file is closed; an empty file cannot be mapped.
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(self) else b""
+
+    def __len__(self) -> int:
+        return max(len(self._offsets) - 1, 0)
+
+    def search(self, search: Union[int, str]) -> Union[str, Document]:
+        row = int(search)
+        if not 0 <= row < len(self):
+            return f"ID {search} not found."
+        chunk = json.loads(self._data[int(self._offsets[row]):int(self._offsets[row + 1])])
+        return Document(page_content=chunk["page_content"], metadata=chunk["metadata"])
+
+
+class RowIds(Mapping):
+    """index_to_docstore_id for a ChunkStore: FAISS row i is stored under id i."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, row: int) -> int:
+        if not 0 <= row < self.size:
+            raise KeyError(row)
+        return int(row)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.size))
+
+
+class IndexStore:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.files_dir = os.path.join(cache_dir, "files")
+        self.index_dir = os.path.join(cache_dir, "index")
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    # --- Per-file chunk + embedding entries ---
+    def load_file_entry(self, key: str, embedder: str) -> Optional[Tuple[List[Document], np.ndarray]]:
+        json_path = os.path.join(self.files_dir, f"{key}.json")
+        npy_path = os.path.join(self.files_dir, f"{key}.npy")
+        if not (os.path.exists(json_path) and os.path.exists(npy_path)):
+            return None
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("embedder") != embedder:
+                logger.info("Index cache entry %s was embedded by %s, not %s; ignoring it.", key, payload.get("embedder"), embedder)
+                return None
+            vectors = np.load(npy_path, mmap_mode="r")
+            docs = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in payload["chunks"]]
+            if len(docs) != vectors.shape[0]:
+                logger.warning("Index cache entry %s is inconsistent, ignoring it.", key)
+                return None
+            return docs, vectors
+        except Exception as e:
+            logger.warning("Error reading index cache entry %s: %s", key, e)
+            return None
+
+    def save_file_entry(self, key: str, embedder: str, docs: List[Document], vectors: np.ndarray):
+        payload = {"embedder": embedder, "chunks": [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]}
+        npy_tmp = os.path.join(self.files_dir, f"{key}.{uuid.uuid4().hex}.tmp.npy")
+        np.save(npy_tmp, np.asarray(vectors, dtype=np.float32))
+        os.replace(npy_tmp, os.path.join(self.files_dir, f"{key}.npy"))
+        # The .json is written last: load_file_entry requires both files to exist.
+        _atomic_write_bytes(os.path.join(self.files_dir, f"{key}.json"), json.dumps(payload).encode("utf-8"))
+
+    @contextmanager
+    def build_lock(self) -> Iterator[None]:
+        """Exclusive across processes sharing this cache, so concurrently starting workers
+        build a missing index once and the others load the result."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.cache_dir, "build.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- Combined FAISS index ---
+    def load_index(self, key: str, embeddings: Embeddings) -> Optional[FAISS]:
+        path = os.path.join(self.index_dir, key)
+        index_path = os.path.join(path, "index.faiss")
+        meta_path = os.path.join(path, "meta.json")
+        if not (os.path.exists(index_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            expected = embedder_id(embeddings)
+            if meta.get("embedder") != expected:
+                logger.info("Cached FAISS index %s was built by %s, not %s; rebuilding it.", key, meta.get("embedder"), expected)
+                return None
+            # Memory-map the vectors: the OS page cache shares them and nothing is copied up front.
+            index = faiss.read_index(index_path, MMAP_FLAGS)
+            apply_search_params(index)
+            docstore = ChunkStore(path)
+            if len(docstore) != index.ntotal or len(docstore) != meta.get("count"):
+                logger.warning("Cached FAISS index %s is inconsistent, rebuilding it.", key)
+                return None
+            return FAISS(embeddings, index, docstore, RowIds(len(docstore)))
+        except Exception as e:
+            logger.warning("Error loading cached FAISS index %s: %s", key, e)
+            return None
+
+    def save_index(self, key: str, store: FAISS):
+        final_path = os.path.join(self.index_dir, key)
+        tmp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_path)
+        faiss.write_index(store.index, os.path.join(tmp_path, "index.faiss"))
+        count = len(store.index_to_docstore_id)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        with open(os.path.join(tmp_path, "chunks.jsonl"), "wb") as f:
+            for row in range(count):
+                doc = store.docstore.search(store.index_to_docstore_id[row])
+                line = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets[row + 1] = offsets[row] + len(line)
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+        # meta.json is written last: load_index requires it to exist.
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"embedder": embedder_id(store.embeddings), "dim": store.index.d, "count": count}, f)
+        if os.path.exists(final_path):
+            # Another process saved the same manifest first; its content is identical.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        os.replace(tmp_path, final_path)
+
+    def prune(self, keep_file_keys: List[str], keep_manifest: str):
+        """Drop entries no longer referenced by the current pdf/ directory."""
+        keep = set(keep_file_keys)
+        for name in os.listdir(self.files_dir):
+            key = name.split(".", 1)[0]
+            if key not in keep:
+                try:
+                    os.remove(os.path.join(self.files_dir, name))
+                except OSError:
+                    pass
+        for name in os.listdir(self.index_dir):
+            if name != keep_manifest:
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+
+
+def load_and_split_pdf(pdf_path: str) -> List[Document]:
+    # Imported on first use: a start from a cached index never parses a PDF.
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    loader = PyPDFLoader(pdf_path)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP)
+    return text_splitter.split_documents(loader.load())
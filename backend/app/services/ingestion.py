@@ -0,0 +1,345 @@
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ..core import metrics
+from ..core.config import settings
+from .bm25 import BM25Index
+from .embeddings import embedder_id
+from .index_store import (
+    IndexStore, create_faiss_index, file_cache_key, hash_file, load_and_split_pdf, manifest_key, settings_fingerprint,
+)
+
+# --- Staged PDF ingestion ---
+#
+#   parse + split  process pool, up to 2 * INGEST_WORKERS files in flight, yielded as they finish
+#        |
+#   chunk stream   generator over the parsed files' chunks
+#        |
+#   embed          INGEST_EMBED_BATCH_SIZE chunks per call, batches may span files;
+#                  a failed batch is retried file by file, so only the bad file fails
+#        |
+#   index          a file's vectors are cached and added to FAISS as soon as it is complete
+#        |
+#   lexical        BM25 index over the same rows, built once FAISS is complete
+#
+# Files whose chunks and vectors are already in the index cache skip straight to the last
+# stage. Only the files in flight and one embedding batch are held besides the index itself.
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileReport:
+    path: str
+    status: str = "pending" # "cached", "embedded" or "error"
+    chunks: int = 0
+    parse_ms: float = 0.0
+    embed_ms: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class IngestionReport:
+    vector_store: Optional[FAISS] = None
+    lexical_index: Optional[BM25Index] = None
+    # Manifest key of the indexed files; changes whenever any PDF or index setting does, or
+    # when a file that failed before is indexed.
+    version: Optional[str] = None
+    files: List[FileReport] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    def summary(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for f in self.files:
+            counts[f.status] = counts.get(f.status, 0) + 1
+        return {
+            "version": self.version,
+            "files": counts,
+            "chunks": self.vector_store.index.ntotal if self.vector_store is not None else 0,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "errors": {f.path: f.error for f in self.files if f.error},
+        }
+
+
+# --- Stage 1: parse and split ---
+def _parse_file(path: str) -> Tuple[List[Document], float]:
+    started = time.perf_counter()
+    docs = load_and_split_pdf(path)
+    return docs, (time.perf_counter() - started) * 1000
+
+
+def _parsed_files(paths: List[str], workers: int) -> Iterator[Tuple[str, Optional[List[Document]], float, Optional[str]]]:
+    """Yields (path, chunks, parse_ms, error) in completion order."""
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            try:
+                docs, parse_ms = _parse_file(path)
+                yield path, docs, parse_ms, None
+            except Exception as e:
+                yield path, None, 0.0, f"{type(e).__name__}: {e}"
+        return
+
+    # spawn: forking a process that already runs uvicorn/asyncio threads is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=context) as pool:
+        queue = iter(paths)
+        pending = {}
+
+        def submit():
+            path = next(queue, None)
+            if path is not None:
+                pending[pool.submit(_parse_file, path)] = path
+
+        # Bounded read-ahead: parsed files wait here while earlier ones are embedded.
+        for _ in range(workers * 2):
+            submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    docs, parse_ms = future.result()
+                    yield path, docs, parse_ms, None
+                except Exception as e:
+                    yield path, None, 0.0, f"{type(e).__name__}: {e}"
+                submit()
+
+
+# --- Stage 2: chunk stream and embedding batches ---
+class _PendingFile:
+    """A parsed file whose chunks are being embedded."""
+
+    def __init__(self, report: FileReport, key: str, docs: List[Document]):
+        self.report = report
+        self.key = key
+        self.docs = docs
+        self.vectors: List[Optional[np.ndarray]] = [None] * len(docs)
+        self.remaining = len(docs)
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Stage 3: incremental FAISS index ---
+class _IndexBuilder:
+    """Adds each completed file to the index. IVF must see the vectors to train, so for
+    it they are only collected (cached ones stay memory-mapped) until finish()."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.incremental = settings.VECTOR_INDEX_TYPE.lower() != "ivf"
+        self.index = None
+        self.ids: List[str] = []
+        self.docs: Dict[str, Document] = {}
+        self._buffered: List[np.ndarray] = []
+
+    def add(self, docs: List[Document], vectors: np.ndarray):
+        ids = [str(uuid.uuid4()) for _ in docs]
+        self.ids.extend(ids)
+        self.docs.update(zip(ids, docs))
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not self.incremental:
+            self._buffered.append(vectors)
+        elif self.index is None:
+            self.index = create_faiss_index(vectors)
+        else:
+            self.index.add(vectors)
+
+    def finish(self) -> Optional[FAISS]:
+        if not self.ids:
+            return None
+        if self._buffered:
+            self.index = create_faiss_index(np.vstack(self._buffered))
+            self._buffered = []
+        return FAISS(self.embeddings, self.index, InMemoryDocstore(self.docs), dict(enumerate(self.ids)))
+
+
+class _Pipeline:
+    def __init__(self, embeddings: Embeddings, store: IndexStore, embedder: str):
+        self.embeddings = embeddings
+        self.store = store
+        self.embedder = embedder
+        self.builder = _IndexBuilder(embeddings)
+
+    def add_cached(self, report: FileReport, entry: Tuple[List[Document], np.ndarray]):
+        docs, vectors = entry
+        self.builder.add(docs, vectors)
+        report.status = "cached"
+        report.chunks = len(docs)
+
+    def chunk_stream(self, file_keys: Dict[str, str], reports: Dict[str, FileReport]) -> Iterator[Tuple[_PendingFile, int]]:
+        paths = list(file_keys)
+        workers = settings.INGEST_WORKERS or os.cpu_count() or 1
+        if sum(os.path.getsize(path) for path in paths) < settings.INGEST_POOL_MIN_BYTES:
+            workers = 1
+        for path, docs, parse_ms, error in _parsed_files(paths, workers):
+            report = reports[path]
+            report.parse_ms = parse_ms
+            if error is None and not docs:
+                error = "No text extracted"
+            if error is not None:
+                self._fail(report, error)
+                continue
+            report.chunks = len(docs)
+            pending = _PendingFile(report, file_keys[path], docs)
+            for i in range(len(docs)):
+                if report.status != "error": # An earlier batch with this file's chunks failed
+                    yield pending, i
+
+    def embed(self, batch: List[Tuple[_PendingFile, int]]):
+        batch = [(p, i) for p, i in batch if p.report.status != "error"]
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            with metrics.span("embed_documents"):
+                vectors = np.asarray(
+                    self.embeddings.embed_documents([p.docs[i].page_content for p, i in batch]), dtype=np.float32
+                )
+        except Exception as e:
+            files = list(dict.fromkeys(p for p, _ in batch))
+            if len(files) > 1:
+                # Only the file that caused the failure should be marked: retry each file's
+                # share of the batch on its own.
+                logger.warning("Embedding a batch spanning %d files failed (%s: %s); retrying file by file.", len(files), type(e).__name__, e)
+                for pending in files:
+                    self.embed([(p, i) for p, i in batch if p is pending])
+                return
+            self._fail(files[0].report, f"Embedding failed: {type(e).__name__}: {e}")
+            return
+        # Attribute the call's time to files by their share of the batch.
+        per_chunk_ms = (time.perf_counter() - started) * 1000 / len(batch)
+        for (pending, i), vector in zip(batch, vectors):
+            if pending.report.status == "error":
+                continue
+            pending.vectors[i] = vector
+            pending.remaining -= 1
+            pending.report.embed_ms += per_chunk_ms
+            if pending.remaining == 0:
+                self._complete(pending)
+
+    def _complete(self, pending: _PendingFile):
+        vectors = np.vstack(pending.vectors)
+        try:
+            self.store.save_file_entry(pending.key, self.embedder, pending.docs, vectors)
+        except Exception as e:
+            logger.warning("Error caching embeddings of %s: %s", pending.report.path, e)
+        self.builder.add(pending.docs, vectors)
+        pending.report.status = "embedded"
+        logger.info(
+            "Embedded %d chunks from %s with %s (parse %.0f ms, embed %.0f ms).",
+            len(pending.docs), pending.report.path, self.embedder, pending.report.parse_ms, pending.report.embed_ms,
+        )
+
+    def _fail(self, report: FileReport, error: str):
+        if report.status != "error":
+            report.status = "error"
+            report.error = error
+            logger.error("Error ingesting %s: %s", report.path, error)
+
+
+def ingest(pdf_files: List[str], embeddings: Embeddings, store: Optional[IndexStore] = None) -> IngestionReport:
+    """Builds the FAISS store for pdf_files, embedding only files missing from the cache.
+
+    Per-file failures are recorded in the report and the remaining files are still indexed.
+    Processes sharing the cache take turns, so workers starting together embed and index
+    the PDFs once and the others load the saved result.
+    """
+    store = store or IndexStore(settings.INDEX_CACHE_DIR)
+    with store.build_lock():
+        return _ingest(pdf_files, embeddings, store)
+
+
+def _ingest(pdf_files: List[str], embeddings: Embeddings, store: IndexStore) -> IngestionReport:
+    started = time.perf_counter()
+    report = IngestionReport(files=[FileReport(path) for path in pdf_files])
+    reports = {r.path: r for r in report.files}
+    embedder = embedder_id(embeddings)
+    fingerprint = settings_fingerprint(embedder)
+
+    file_keys: Dict[str, str] = {}
+    for path in pdf_files:
+        try:
+            file_keys[path] = file_cache_key(hash_file(path), fingerprint)
+        except OSError as e:
+            reports[path].status = "error"
+            reports[path].error = f"{type(e).__name__}: {e}"
+            logger.error("Error reading PDF %s: %s", path, e)
+    if not file_keys:
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        return report
+    current_manifest = manifest_key(list(file_keys.values()))
+
+    cached_index = store.load_index(current_manifest, embeddings)
+    if cached_index is not None:
+        for path in file_keys:
+            reports[path].status = "cached"
+        report.vector_store, report.version = cached_index, current_manifest
+        report.lexical_index = BM25Index.from_vector_store(cached_index)
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info("Loaded cached FAISS index %.12s (%d chunks) in %.1f ms.", current_manifest, cached_index.index.ntotal, report.elapsed_ms)
+        return report
+
+    pipeline = _Pipeline(embeddings, store, embedder)
+    to_parse: Dict[str, str] = {}
+    for path, key in file_keys.items():
+        entry = store.load_file_entry(key, embedder)
+        if entry is None:
+            to_parse[path] = key
+        else:
+            pipeline.add_cached(reports[path], entry)
+    for batch in _batched(pipeline.chunk_stream(to_parse, reports), settings.INGEST_EMBED_BATCH_SIZE):
+        pipeline.embed(batch)
+
+    vector_store = pipeline.builder.finish()
+    if vector_store is None:
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.warning("No documents to process. Vector store cannot be created.")
+        return report
+    report.lexical_index = BM25Index.from_vector_store(vector_store)
+    report.elapsed_ms = (time.perf_counter() - started) * 1000
+
+    counts = report.summary()["files"]
+    version = current_manifest
+    if counts.get("error"):
+        # A partial index is served but not cached, so the failed files are retried next start.
+        # Its version covers only the files actually indexed, so a later build that gets the
+        # failed files in is a new version and is swapped in on reload.
+        version = manifest_key([key for path, key in file_keys.items() if reports[path].status != "error"])
+    else:
+        try:
+            store.save_index(current_manifest, vector_store)
+            store.prune(list(file_keys.values()), current_manifest)
+            # Serve the saved copy: memory-mapped, it is shared with other workers, and the
+            # rows are unchanged, so the lexical index still matches.
+            vector_store = store.load_index(current_manifest, embeddings) or vector_store
+        except Exception as e:
+            # A read-only or full disk only costs us the cache, not the index itself.
+            logger.warning("Error saving FAISS index cache: %s", e)
+    report.vector_store, report.version = vector_store, version
+    logger.info(
+        "Built %s with %d chunks (%d files cached, %d embedded, %d failed) in %.1f ms.",
+        type(vector_store.index).__name__, vector_store.index.ntotal,
+        counts.get("cached", 0), counts.get("embedded", 0), counts.get("error", 0), report.elapsed_ms,
+    )
+    return report
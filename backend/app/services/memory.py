@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Conversation memory ---
+# Each turn sends the model a token-budgeted window of recent messages plus a rolling
+# summary of everything older, instead of the whole history. When the window would
+# exceed HISTORY_TOKEN_BUDGET it is cut back to HISTORY_KEEP_RATIO of the budget and the
+# messages that fell out are folded into the summary by a background task, so the
+# summarization call happens every few turns and never sits on the request path.
+
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+        except Exception as e:
+            # tiktoken downloads its BPE file on first use; fall back to a rough estimate offline.
+            logger.warning("tiktoken unavailable (%s), estimating tokens from character count.", e)
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is False:
+        return text[:max(0, max_tokens * 4 - 1)] # The longest text count_tokens puts within max_tokens
+    return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def message_text(message: BaseMessage) -> str:
+    # Gemini may return content as a list of parts rather than a plain string.
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in message.content)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    # A few tokens of per-message framing, as chat APIs add role markers around each message.
+    return count_tokens(message_text(message)) + 4
+
+
+def window_start(history: List[BaseMessage], budget: int, floor: int = 0) -> Tuple[int, bool]:
+    """Index of the oldest message to send so history[start:] fits in budget tokens.
+
+    Never goes below floor. Returns (start, fits); fits is False when the budget cut the
+    window. The start is moved forward to a HumanMessage so the window never begins with
+    a ToolMessage or an AI tool call whose counterpart was cut off.
+    """
+    total = 0
+    start = len(history)
+    while start > floor:
+        tokens = message_tokens(history[start - 1])
+        if total + tokens > budget:
+            break
+        total += tokens
+        start -= 1
+    fits = start == floor
+    while start < len(history) and not isinstance(history[start], HumanMessage):
+        start += 1
+    return start, fits
+
+
+@dataclass
+class ConversationSummary:
+    text: str = ""
+    # Messages [0, covered) of the conversation are folded into text. Positions are absolute
+    # (they count messages a session store has since trimmed), so trimming never shifts them.
+    covered: int = 0
+
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a hiring manager and Nebula's AI assistant. "
+    "Keep names, companies, roles, job requirements and any facts about Nebula that were discussed. "
+    "Reply with the updated summary only, in at most 150 words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{messages}"
+)
+
+Summarizer = Callable[[str], Awaitable[str]]
+SummaryCallback = Callable[[str, ConversationSummary], Awaitable[None]]
+
+
+class ConversationMemory:
+    def __init__(self, budget: Optional[int] = None, keep_ratio: Optional[float] = None):
+        self.budget = budget or settings.HISTORY_TOKEN_BUDGET
+        self.keep_ratio = keep_ratio or settings.HISTORY_KEEP_RATIO
+        # user_id -> absolute position a background task is summarizing up to. Only holds
+        # in-flight work; the summaries themselves live in the session store.
+        self._pending: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def prepare(
+        self,
+        user_id: str,
+        history: List[BaseMessage],
+        summary: ConversationSummary,
+        offset: int = 0,
+        summarizer: Optional[Summarizer] = None,
+        on_summary: Optional[SummaryCallback] = None,
+    ) -> Tuple[List[BaseMessage], str]:
+        """Returns (window, summary text) to send for the next turn of user_id.
+
+        history is the stored conversation and offset the number of messages already
+        trimmed from its head, i.e. history[0] is message number offset.
+        """
+        covered = max(summary.covered, self._pending.get(user_id, 0))
+        floor = min(max(covered - offset, 0), len(history))
+        start, fits = window_start(history, self.budget, floor)
+        if not fits:
+            # Cut well below the budget so the next few turns fit without another summary.
+            start, _ = window_start(history, int(self.budget * self.keep_ratio), floor)
+            if summarizer is not None and user_id not in self._pending and start > floor:
+                self._schedule(user_id, summary, history[floor:start], offset + start, summarizer, on_summary)
+        return history[start:], summary.text
+
+    def _schedule(
+        self,
+        user_id: str,
+        summary: ConversationSummary,
+        messages: List[BaseMessage],
+        upto: int,
+        summarizer: Summarizer,
+        on_summary: Optional[SummaryCallback],
+    ):
+        self._pending[user_id] = upto
+
+        async def run():
+            try:
+                rendered = "\n".join(f"{_role(m)}: {message_text(m)}" for m in messages if not isinstance(m, ToolMessage))
+                text = await summarizer(SUMMARY_PROMPT.format(summary=summary.text or "(none)", messages=rendered))
+                updated = ConversationSummary(text=text, covered=upto)
+                if on_summary is not None:
+                    await on_summary(user_id, updated)
+                logger.info("Updated conversation summary for user_id: %s (covers %d messages).", user_id, upto)
+            except Exception as e:
+                # The messages stay out of the window either way; the next cut retries.
+                logger.exception("Error summarizing conversation for user_id: %s: %s", user_id, e)
+            finally:
+                self._pending.pop(user_id, None)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)  # Keep a reference until it finishes
+        task.add_done_callback(self._tasks.discard)
+
+
+def _role(message: BaseMessage) -> str:
+    if isinstance(message, HumanMessage):
+        return "User"
+    if isinstance(message, AIMessage):
+        return "Assistant"
+    return message.type
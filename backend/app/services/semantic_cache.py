@@ -0,0 +1,109 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# --- Semantic response cache ---
+# Answers to self-contained questions, looked up by cosine similarity of the question
+# embedding in a small in-memory FAISS inner-product index. Entries expire after a TTL,
+# the least recently used are evicted past max_entries, and everything is dropped by
+# reset() when a new PDF index is swapped in, since cached answers may quote outdated
+# documents. Requests still running against an older index neither hit nor fill the cache.
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    created_at: float
+    latency: float # Seconds the original graph run took; what a hit saves
+
+
+class SemanticCache:
+    def __init__(self, embeddings: Embeddings, threshold: float, max_entries: int, ttl_seconds: int):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index_version: Optional[str] = None
+        self._index: Optional[faiss.IndexIDMap2] = None
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_latency = 0.0
+
+    async def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray([await self.embeddings.aembed_query(question)], dtype=np.float32)
+        faiss.normalize_L2(vector) # Inner product of unit vectors is cosine similarity
+        return vector
+
+    def reset(self, index_version: Optional[str]):
+        """Drops every entry; answers are only valid for the index they were generated from."""
+        if self._entries:
+            logger.info("PDF index changed, dropping %d cached answers.", len(self._entries))
+        self.clear()
+        self.index_version = index_version
+
+    def _remove(self, entry_id: int):
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+
+    async def lookup(self, question: str, index_version: Optional[str]) -> Optional[CachedAnswer]:
+        if index_version != self.index_version or not self._entries:
+            self.misses += 1
+            return None
+        scores, ids = self._index.search(await self._embed(question), 1)
+        entry_id = int(ids[0][0])
+        entry = self._entries.get(entry_id)
+        if entry is None or scores[0][0] < self.threshold:
+            self.misses += 1
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(entry_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        self.saved_latency += entry.latency
+        return entry
+
+    async def store(self, question: str, answer: str, latency: float, index_version: Optional[str]):
+        if index_version != self.index_version:
+            return # Generated from an index that has been replaced since
+        vector = await self._embed(question)
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+        entry_id = self._next_id
+        self._next_id += 1
+        self._index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+        self._entries[entry_id] = CachedAnswer(question, answer, time.monotonic(), latency)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def record_bypass(self):
+        self.bypassed += 1
+
+    def clear(self):
+        self._entries.clear()
+        if self._index is not None:
+            self._index.reset()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_latency_seconds": round(self.saved_latency, 3),
+        }
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from .. import models
+from ..core.config import settings
+from .memory import ConversationSummary
+
+logger = logging.getLogger(__name__)
+
+# --- Session storage ---
+# Chat histories, their rolling summaries and the users created by /api/chat/start.
+# "memory" is a per-process LRU with TTL and size caps; "sqlite" is a WAL-mode database
+# file that several uvicorn workers can share.
+
+
+@dataclass
+class Session:
+    messages: List[BaseMessage] = field(default_factory=list)
+    summary: ConversationSummary = field(default_factory=ConversationSummary)
+    # Number of messages trimmed from the head by SESSION_MAX_MESSAGES; messages[0] is
+    # message number `offset` of the conversation.
+    offset: int = 0
+
+
+# --- Compact message serialization ---
+# One short JSON object per message; response metadata, usage and ids are dropped since
+# only role, content and tool-call wiring are needed to replay the conversation.
+_TYPE_CODES = {HumanMessage: "h", AIMessage: "a", ToolMessage: "t", SystemMessage: "s"}
+
+
+def message_to_dict(message: BaseMessage) -> Dict[str, Any]:
+    data: Dict[str, Any] = {"t": _TYPE_CODES.get(type(message), "h"), "c": message.content}
+    if isinstance(message, AIMessage) and message.tool_calls:
+        data["tc"] = [{"n": c["name"], "a": c["args"], "i": c["id"]} for c in message.tool_calls]
+    if isinstance(message, ToolMessage):
+        data["i"] = message.tool_call_id
+        if message.name:
+            data["n"] = message.name
+    return data
+
+
+def message_from_dict(data: Dict[str, Any]) -> BaseMessage:
+    kind, content = data["t"], data["c"]
+    if kind == "a":
+        tool_calls = [{"name": c["n"], "args": c["a"], "id": c["i"]} for c in data.get("tc", [])]
+        return AIMessage(content=content, tool_calls=tool_calls)
+    if kind == "t":
+        return ToolMessage(content=content, tool_call_id=data["i"], name=data.get("n"))
+    if kind == "s":
+        return SystemMessage(content=content)
+    return HumanMessage(content=content)
+
+
+def dumps_message(message: BaseMessage) -> str:
+    return json.dumps(message_to_dict(message), separators=(",", ":"), ensure_ascii=False)
+
+
+def loads_message(raw: str) -> BaseMessage:
+    return message_from_dict(json.loads(raw))
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    async def get_session(self, user_id: str) -> Session:
+        """Session of user_id, empty if unknown or expired. Callers must not mutate it."""
+
+    @abstractmethod
+    async def append_messages(self, user_id: str, messages: List[BaseMessage]):
+        ...
+
+    @abstractmethod
+    async def save_summary(self, user_id: str, summary: ConversationSummary):
+        ...
+
+    @abstractmethod
+    async def get_user(self, email: str) -> Optional[models.User]:
+        ...
+
+    @abstractmethod
+    async def create_user(self, user_data: models.UserCreate) -> models.User:
+        """Creates the user with a new unique userID, or returns the existing one for the email."""
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store. Least recently used sessions are evicted past max_sessions,
+    idle ones after ttl_seconds, and each history keeps at most max_messages."""
+
+    def __init__(self, ttl_seconds: int, max_sessions: int, max_messages: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._users: "OrderedDict[str, models.User]" = OrderedDict()
+
+    def _evict(self, now: float):
+        # OrderedDict order is access order, so expired sessions are at the front.
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if len(self._sessions) <= self.max_sessions and now - self._touched[oldest] <= self.ttl_seconds:
+                break
+            del self._sessions[oldest]
+            del self._touched[oldest]
+
+    def _touch(self, user_id: str, create: bool) -> Optional[Session]:
+        now = time.monotonic()
+        self._evict(now)
+        session = self._sessions.get(user_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[user_id] = Session()
+        self._sessions.move_to_end(user_id)
+        self._touched[user_id] = now
+        return session
+
+    async def get_session(self, user_id: str) -> Session:
+        return self._touch(user_id, create=False) or Session()
+
+    async def append_messages(self, user_id: str, messages: List[BaseMessage]):
+        session = self._touch(user_id, create=True)
+        session.messages.extend(messages)
+        overflow = len(session.messages) - self.max_messages
+        if overflow > 0:
+            del session.messages[:overflow]
+            session.offset += overflow
+
+    async def save_summary(self, user_id: str, summary: ConversationSummary):
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.summary = summary
+
+    async def get_user(self, email: str) -> Optional[models.User]:
+        user = self._users.get(email)
+        if user is not None:
+            self._users.move_to_end(email)
+        return user
+
+    async def create_user(self, user_data: models.UserCreate) -> models.User:
+        existing = await self.get_user(user_data.email)
+        if existing is not None:
+            return existing
+        # Random rather than sequential: processes that each keep their own store (several
+        # workers on this backend) must never hand out an ID that another one uses.
+        user = models.User(userID=uuid.uuid4().hex, **user_data.model_dump())
+        self._users[user.email] = user
+        if len(self._users) > self.max_sessions:
+            self._users.popitem(last=False)
+        return user
+
+
+class SQLiteSessionStore(SessionStore):
+    """Persistent store in a WAL-mode SQLite file, safe to share between worker processes.
+
+    All queries run on one dedicated thread with one connection, so the event loop never
+    blocks on disk and statements from this process are naturally serialized.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            user_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL DEFAULT '',
+            covered INTEGER NOT NULL DEFAULT 0,
+            trimmed INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS messages_by_user ON messages (user_id, id);
+        CREATE INDEX IF NOT EXISTS sessions_by_age ON sessions (updated_at);
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL UNIQUE,
+            data TEXT NOT NULL
+        );
+    """
+    PURGE_EVERY_WRITES = 200
+
+    def __init__(self, path: str, ttl_seconds: int, max_messages: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._writes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor.submit(self._connect).result()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # Durable enough with WAL, far fewer fsyncs
+        conn.executescript(self.SCHEMA)
+        self._conn = conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # --- Blocking helpers, executed on the DB thread ---
+    def _get_session(self, user_id: str) -> Session:
+        row = self._conn.execute(
+            "SELECT summary, covered, trimmed, updated_at FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl_seconds:
+            return Session()
+        messages = [loads_message(r[0]) for r in self._conn.execute(
+            "SELECT data FROM messages WHERE user_id = ? ORDER BY id", (user_id,)
+        )]
+        return Session(messages=messages, summary=ConversationSummary(text=row[0], covered=row[1]), offset=row[2])
+
+    def _append_messages(self, user_id: str, rows: List[str]):
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT updated_at FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+            if row is not None and now - row[0] > self.ttl_seconds:
+                self._delete_session(user_id) # Expired: start over like the memory backend
+            self._conn.execute(
+                "INSERT INTO sessions (user_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (user_id, now),
+            )
+            self._conn.executemany("INSERT INTO messages (user_id, data) VALUES (?, ?)", [(user_id, r) for r in rows])
+            count = self._conn.execute("SELECT COUNT(*) FROM messages WHERE user_id = ?", (user_id,)).fetchone()[0]
+            overflow = count - self.max_messages
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE id IN (SELECT id FROM messages WHERE user_id = ? ORDER BY id LIMIT ?)",
+                    (user_id, overflow),
+                )
+                self._conn.execute("UPDATE sessions SET trimmed = trimmed + ? WHERE user_id = ?", (overflow, user_id))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY_WRITES == 0:
+            self._purge_expired()
+
+    def _delete_session(self, user_id: str):
+        self._conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+        self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "DELETE FROM messages WHERE user_id IN (SELECT user_id FROM sessions WHERE updated_at < ?)", (cutoff,)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+    def _save_summary(self, user_id: str, summary: ConversationSummary):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, covered = ? WHERE user_id = ?", (summary.text, summary.covered, user_id)
+            )
+
+    def _get_user(self, email: str) -> Optional[models.User]:
+        row = self._conn.execute("SELECT user_id, data FROM users WHERE email = ?", (email,)).fetchone()
+        if row is None:
+            return None
+        return models.User(userID=str(row[0]), **json.loads(row[1]))
+
+    def _create_user(self, user_data: models.UserCreate) -> models.User:
+        # AUTOINCREMENT hands out unique IDs across every process sharing the file;
+        # INSERT OR IGNORE makes a concurrent start_chat for the same email return one user.
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO users (email, data) VALUES (?, ?)",
+                (user_data.email, json.dumps(user_data.model_dump(), separators=(",", ":"))),
+            )
+        return self._get_user(user_data.email)
+
+    # --- Async interface ---
+    async def get_session(self, user_id: str) -> Session:
+        return await self._run(self._get_session, user_id)
+
+    async def append_messages(self, user_id: str, messages: List[BaseMessage]):
+        if messages:
+            await self._run(self._append_messages, user_id, [dumps_message(m) for m in messages])
+
+    async def save_summary(self, user_id: str, summary: ConversationSummary):
+        await self._run(self._save_summary, user_id, summary)
+
+    async def get_user(self, email: str) -> Optional[models.User]:
+        return await self._run(self._get_user, email)
+
+    async def create_user(self, user_data: models.UserCreate) -> models.User:
+        return await self._run(self._create_user, user_data)
+
+    async def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+
+# Global instance, initialized on startup
+session_store_instance: Optional[SessionStore] = None
+
+def create_session_store() -> SessionStore:
+    backend = settings.SESSION_BACKEND.lower()
+    if backend == "sqlite":
+        logger.info("Using SQLite session store at %s.", settings.SESSION_DB_PATH)
+        return SQLiteSessionStore(settings.SESSION_DB_PATH, settings.SESSION_TTL_SECONDS, settings.SESSION_MAX_MESSAGES)
+    if backend != "memory":
+        logger.warning("Unknown SESSION_BACKEND '%s', using in-memory sessions.", settings.SESSION_BACKEND)
+    return InMemorySessionStore(settings.SESSION_TTL_SECONDS, settings.SESSION_MAX_SESSIONS, settings.SESSION_MAX_MESSAGES)
+
+def initialize_session_store():
+    global session_store_instance
+    if session_store_instance is None:
+        session_store_instance = create_session_store()
+
+def get_session_store() -> Optional[SessionStore]:
+    return session_store_instance
+
+async def close_session_store():
+    global session_store_instance
+    if session_store_instance is not None:
+        await session_store_instance.close()
+        session_store_instance = None
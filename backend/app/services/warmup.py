@@ -0,0 +1,93 @@
+import asyncio
+import importlib
+import logging
+import time
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+from ..core.config import settings
+from .memory import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# --- Background warm-up ---
+# The server accepts connections as soon as the app module is imported. The slow part of
+# startup then runs on a worker thread:
+#   import   LangGraph, langchain_community, FAISS and the Gemini client (app.services.chat_service)
+#   index    load the PDF index from the cache, or build it
+#   service  create the LLM client and compile the graph
+#   tokenizer  load the tiktoken encoding, which the first turn would otherwise pay for
+# Until it has finished, /readyz answers 503 and chat requests get 503 with Retry-After.
+
+chat_service: Optional[ModuleType] = None # app.services.chat_service, set once warm-up has finished
+status: Dict[str, Any] = {"state": "starting", "started_at": None, "ready_at": None, "steps_ms": {}, "error": None}
+_task: Optional[asyncio.Task] = None
+_index_expected = False # PDFs were found, so readiness also needs a loaded index
+
+
+def _step(name: str, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    status["steps_ms"][name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _warm_up() -> ModuleType:
+    global _index_expected
+    module = _step("import", importlib.import_module, ".chat_service", __package__)
+    _index_expected = bool(module._pdf_files())
+    _step("index", module.load_and_process_pdfs)
+    if not settings.GOOGLE_API_KEY or settings.GOOGLE_API_KEY == "your_google_api_key_here":
+        logger.critical("GOOGLE_API_KEY is not set in environment or .env file. Chat functionality will be severely impaired or non-functional.")
+    _step("service", module.initialize_chat_service)
+    _step("tokenizer", count_tokens, "warm-up")
+    return module
+
+
+async def _run():
+    global chat_service
+    status.update(state="warming_up", started_at=time.time())
+    try:
+        module = await asyncio.get_running_loop().run_in_executor(None, _warm_up)
+    except Exception as e:
+        logger.exception("Warm-up failed: %s", e)
+        status.update(state="failed", error=f"{type(e).__name__}: {e}")
+        return
+    # Optional pdf/ watcher that hot-reloads the index (INDEX_WATCH_INTERVAL_SECONDS)
+    module.start_index_watcher()
+    chat_service = module
+    status.update(state="ready", ready_at=time.time())
+    logger.info("Ready after %.0f ms of warm-up (%s).", (status["ready_at"] - status["started_at"]) * 1000, status["steps_ms"])
+
+
+def start():
+    """Starts the warm-up in the background; call from the app lifespan."""
+    global _task
+    if _task is None:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+def is_ready() -> bool:
+    """Warm-up finished and, if there are PDFs, an index is being served."""
+    if chat_service is None:
+        return False
+    return not _index_expected or chat_service.get_vector_store() is not None
+
+
+def readiness() -> Dict[str, Any]:
+    report = dict(status, ready=is_ready())
+    if chat_service is not None:
+        snapshot = chat_service.index_snapshot
+        report["index"] = {
+            "version": snapshot.version,
+            "chunks": snapshot.vector_store.index.ntotal if snapshot.vector_store is not None else 0,
+        }
+    return report
+
+
+async def shutdown():
+    if _task is not None and not _task.done():
+        # The worker thread cannot be interrupted; the process is exiting anyway.
+        _task.cancel()
+    if chat_service is not None:
+        await chat_service.shutdown_chat_service()
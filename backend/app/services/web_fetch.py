@@ -0,0 +1,227 @@
+import asyncio
+import codecs
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+import httpx
+
+from ..core import metrics
+from ..core.config import settings
+from .memory import truncate_to_tokens
+
+# --- Job description fetching ---
+# One pooled AsyncClient for every fetch, a URL-keyed cache with TTL and ETag /
+# Last-Modified revalidation, and an incremental HTML-to-text extractor that drops
+# scripts, styles and page chrome and stops reading once it has enough text.
+
+logger = logging.getLogger(__name__)
+
+# Some websites block default user-agents, so use a common one.
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=settings.HTTP_MAX_CONNECTIONS, max_keepalive_connections=20),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# --- HTML to text ---
+_SKIP_TAGS = {"script", "style", "noscript", "svg", "template", "iframe", "nav", "footer", "button", "select", "canvas"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "table",
+    "section", "article", "header", "main", "aside", "dd", "dt", "blockquote", "pre", "hr",
+}
+_VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "track", "wbr"}
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Collects visible text; feed() it chunks as they arrive."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS and tag not in _VOID_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS and not self._skip_depth:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS and not self._skip_depth:
+            self._newline()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        text = re.sub(r"\s+", " ", data)
+        if text.strip():
+            self.parts.append(text)
+            self.length += len(text)
+
+    def _newline(self):
+        if self.parts and self.parts[-1] != "\n":
+            self.parts.append("\n")
+
+    def text(self) -> str:
+        lines = (line.strip() for line in "".join(self.parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+# --- Cache ---
+@dataclass
+class CachedPage:
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+
+
+class PageCache:
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._pages: "OrderedDict[str, CachedPage]" = OrderedDict()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        page = self._pages.get(url)
+        if page is not None:
+            self._pages.move_to_end(url)
+        return page
+
+    def put(self, url: str, page: CachedPage):
+        self._pages[url] = page
+        self._pages.move_to_end(url)
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+
+    def clear(self):
+        self._pages.clear()
+
+
+page_cache = PageCache(settings.WEB_CACHE_TTL_SECONDS, settings.WEB_CACHE_MAX_ENTRIES)
+stats: Dict[str, int] = {"hits": 0, "revalidated": 0, "misses": 0, "errors": 0}
+# URL -> in-flight fetch, so concurrent requests for one link share a single download
+_in_flight: Dict[str, "asyncio.Task[str]"] = {}
+
+
+async def _download(url: str, cached: Optional[CachedPage]) -> str:
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    async with get_http_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and cached is not None:
+            stats["revalidated"] += 1
+            cached.expires_at = time.monotonic() + page_cache.ttl_seconds
+            logger.info("Revalidated cached content for %s.", url)
+            return cached.text
+        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+
+        content_type = response.headers.get("content-type", "")
+        is_html = "html" in content_type or not content_type
+        extractor = HTMLTextExtractor() if is_html else None
+        plain_parts: List[str] = []
+        # Stop reading once there is comfortably more text than the token cap can keep
+        char_budget = settings.WEB_FETCH_MAX_TOKENS * 6
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        received = extracted = 0
+        async for raw in response.aiter_bytes():
+            raw = raw[:settings.WEB_FETCH_MAX_BYTES - received] # A chunk may be the whole page
+            received += len(raw)
+            chunk = decoder.decode(raw)
+            if extractor is not None:
+                extractor.feed(chunk)
+                extracted = extractor.length
+            else:
+                plain_parts.append(chunk)
+                extracted += len(chunk)
+            if received >= settings.WEB_FETCH_MAX_BYTES or extracted >= char_budget:
+                logger.info("Stopped reading %s after %d bytes.", url, received)
+                break
+        if extractor is not None:
+            extractor.feed(decoder.decode(b"", final=True))
+            extractor.close()
+            text = extractor.text()
+        else:
+            plain_parts.append(decoder.decode(b"", final=True))
+            text = "".join(plain_parts)
+        text = truncate_to_tokens(text, settings.WEB_FETCH_MAX_TOKENS)
+
+        if "no-store" not in response.headers.get("cache-control", ""):
+            page_cache.put(url, CachedPage(
+                text=text,
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                expires_at=time.monotonic() + page_cache.ttl_seconds,
+            ))
+        logger.info("Successfully fetched content from %s (%d bytes read, %d characters kept).", url, received, len(text))
+        return text
+
+
+async def _fetch(url: str, cached: Optional[CachedPage]) -> str:
+    try:
+        if cached is None:
+            stats["misses"] += 1
+        logger.info("Fetching website content from URL: %s", url)
+        with metrics.span("web_fetch"):
+            return await _download(url, cached)
+    except httpx.HTTPStatusError as e:
+        logger.warning("HTTP error fetching %s: %s", url, e.response.status_code)
+        stats["errors"] += 1
+        return f"Error: Could not fetch content due to HTTP status {e.response.status_code}."
+    except httpx.RequestError as e:
+        logger.warning("Request error fetching %s: %s", url, e)
+        stats["errors"] += 1
+        return f"Error: Could not fetch content from URL {url}. Request failed: {type(e).__name__}"
+    except Exception as e:
+        logger.exception("Unexpected error fetching %s: %s", url, e)
+        stats["errors"] += 1
+        return f"Error: An unexpected error occurred while fetching content from {url}."
+    finally:
+        _in_flight.pop(url, None)
+
+
+async def fetch_text(url: str) -> str:
+    """Plain text of the page at url, or an error message meant for the LLM."""
+    cached = page_cache.get(url)
+    if cached is not None and cached.expires_at > time.monotonic():
+        stats["hits"] += 1
+        logger.info("Using cached content for %s.", url)
+        return cached.text
+
+    task = _in_flight.get(url)
+    if task is not None:
+        stats["hits"] += 1
+    else:
+        # The download runs in its own task, so a caller that is cancelled (a closed
+        # stream, a timeout) only stops waiting; the others still get the page.
+        task = asyncio.ensure_future(_fetch(url, cached))
+        _in_flight[url] = task
+    return await asyncio.shield(task)
@@ -0,0 +1,46 @@
+"""p50/p99 chat latency under N parallel conversations against a stubbed LLM.
+
+Usage (from backend/):
+    python -m benchmarks.bench_concurrency --chats 100 --llm-latency 0.2
+    python -m benchmarks.bench_concurrency --blocking   # simulate the old sync LLM call
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services import admission, chat_service
+from benchmarks.fakes import FakeChatModel, percentile
+
+
+async def run(chats: int, llm_latency: float, blocking: bool):
+    corpus = [f"Nebula worked with technology number {i} for {i % 7 + 1} years." for i in range(500)]
+    chat_service.index_snapshot = chat_service.IndexSnapshot(FAISS.from_texts(corpus, DeterministicFakeEmbedding(size=256)), "bench")
+    service = chat_service.ChatService(llm=FakeChatModel(latency=llm_latency, blocking=blocking))
+    # One LLM slot per chat: this measures the async path, not the LLM_MAX_CONCURRENCY cap.
+    admission.llm_limiter = admission.LLMLimiter(max_concurrency=chats, max_queue=0)
+
+    async def one_chat(i: int) -> float:
+        started = time.perf_counter()
+        await service.process_message(str(i), f"What is Nebula's experience with technology {i}?")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one_chat(i) for i in range(chats)))
+    wall = time.perf_counter() - started
+    await chat_service.shutdown_chat_service()
+
+    print(f"chats={chats} llm_latency={llm_latency * 1000:.0f}ms blocking={blocking}")
+    print(f"wall={wall * 1000:.0f}ms throughput={chats / wall:.1f} chats/s")
+    print(f"p50={percentile(latencies, 50) * 1000:.0f}ms p99={percentile(latencies, 99) * 1000:.0f}ms max={max(latencies) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--blocking", action="store_true", help="fake LLM blocks the event loop (old behaviour)")
+    args = parser.parse_args()
+    asyncio.run(run(args.chats, args.llm_latency, args.blocking))
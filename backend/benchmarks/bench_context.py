@@ -0,0 +1,103 @@
+"""Prompt size per LLM step: raw concatenation vs the token-budgeted context assembler.
+
+Splits a synthetic CV PDF with the app's splitter (CHUNK_SIZE / CHUNK_OVERLAP), retrieves
+k chunks per turn (neighbouring chunks, as a query about one role tends to, or random
+ones), and adds a fetched job page (benchmarks.stub_server markup through the real
+extractor) and a conversation history. Prints tokens per section before and after
+assembly and the assembly time.
+
+Time-to-first-token is not measured offline; prefill time grows with input tokens, so
+the "sent" total is the number to compare.
+
+Usage (from backend/):
+    python -m benchmarks.bench_context --turns 200 --history 12 --budget 4000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.core.config import settings
+from app.services import chat_service, context
+from app.services.index_store import load_and_split_pdf
+from app.services.web_fetch import HTMLTextExtractor
+from benchmarks.bench_ingestion import WORDS, make_pdf
+from benchmarks.fakes import percentile
+from benchmarks.stub_server import job_page
+
+
+def job_description() -> str:
+    extractor = HTMLTextExtractor()
+    extractor.feed(job_page("42").decode("utf-8"))
+    extractor.close()
+    return extractor.text()
+
+
+def history(turns: int, rng: random.Random, with_job: bool):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=" ".join(rng.choice(WORDS) for _ in range(20)) + "?"))
+        messages.append(AIMessage(content=" ".join(rng.choice(WORDS) for _ in range(120)) + "."))
+    if with_job:
+        call = {"name": "fetch_job_description_content", "args": {"url": "http://jobs.example/42"}, "id": "call_1"}
+        messages += [
+            HumanMessage(content="How does Nebula fit this role? http://jobs.example/42"),
+            AIMessage(content="", tool_calls=[call]),
+            ToolMessage(content=job_description() * 4, tool_call_id="call_1", name=call["name"]),
+            AIMessage(content=" ".join(rng.choice(WORDS) for _ in range(150)) + "."),
+        ]
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200, help="assembled prompts per scenario")
+    parser.add_argument("--history", type=int, default=12, help="earlier turns in the window")
+    parser.add_argument("--budget", type=int, default=settings.PROMPT_TOKEN_BUDGET)
+    parser.add_argument("-k", type=int, default=settings.RETRIEVAL_K)
+    args = parser.parse_args()
+
+    settings.PROMPT_TOKEN_BUDGET = args.budget
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "cv.pdf")
+        make_pdf(path, [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(60)])
+        chunks = [d.page_content for d in load_and_split_pdf(path)]
+    print(f"{len(chunks)} chunks of <= {settings.CHUNK_SIZE} chars, overlap {settings.CHUNK_OVERLAP}; budget {args.budget} tokens")
+
+    window = history(args.history, rng, with_job=True)
+    for name in ("neighbours", "random"):
+        raw_totals = {s: 0 for s in context.SECTIONS}
+        sent_totals = {s: 0 for s in context.SECTIONS}
+        timings = []
+        for _ in range(args.turns):
+            if name == "neighbours":
+                start = rng.randrange(len(chunks) - args.k + 1)
+                retrieved = chunks[start:start + args.k]
+            else:
+                retrieved = rng.sample(chunks, args.k)
+            state = {
+                "messages": [HumanMessage(content="What did Nebula build with Kubernetes?")],
+                "history": window,
+                "conversation_summary": " ".join(rng.choice(WORDS) for _ in range(150)),
+                "retrieved_docs": retrieved,
+            }
+            started = time.perf_counter()
+            prompt = chat_service.assemble_prompt(state)
+            timings.append((time.perf_counter() - started) * 1000)
+            for section in context.SECTIONS:
+                raw_totals[section] += prompt.raw_tokens[section]
+                sent_totals[section] += prompt.tokens[section]
+        print(f"\n{name} chunks: assembly p50={percentile(timings, 50):.2f}ms p99={percentile(timings, 99):.2f}ms")
+        for section in context.SECTIONS:
+            raw, sent = raw_totals[section] / args.turns, sent_totals[section] / args.turns
+            print(f"  {section:16s} {raw:8.0f} -> {sent:8.0f} tokens")
+        raw, sent = sum(raw_totals.values()) / args.turns, sum(sent_totals.values()) / args.turns
+        print(f"  {'total':16s} {raw:8.0f} -> {sent:8.0f} tokens ({1 - sent / raw:.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Retrieval modes: k=3 vector search (the old path) vs BM25, hybrid (RRF) and auto.
+
+Builds a labelled synthetic CV corpus: every chunk names the company and technologies
+it is about, so the relevant chunks of a query are known. Two query sets are run one
+query at a time:
+    keyword   "Kubernetes", "Acme Robotics"          relevant: chunks naming the term
+    question  "How did Nebula use PyTorch at Acme?"  relevant: chunks naming both
+Vectors come from the hashing embedder wrapped with a fixed per-call delay standing in
+for the embedding API round trip. Hashing vectors only capture word overlap, so absolute
+recall says little about a real embedding model; latency and embedding calls saved hold.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hybrid --chunks 2000 --latency 0.03
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from langchain_community.vectorstores import FAISS
+
+from app.core.config import settings
+from app.services import chat_service
+from app.services.bm25 import BM25Index
+from app.services.embeddings import HashingEmbeddings
+from benchmarks.fakes import percentile
+
+TECHS = [
+    "Kubernetes", "PyTorch", "TensorFlow", "LangChain", "FAISS", "FastAPI", "Django", "Postgres", "Redis", "Kafka",
+    "Airflow", "Spark", "Terraform", "Docker", "React", "TypeScript", "Rust", "Golang", "Snowflake", "BigQuery",
+    "SageMaker", "Vertex", "ONNX", "Triton", "Ray", "Dask", "Pandas", "NumPy", "GraphQL", "gRPC",
+]
+COMPANIES = ["Acme Robotics", "Globex", "Initech", "Umbrella Health", "Hooli", "Stark Industries", "Wayne Analytics", "Tyrell Labs"]
+VERBS = ["built", "deployed", "scaled", "migrated", "designed", "optimized", "led the adoption of", "maintained"]
+FILLER = [
+    "The team shipped weekly and owned the service end to end.",
+    "Latency dropped and reliability improved after the rollout.",
+    "Stakeholders across product and research relied on the results.",
+    "The work included mentoring engineers and writing design documents.",
+]
+
+
+class SlowHashingEmbeddings(HashingEmbeddings):
+    """Hashing vectors with a fixed delay per call, like one embedding API round trip."""
+
+    def __init__(self, latency: float):
+        super().__init__(dim=768)
+        self.latency = latency
+        self.calls = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return super().embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return super().embed_query(text)
+
+
+def build_corpus(chunks: int, rng: random.Random):
+    texts, labels = [], []
+    for _ in range(chunks):
+        company = rng.choice(COMPANIES)
+        techs = rng.sample(TECHS, 2)
+        texts.append(
+            f"At {company}, Nebula {rng.choice(VERBS)} {techs[0]} and {techs[1]}. " + " ".join(rng.sample(FILLER, 2))
+        )
+        labels.append({company, *techs})
+    return texts, labels
+
+
+def build_queries(labels, rng: random.Random, count: int):
+    keyword, question = [], []
+    for _ in range(count):
+        term = rng.choice(TECHS + COMPANIES)
+        keyword.append((term, {i for i, l in enumerate(labels) if term in l}))
+        tech, company = rng.choice(TECHS), rng.choice(COMPANIES)
+        relevant = {i for i, l in enumerate(labels) if tech in l and company in l}
+        if relevant:
+            question.append((f"How did Nebula use {tech} at {company}?", relevant))
+    return keyword, question
+
+
+async def run_set(name: str, queries, snapshot, rows_by_text, embeddings: SlowHashingEmbeddings, k: int):
+    for mode in ("vector", "lexical", "hybrid", "auto"):
+        embeddings.calls = 0
+        latencies, recalls, used = [], [], {}
+        for query, relevant in queries:
+            started = time.perf_counter()
+            docs, used_mode = await chat_service.retrieve(snapshot, query, mode, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found = {rows_by_text[d.page_content] for d in docs}
+            recalls.append(len(found & relevant) / min(k, len(relevant)))
+            used[used_mode] = used.get(used_mode, 0) + 1
+        label = "vector (k=3 baseline)" if mode == "vector" else mode
+        print(
+            f"{name:8s} {label:22s} p50={percentile(latencies, 50):7.2f}ms p95={percentile(latencies, 95):7.2f}ms "
+            f"recall@{k}={sum(recalls) / len(recalls):.3f} embedding calls={embeddings.calls:4d} modes={used}"
+        )
+
+
+async def main(chunks: int, queries: int, latency: float, k: int):
+    rng = random.Random(0)
+    texts, labels = build_corpus(chunks, rng)
+    embeddings = SlowHashingEmbeddings(latency) # Only queries are delayed; indexing is not measured
+    vector_store = FAISS.from_texts(texts, embeddings)
+
+    started = time.perf_counter()
+    lexical = BM25Index.from_vector_store(vector_store)
+    print(f"BM25 index over {chunks} chunks built in {(time.perf_counter() - started) * 1000:.1f} ms")
+    snapshot = chat_service.IndexSnapshot(vector_store, "bench", lexical_index=lexical)
+    # Identical chunk texts are possible; any of them counts as the same hit.
+    rows_by_text = {}
+    for row, text in enumerate(texts):
+        rows_by_text.setdefault(text, row)
+
+    keyword, question = build_queries(labels, rng, queries)
+    await run_set("keyword", keyword, snapshot, rows_by_text, embeddings, k)
+    await run_set("question", question, snapshot, rows_by_text, embeddings, k)
+    await chat_service.shutdown_chat_service()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per set")
+    parser.add_argument("--latency", type=float, default=0.03, help="embedding API round trip, seconds")
+    parser.add_argument("-k", type=int, default=settings.RETRIEVAL_K)
+    args = parser.parse_args()
+    asyncio.run(main(args.chunks, args.queries, args.latency, args.k))
@@ -0,0 +1,123 @@
+"""PDF ingestion: the old sequential load-everything-then-embed loop vs the staged pipeline.
+
+Generates synthetic one-page CV PDFs in a temp directory and indexes them with the
+hashing embedder (no network). Each mode runs in a fresh subprocess so peak RSS is
+comparable; the pipeline starts from an empty index cache.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingestion --files 200 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+WORDS = (
+    "python kubernetes pytorch langchain faiss docker aws machine learning engineer "
+    "built deployed led team latency retrieval evaluation fastapi postgres kafka"
+).split()
+
+
+def make_pdf(path: str, lines):
+    """Minimal single-page PDF with Helvetica text; enough for PyPDFLoader."""
+    content = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def run_mode(mode: str, pdf_dir: str, cache_dir: str, workers: int):
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "hashing",
+        "EMBEDDING_WORKERS": "1",
+        "INGEST_WORKERS": str(workers),
+        "INDEX_CACHE_DIR": cache_dir,
+    })
+    import glob
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from app.services import ingestion
+    from app.services.embeddings import create_embeddings
+    from app.services.index_store import load_and_split_pdf
+
+    files = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
+    embeddings = create_embeddings()
+    started = time.perf_counter()
+    if mode == "sequential":
+        all_docs = []
+        for path in files:
+            all_docs.extend(load_and_split_pdf(path))
+        vectors = embeddings.embed_documents([d.page_content for d in all_docs])
+        store = FAISS.from_embeddings(
+            list(zip([d.page_content for d in all_docs], np.asarray(vectors).tolist())), embeddings,
+            metadatas=[d.metadata for d in all_docs],
+        )
+        chunks = store.index.ntotal
+    else:
+        chunks = ingestion.ingest(files, embeddings).vector_store.index.ntotal
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; children covers the parse workers
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "chunks": chunks, "seconds": elapsed, "rss_mb": rss, "worker_rss_mb": child_rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=60, help="text lines per PDF")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--run", choices=["sequential", "pipeline"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_mode(args.run, args.pdf_dir, args.cache_dir, args.workers)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_ingestion_")
+    try:
+        pdf_dir = os.path.join(workdir, "pdf")
+        os.makedirs(pdf_dir)
+        rng = random.Random(0)
+        for i in range(args.files):
+            make_pdf(os.path.join(pdf_dir, f"cv{i:04d}.pdf"), [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(args.lines)])
+        for mode in ("sequential", "pipeline"):
+            cache_dir = os.path.join(workdir, f"cache_{mode}")
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingestion", "--run", mode, "--pdf-dir", pdf_dir,
+                 "--cache-dir", cache_dir, "--workers", str(args.workers)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{mode:10s} files={args.files} chunks={result['chunks']} time={result['seconds']:.2f}s "
+                f"peak rss={result['rss_mb']:.0f}MB (parse workers {result['worker_rss_mb']:.0f}MB each)"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-turn overhead of building the LLM client/prompt/chain vs reusing them.
+
+Both variants call a zero-latency fake model, so the numbers are pure setup overhead
+on our side. The "rebuild" variant mirrors the old llm_call_node, which constructed
+ChatGoogleGenerativeAI, bind_tools and the ChatPromptTemplate on every graph step.
+
+Usage (from backend/):
+    python -m benchmarks.bench_llm_overhead --turns 200
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from app.services import chat_service
+from benchmarks.fakes import FakeChatModel, percentile
+
+STATE = {"messages": [HumanMessage(content="What is Nebula's Python experience?")], "retrieved_docs": ["Nebula wrote Python for 13 years."] * 3}
+
+
+async def rebuild_turn(fake: FakeChatModel):
+    prompt = ChatPromptTemplate.from_messages([
+        SystemMessage(content=chat_service.SYSTEM_PROMPT_TEMPLATE.format(context="\n".join(STATE["retrieved_docs"]), job_description="", conversation_summary="")),
+        MessagesPlaceholder(variable_name="messages"),
+    ])
+    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key="benchmark-fake-key", convert_system_message_to_human=True)
+    llm.bind_tools([chat_service.fetch_website_content], tool_choice=None)
+    # The real client is built but not called; the fake stands in for the network round-trip.
+    await (prompt | fake).ainvoke({"messages": STATE["messages"]})
+
+
+async def run(turns: int):
+    fake = FakeChatModel(latency=0.0)
+    service = chat_service.ChatService(llm=fake)
+
+    async def measure(turn):
+        samples = []
+        for _ in range(turns):
+            started = time.perf_counter()
+            await turn()
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    await rebuild_turn(fake)  # warm imports and lazy module state
+    before = await measure(lambda: rebuild_turn(fake))
+    after = await measure(lambda: service.chain.ainvoke(chat_service.build_prompt_inputs(STATE)))
+    for name, samples in (("rebuild per turn", before), ("reused chain", after)):
+        print(f"{name:>16}: p50={percentile(samples, 50) * 1000:.2f}ms p99={percentile(samples, 99) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns))
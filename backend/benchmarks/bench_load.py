@@ -0,0 +1,297 @@
+"""Offline load test of the whole service: app.main:app under uvicorn, driven over HTTP.
+
+The server runs in a subprocess with the Gemini chat model and embeddings replaced by
+the fakes in benchmarks.fakes (configurable latency) and indexes a directory of
+synthetic CV PDFs; job URLs point at benchmarks.stub_server. Each simulated user calls
+/api/chat/start once and then holds a conversation of --turns /api/chat calls; every
+--url-every-th message carries a job URL, so the tool path and web fetch run too.
+
+Reported: startup time (process start until /readyz reports ready), throughput, p50/p95/p99
+turn latency, and server RSS before, during and after the conversations. Results are
+written to benchmarks/results/ and compared with the latest earlier run that used the
+same parameters.
+
+Usage (from backend/):
+    python -m benchmarks.bench_load --users 20 --turns 20 --llm-latency 0.2
+    python -m benchmarks.bench_load --set SEMANTIC_CACHE_ENABLED=true --label semantic-cache
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_ingestion import WORDS, make_pdf
+from benchmarks.fakes import percentile
+from benchmarks.stub_server import StubServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What is Nebula's experience with {tech}?",
+    "Has Nebula used {tech} in production?",
+    "How many years has Nebula worked with {tech}?",
+    "Tell me about a project where Nebula built something with {tech}.",
+    "Why would Nebula be a good fit for a team using {tech}?",
+]
+TECHS = ["Python", "Kubernetes", "PyTorch", "LangChain", "FAISS", "FastAPI", "Kafka", "Postgres", "Docker", "AWS"]
+
+# Metrics that get worse when they go up; a change beyond REGRESSION_THRESHOLD is flagged.
+COMPARED = ["startup_seconds", "p50_ms", "p95_ms", "p99_ms", "rss_growth_mb"]
+REGRESSION_THRESHOLD = 0.10
+
+
+# --- Server side (runs in the subprocess) ---
+def serve(port: int, llm_latency: float, embed_latency: float):
+    """Boots app.main:app with the fakes injected in place of Gemini."""
+    import uvicorn
+    from app.services import chat_service
+    from benchmarks.fakes import FakeAgentChatModel, FakeEmbeddings
+
+    # ChatService() and get_embeddings() look these factories up at call time, so the
+    # unmodified lifespan builds the service around the fakes.
+    chat_service.create_llm = lambda: FakeAgentChatModel(latency=llm_latency)
+    chat_service.create_embeddings = lambda: FakeEmbeddings(size=256, latency=embed_latency)
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+# --- Driver ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None # Not Linux, or the process is gone
+
+
+def make_corpus(pdf_dir: str, files: int):
+    rng = random.Random(0)
+    for i in range(files):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(60)]
+        make_pdf(os.path.join(pdf_dir, f"cv{i:03d}.pdf"), lines)
+
+
+async def wait_until_up(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup with code {process.returncode}.")
+        try:
+            # The index and the graph are built in the background after the server starts.
+            if (await client.get("/readyz")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError("Server did not start in time.")
+
+
+async def simulate_user(client: httpx.AsyncClient, user: int, turns: int, url_every: int, job_base_url: str,
+                        latencies: List[float], errors: Dict[str, int]):
+    rng = random.Random(user)
+    response = await client.post("/api/chat/start", json={
+        "name": f"Load User {user}", "email": f"load-{user}@example.com", "organisation": "Load Test", "position": "CTO",
+    })
+    response.raise_for_status()
+    user_id = response.json()["userID"]
+    for turn in range(turns):
+        message = rng.choice(QUESTIONS).format(tech=rng.choice(TECHS))
+        if url_every and (turn + 1) % url_every == 0:
+            message = f"How well does Nebula match this job? {job_base_url}/jobs/{rng.randrange(50)}"
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/chat", json={"message": message, "userId": user_id})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+
+async def sample_rss(pid: int, samples: List[float], interval: float = 0.25):
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(interval)
+
+
+async def drive(args, env: Dict[str, str]) -> Dict:
+    port = _free_port()
+    with StubServer(latency=args.web_latency) as stub:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_load", "--serve", "--port", str(port),
+             "--llm-latency", str(args.llm_latency), "--embed-latency", str(args.embed_latency)],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+            timeout = httpx.Timeout(120.0)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=timeout) as client:
+                await wait_until_up(client, process)
+                startup = time.perf_counter() - started
+                rss_idle = rss_mb(process.pid)
+
+                latencies: List[float] = []
+                errors: Dict[str, int] = {}
+                samples: List[float] = []
+                sampler = asyncio.create_task(sample_rss(process.pid, samples))
+                started = time.perf_counter()
+                await asyncio.gather(*(
+                    simulate_user(client, user, args.turns, args.url_every, stub.base_url, latencies, errors)
+                    for user in range(args.users)
+                ))
+                wall = time.perf_counter() - started
+                sampler.cancel()
+                rss_end = rss_mb(process.pid)
+                web_requests = stub.requests
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    return {
+        "startup_seconds": round(startup, 3),
+        "turns": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_turns_per_s": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+        "rss_idle_mb": rss_idle,
+        "rss_peak_mb": max(samples, default=None),
+        "rss_end_mb": rss_end,
+        "rss_growth_mb": round(rss_end - rss_idle, 1) if rss_end is not None and rss_idle is not None else None,
+        "web_fetches": web_requests,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(params: Dict) -> Optional[Dict]:
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, "load-*.json")), reverse=True):
+        with open(path) as f:
+            result = json.load(f)
+        if result.get("params") == params:
+            result["path"] = os.path.relpath(path, BACKEND_DIR)
+            return result
+    return None
+
+
+def report(result: Dict, previous: Optional[Dict]):
+    r = result["results"]
+    print(f"startup        {r['startup_seconds']:.2f}s")
+    print(f"turns          {r['turns']} in {r['wall_seconds']:.1f}s ({r['throughput_turns_per_s']:.1f}/s), errors={r['errors'] or 0}")
+    print(f"latency        p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms p99={r['p99_ms']:.0f}ms max={r['max_ms']:.0f}ms")
+    if r["rss_idle_mb"] is not None:
+        print(f"server rss     idle={r['rss_idle_mb']:.0f}MB peak={r['rss_peak_mb']:.0f}MB end={r['rss_end_mb']:.0f}MB (+{r['rss_growth_mb']:.1f}MB)")
+    print(f"web fetches    {r['web_fetches']} requests reached the stub server")
+    if previous is None:
+        print("No earlier run with the same parameters to compare with.")
+        return
+    print(f"compared with {previous['path']} ({previous.get('commit')}):")
+    before = previous["results"]
+    for key in COMPARED + ["throughput_turns_per_s"]:
+        old, new = before.get(key), r.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if key == "throughput_turns_per_s" else change
+        flag = "  REGRESSION" if worse > REGRESSION_THRESHOLD else ""
+        print(f"  {key:24s} {old:>9} -> {new:>9} ({change:+.1%}){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=20, help="chat turns per user")
+    parser.add_argument("--url-every", type=int, default=5, help="every n-th message links a job posting (0: never)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per fake embedding call")
+    parser.add_argument("--web-latency", type=float, default=0.1, help="seconds per stub job page request")
+    parser.add_argument("--pdfs", type=int, default=20, help="synthetic CV PDFs to index")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="extra server setting, repeatable")
+    parser.add_argument("--label", default="", help="free-form note stored with the results")
+    parser.add_argument("--no-save", action="store_true", help="do not write benchmarks/results/")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port, args.llm_latency, args.embed_latency)
+        return
+
+    overrides = dict(item.split("=", 1) for item in args.set)
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    try:
+        pdf_dir = os.path.join(workdir, "pdf")
+        os.makedirs(pdf_dir)
+        make_corpus(pdf_dir, args.pdfs)
+        env = dict(os.environ)
+        env.update({
+            "PDF_DIRECTORY": pdf_dir,
+            "INDEX_CACHE_DIR": os.path.join(workdir, "index_cache"), # Cold start: the index is built
+            "EMBEDDING_PROVIDER": "fake",
+            "GOOGLE_API_KEY": "benchmark-fake-key",
+            "SESSION_BACKEND": "memory",
+            "LOG_LEVEL": "WARNING",
+            # Simulated users send back to back; --set USER_RATE_LIMIT_PER_MINUTE=20 tests the limiter.
+            "USER_RATE_LIMIT_PER_MINUTE": "0",
+        })
+        env.update(overrides)
+        result = asyncio.run(drive(args, env))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    params = {
+        "users": args.users, "turns": args.turns, "url_every": args.url_every, "llm_latency": args.llm_latency,
+        "embed_latency": args.embed_latency, "web_latency": args.web_latency, "pdfs": args.pdfs, "settings": overrides,
+    }
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "label": args.label,
+        "host": {"python": sys.version.split()[0], "cpus": os.cpu_count()},
+        "params": params,
+        "results": result,
+    }
+    report(record, previous_result(params))
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+            f.write("\n")
+        print(f"saved {os.path.relpath(path, BACKEND_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
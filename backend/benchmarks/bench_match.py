@@ -0,0 +1,72 @@
+"""Matching Nebula against many job postings: one chat turn per URL vs one batch.
+
+  sequential  what a recruiter does today: one process_message turn per job URL, each
+              waiting for the previous one (prefetch, retrieval, LLM call)
+  batch       ChatService.stream_job_matches over all URLs: concurrent fetches, retrieval
+              per distinct query, at most MATCH_MAX_CONCURRENCY LLM calls at once
+
+Job pages come from benchmarks.stub_server with --page-latency, the LLM is FakeAgentChatModel
+with --llm-latency. Each mode uses its own job URLs, so neither is served from the page
+cache of the other.
+
+Usage (from backend/):
+    python -m benchmarks.bench_match --jobs 10 --llm-latency 0.5 --page-latency 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_community.vectorstores import FAISS
+
+from app.core.config import settings
+from app.services import chat_service
+from benchmarks.fakes import FakeAgentChatModel, FakeEmbeddings
+from benchmarks.stub_server import StubServer
+
+
+async def sequential(service: chat_service.ChatService, urls):
+    first = None
+    started = time.perf_counter()
+    for url in urls:
+        await service.process_message("bench", f"How well does Nebula match this job? {url}")
+        first = first or time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def batch(service: chat_service.ChatService, urls):
+    first = None
+    started = time.perf_counter()
+    async for event, payload in service.stream_job_matches(urls):
+        if event == "match":
+            assert not payload["error"], payload["response"]
+            first = first or time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def run(args):
+    corpus = [f"Nebula worked with technology number {i} for {i % 7 + 1} years." for i in range(500)]
+    embeddings = FakeEmbeddings(size=256, latency=0.0)
+    vector_store = FAISS.from_texts(corpus, embeddings)
+    embeddings.latency = args.embed_latency
+    chat_service.index_snapshot = chat_service.IndexSnapshot(vector_store, "bench")
+    service = chat_service.ChatService(llm=FakeAgentChatModel(latency=args.llm_latency))
+
+    print(f"jobs={args.jobs} llm_latency={args.llm_latency * 1000:.0f}ms page_latency={args.page_latency * 1000:.0f}ms "
+          f"MATCH_MAX_CONCURRENCY={settings.MATCH_MAX_CONCURRENCY}")
+    with StubServer(latency=args.page_latency) as server:
+        for offset, (name, mode) in enumerate((("sequential", sequential), ("batch", batch))):
+            urls = [f"{server.base_url}/jobs/{offset * args.jobs + i}" for i in range(args.jobs)]
+            requests, embed_calls = server.requests, embeddings.calls
+            first, total = await mode(service, urls)
+            print(f"{name:10s} first result {first * 1000:6.0f}ms  all {total * 1000:6.0f}ms  "
+                  f"page fetches {server.requests - requests}  embedding calls {embeddings.calls - embed_calls}")
+    await chat_service.shutdown_chat_service()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--page-latency", type=float, default=0.3, help="seconds per job page")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per embedding call")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,125 @@
+"""Retrieval: per-turn query embedding + FAISS search, and flat vs HNSW vs IVF indexes.
+
+Part 1 replays a burst of concurrent questions (with repeats, as real traffic has)
+through the old path (similarity_search in the thread pool, one embedding call per
+turn) and the new one (cached, micro-batched aembed_query + search by vector).
+Part 2 compares the index types on a synthetic clustered corpus: build time, search
+latency and recall@k against the exact flat index.
+
+Usage (from backend/):
+    python -m benchmarks.bench_retrieval --requests 200 --distinct 40 --latency 0.03
+"""
+import argparse
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from app.core.config import settings
+from app.services import index_store
+from app.services.embeddings import CachedQueryEmbeddings
+from benchmarks.fakes import FakeEmbeddings, percentile
+
+TOPICS = ["Python", "Kubernetes", "LLM evaluation", "team leadership", "RAG pipelines", "MLOps", "FastAPI", "data engineering"]
+
+
+def build_corpus_store(embeddings, chunks: int) -> FAISS:
+    texts = [f"Nebula worked on {TOPICS[i % len(TOPICS)]} project #{i} and shipped it to production." for i in range(chunks)]
+    return FAISS.from_texts(texts, embeddings)
+
+
+async def run_queries(search, questions):
+    latencies = []
+
+    async def one(question):
+        started = time.perf_counter()
+        await search(question)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return (time.perf_counter() - started) * 1000, latencies
+
+
+async def query_path(requests: int, distinct: int, latency: float, chunks: int):
+    pool = [f"What did Nebula do with {TOPICS[i % len(TOPICS)]}? (variant {i})" for i in range(distinct)]
+    rng = random.Random(7)
+    questions = [rng.choice(pool) for _ in range(requests)]
+    executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_MAX_WORKERS)
+    loop = asyncio.get_running_loop()
+
+    baseline_embeddings = FakeEmbeddings(latency=latency)
+    baseline_store = build_corpus_store(FakeEmbeddings(latency=0), chunks)
+    baseline_store.embedding_function = baseline_embeddings
+
+    async def baseline(question):
+        await loop.run_in_executor(executor, functools.partial(baseline_store.similarity_search, question, k=3))
+
+    inner = FakeEmbeddings(latency=latency)
+    cached = CachedQueryEmbeddings(
+        inner,
+        cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+        batch_window_ms=settings.QUERY_EMBEDDING_BATCH_WINDOW_MS,
+        max_batch_size=settings.QUERY_EMBEDDING_MAX_BATCH,
+    )
+    store = build_corpus_store(FakeEmbeddings(latency=0), chunks)
+
+    async def batched(question):
+        vector = await cached.aembed_query(question)
+        await loop.run_in_executor(executor, functools.partial(store.similarity_search_by_vector, vector, k=3))
+
+    for name, search, counter in (("thread pool, 1 call/turn", baseline, baseline_embeddings), ("cached + batched", batched, inner)):
+        total_ms, latencies = await run_queries(search, questions)
+        print(
+            f"{name:26s} total={total_ms:8.1f}ms p50={percentile(latencies, 50):7.1f}ms "
+            f"p95={percentile(latencies, 95):7.1f}ms embedding calls={counter.calls}"
+        )
+    print(f"query embedding stats: {cached.stats}")
+    executor.shutdown()
+
+
+def index_types(vectors: int, dim: int, queries: int, k: int):
+    rng = np.random.RandomState(0)
+    centers = rng.standard_normal((max(1, vectors // 100), dim)).astype(np.float32)
+    data = centers[rng.randint(len(centers), size=vectors)] + 0.3 * rng.standard_normal((vectors, dim)).astype(np.float32)
+    query = data[rng.choice(vectors, queries, replace=False)] + 0.1 * rng.standard_normal((queries, dim)).astype(np.float32)
+
+    exact = None
+    for kind in ("flat", "hnsw", "ivf"):
+        settings.VECTOR_INDEX_TYPE = kind
+        started = time.perf_counter()
+        index = index_store.create_faiss_index(data)
+        build_ms = (time.perf_counter() - started) * 1000
+        timings = []
+        found = np.empty((queries, k), dtype=np.int64)
+        for i in range(queries):
+            started = time.perf_counter()
+            _, ids = index.search(query[i:i + 1], k)
+            timings.append((time.perf_counter() - started) * 1000)
+            found[i] = ids[0]
+        if exact is None:
+            exact = found
+        recall = np.mean([len(set(found[i]) & set(exact[i])) / k for i in range(queries)])
+        print(
+            f"{kind:5s} ({type(index).__name__:13s}) build={build_ms:8.1f}ms "
+            f"search p50={percentile(timings, 50):.3f}ms p95={percentile(timings, 95):.3f}ms recall@{k}={recall:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="concurrent questions in the burst")
+    parser.add_argument("--distinct", type=int, default=40, help="distinct questions among them")
+    parser.add_argument("--latency", type=float, default=0.03, help="fake embedding API round trip, seconds")
+    parser.add_argument("--chunks", type=int, default=500, help="CV chunks in the store for part 1")
+    parser.add_argument("--vectors", type=int, default=50000, help="corpus size for part 2")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(query_path(args.requests, args.distinct, args.latency, args.chunks))
+    index_types(args.vectors, args.dim, args.queries, args.k)
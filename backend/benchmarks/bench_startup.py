@@ -0,0 +1,112 @@
+"""Startup: import time of app.main and time until the server is live and ready.
+
+Starts `uvicorn app.main:app` in a subprocess over --pdfs synthetic CV PDFs, with hashing
+embeddings (no network). The Gemini client is created with a dummy key but never
+called. The script polls:
+
+  live   first response to GET /healthz (connections are being accepted)
+  ready  first 200 from GET /readyz (index loaded, graph compiled)
+
+A cold run starts with an empty index cache. Warm runs reuse the cache from the previous
+run, like a container restart with a persistent volume. Import times are measured in
+fresh interpreters.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 3 --pdfs 20
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_load import BACKEND_DIR, _free_port, make_corpus, rss_mb
+from benchmarks.fakes import percentile
+
+IMPORTS = ["app.main", "app.services.chat_service"]
+
+
+def import_seconds(module: str, env: Dict[str, str]) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def start_server(env: Dict[str, str], timeout: float = 120.0) -> Dict[str, float]:
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    live = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5.0) as client:
+            deadline = started + timeout
+            while ready is None and time.perf_counter() < deadline:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited during startup with code {process.returncode}.")
+                try:
+                    if live is None and client.get("/healthz").status_code:
+                        live = time.perf_counter() - started
+                    if client.get("/readyz").status_code == 200:
+                        ready = time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            if ready is None:
+                raise RuntimeError("Server did not become ready in time.")
+            return {"live": live, "ready": ready, "rss_mb": rss_mb(process.pid) or 0.0}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def summary(values: List[float], unit: str = "s") -> str:
+    return f"p50={percentile(values, 50):.2f}{unit} max={max(values):.2f}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="measurements of each kind")
+    parser.add_argument("--pdfs", type=int, default=20, help="synthetic CV PDFs to index")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        pdf_dir = os.path.join(workdir, "pdf")
+        os.makedirs(pdf_dir)
+        make_corpus(pdf_dir, args.pdfs)
+        env = dict(os.environ)
+        env.update({
+            "PDF_DIRECTORY": pdf_dir,
+            "INDEX_CACHE_DIR": os.path.join(workdir, "index_cache"),
+            "EMBEDDING_PROVIDER": "hashing",
+            "GOOGLE_API_KEY": "benchmark-fake-key",
+            "SESSION_BACKEND": "memory",
+            "LOG_LEVEL": "WARNING",
+        })
+
+        for module in IMPORTS:
+            times = [import_seconds(module, env) for _ in range(args.runs)]
+            print(f"import {module:28s} {summary(times)}")
+
+        for kind in ("cold", "warm"):
+            runs = []
+            for _ in range(args.runs):
+                if kind == "cold":
+                    shutil.rmtree(env["INDEX_CACHE_DIR"], ignore_errors=True)
+                runs.append(start_server(env))
+            print(f"{kind} start  live {summary([r['live'] for r in runs])}  ready {summary([r['ready'] for r in runs])}"
+                  f"  rss {percentile([r['rss_mb'] for r in runs], 50):.0f}MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Job description fetch: cold vs cached vs revalidated, and prompt size after extraction.
+
+Runs against benchmarks.stub_server, so no network access is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_web_fetch --latency 0.1
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services import web_fetch
+from app.services.memory import count_tokens
+from benchmarks.stub_server import StubServer, job_page
+
+
+async def timed(url: str):
+    started = time.perf_counter()
+    text = await web_fetch.fetch_text(url)
+    return text, (time.perf_counter() - started) * 1000
+
+
+async def run(latency: float, concurrent: int):
+    with StubServer(latency=latency) as server:
+        url = f"{server.base_url}/jobs/42"
+        raw = job_page("42").decode("utf-8")
+
+        text, cold_ms = await timed(url)
+        _, cached_ms = await timed(url)
+        web_fetch.page_cache.get(url).expires_at = 0  # force revalidation
+        _, revalidated_ms = await timed(url)
+
+        web_fetch.page_cache.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(web_fetch.fetch_text(url) for _ in range(concurrent)))
+        burst_ms = (time.perf_counter() - started) * 1000
+        await web_fetch.close_http_client()
+
+        print(f"raw page: {len(raw)} chars, {count_tokens(raw)} tokens")
+        print(f"extracted: {len(text)} chars, {count_tokens(text)} tokens (cap {settings.WEB_FETCH_MAX_TOKENS})")
+        print(f"cold={cold_ms:.1f}ms cached={cached_ms:.2f}ms revalidated(304)={revalidated_ms:.1f}ms")
+        print(f"{concurrent} concurrent fetches of one URL: {burst_ms:.1f}ms")
+        print(f"stub server saw {server.requests} requests ({server.not_modified} answered 304); stats={web_fetch.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub server delay per request, seconds")
+    parser.add_argument("--concurrent", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, args.concurrent))
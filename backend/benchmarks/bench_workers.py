@@ -0,0 +1,132 @@
+"""Memory per worker process: index held in each process vs memory-mapped from the cache.
+
+Saves a synthetic index (--chunks chunks of about CHUNK_SIZE characters, --dim
+dimensions) with the app's IndexStore, then starts --workers processes that each load it
+and search every vector once, so all pages are touched:
+
+  memory  vectors read into the process and chunks decoded into an InMemoryDocstore
+          (what every worker held before)
+  mmap    IndexStore.load_index: FAISS index and chunks.jsonl memory-mapped read-only
+
+PSS (proportional set size) charges a shared page to each of the processes mapping it,
+so the sum over workers is what the deployment really costs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_workers --workers 4 --chunks 20000 --dim 768
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from app.core.config import settings
+from app.services.index_store import IndexStore
+from benchmarks.bench_ingestion import WORDS
+from benchmarks.fakes import FakeEmbeddings
+
+KEY = "bench"
+
+
+def memory_mb() -> Dict[str, float]:
+    """Rss, Pss and private memory of this process from /proc (Linux only)."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def build(cache_dir: str, chunks: int, dim: int):
+    rng = random.Random(0)
+    words_per_chunk = settings.CHUNK_SIZE // 8
+    texts = [" ".join(rng.choice(WORDS) for _ in range(words_per_chunk)) for _ in range(chunks)]
+    vectors = np.random.RandomState(0).standard_normal((chunks, dim)).astype(np.float32)
+    store = FAISS.from_embeddings(zip(texts, vectors.tolist()), FakeEmbeddings(size=dim))
+    IndexStore(cache_dir).save_index(KEY, store)
+
+
+def load(cache_dir: str, mode: str, dim: int) -> FAISS:
+    store = IndexStore(cache_dir)
+    if mode == "mmap":
+        return store.load_index(KEY, FakeEmbeddings(size=dim))
+    # Before: the whole index and every chunk as Python objects in each process.
+    path = os.path.join(store.index_dir, KEY)
+    loaded = store.load_index(KEY, FakeEmbeddings(size=dim))
+    docs = {str(row): loaded.docstore.search(row) for row in range(len(loaded.index_to_docstore_id))}
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    return FAISS(FakeEmbeddings(size=dim), index, InMemoryDocstore(docs), {row: str(row) for row in range(len(docs))})
+
+
+def child(cache_dir: str, mode: str, dim: int):
+    before = memory_mb()
+    vector_store = load(cache_dir, mode, dim)
+    # A flat search reads every vector; looking up the hits reads the chunks.
+    queries = np.random.RandomState(os.getpid()).standard_normal((20, dim)).astype(np.float32)
+    _, rows = vector_store.index.search(queries, 10)
+    for row in rows.ravel():
+        vector_store.docstore.search(vector_store.index_to_docstore_id[int(row)])
+    for row in range(len(vector_store.index_to_docstore_id)):
+        vector_store.docstore.search(vector_store.index_to_docstore_id[row])
+    print(json.dumps({"before": before, "after": memory_mb()}), flush=True)
+    sys.stdin.read() # Stay alive, so the pages stay shared, until the parent has every report
+
+
+def run_mode(cache_dir: str, mode: str, workers: int, dim: int) -> List[Dict]:
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_workers", "--child", cache_dir, "--mode", mode, "--dim", str(dim)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(workers)
+    ]
+    reports = [json.loads(p.stdout.readline()) for p in processes]
+    for p in processes:
+        p.stdin.close()
+        p.wait()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.mode, args.dim)
+        return
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        build(cache_dir, args.chunks, args.dim)
+        index_mb = os.path.getsize(os.path.join(cache_dir, "index", KEY, "index.faiss")) / 2**20
+        chunks_mb = os.path.getsize(os.path.join(cache_dir, "index", KEY, "chunks.jsonl")) / 2**20
+        print(f"{args.chunks} chunks, dim {args.dim}: index.faiss {index_mb:.0f}MB, chunks.jsonl {chunks_mb:.0f}MB; {args.workers} workers")
+        for mode in ("memory", "mmap"):
+            reports = run_mode(cache_dir, mode, args.workers, args.dim)
+            grown = [{k: r["after"][k] - r["before"][k] for k in r["after"]} for r in reports]
+            print(f"\n{mode}: per worker, after loading (growth)")
+            print(f"  rss     {np.mean([r['after']['rss'] for r in reports]):7.0f}MB ({np.mean([g['rss'] for g in grown]):+.0f})")
+            print(f"  private {np.mean([r['after']['private'] for r in reports]):7.0f}MB ({np.mean([g['private'] for g in grown]):+.0f})")
+            print(f"  pss     {np.mean([r['after']['pss'] for r in reports]):7.0f}MB ({np.mean([g['pss'] for g in grown]):+.0f})")
+            print(f"  total pss of all workers: {sum(r['after']['pss'] for r in reports):.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
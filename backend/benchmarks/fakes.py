@@ -0,0 +1,136 @@
+"""Offline stand-ins for Gemini so benchmarks measure our own overhead, not the network."""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that waits `latency` seconds and returns a canned answer.
+
+    With blocking=True the async path sleeps synchronously, which reproduces the old
+    behaviour of a sync LLM call running inside the event loop.
+    """
+    latency: float = 0.05
+    response: str = "Nebula has 13 years of experience shipping production AI systems in Python."
+    blocking: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return self._result()
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        # Spread the latency over the words so time-to-first-token is measurable.
+        words = self.response.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class FakeAgentChatModel(FakeChatModel):
+    """FakeChatModel that, like Gemini, first asks for fetch_job_description_content when
+    the user's message contains a URL, then answers once the tool result is in. A URL whose
+    page is already in the system prompt is answered directly."""
+
+    def _tool_call(self, messages: List[BaseMessage]) -> Optional[dict]:
+        last = messages[-1] if messages else None
+        match = re.search(r"https?://\S+", last.content) if isinstance(last, HumanMessage) else None
+        if match is None:
+            return None
+        url = match.group(0).rstrip(".,;:!?)")
+        if isinstance(messages[0], SystemMessage) and url in messages[0].content:
+            return None # The page was prefetched into the prompt, so answer directly
+        return {"name": "fetch_job_description_content", "args": {"url": url}, "id": f"call_{uuid.uuid4().hex[:12]}"}
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        call = self._tool_call(messages)
+        if call is not None:
+            return AIMessage(content="", tool_calls=[call])
+        return AIMessage(content=self.response)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        call = self._tool_call(messages)
+        if call is None:
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+            return
+        await asyncio.sleep(self.latency)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+        ]))
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors derived from the text; each call costs `latency` seconds,
+    however many texts it carries, like one round trip to a batching embedding API."""
+
+    def __init__(self, size: int = 128, latency: float = 0.02):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        vector = np.random.RandomState(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
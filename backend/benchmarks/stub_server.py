@@ -0,0 +1,86 @@
+"""Local stand-in for job boards: serves HTML job postings with scripts, styles and page
+chrome around the actual description, supports ETag/Last-Modified revalidation and can
+add latency. Runs in a background thread so benchmarks need no network access.
+"""
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+LAST_MODIFIED = "Mon, 06 Jan 2025 09:00:00 GMT"
+
+
+def job_page(job_id: str) -> bytes:
+    boilerplate = "<script>" + "window.analytics.track('view');" * 400 + "</script>"
+    styles = "<style>" + ".job{color:#333;margin:0 auto}" * 300 + "</style>"
+    nav = "<nav>" + "".join(f"<a href='/jobs/{i}'>Open role {i}</a>" for i in range(200)) + "</nav>"
+    body = (
+        f"<h1>Senior AI Engineer #{job_id}</h1>"
+        "<p>We are looking for an engineer with strong Python, PyTorch and Kubernetes experience "
+        "to build retrieval-augmented generation systems and ship LLM features to production.</p>"
+        "<ul><li>5+ years building ML systems</li><li>Experience with FAISS or other vector databases</li>"
+        "<li>Comfortable owning latency and cost budgets</li></ul>"
+    )
+    footer = "<footer>" + "Cookie policy. Terms. Careers. " * 100 + "</footer>"
+    html = f"<html><head>{styles}{boilerplate}</head><body>{nav}<main>{body}</main>{footer}</body></html>"
+    return html.encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server: "StubServer" = self.server.stub  # type: ignore[attr-defined]
+        server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if not self.path.startswith("/jobs/"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = job_page(self.path.rsplit("/", 1)[-1])
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1 @@
+# Lets pytest import `app` and `benchmarks` when run from backend/ (`python -m pytest` or `pytest`).
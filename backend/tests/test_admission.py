@@ -0,0 +1,193 @@
+"""Admission control: 429 responses, per-user token buckets, the LLM queue bound and request
+coalescing."""
+import asyncio
+
+import httpx
+import pytest
+
+from app import main
+from app.services import admission, session_store
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class EchoService:
+    async def process_message(self, user_id, user_message_content, session=None, retrieval_mode=None):
+        return "ok", []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """POST to the app in-process with a stub chat service; no warm-up, no LLM."""
+    monkeypatch.setattr(main, "get_chat_service", EchoService)
+    session_store.initialize_session_store()
+
+    def post(path: str, body: dict) -> httpx.Response:
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as c:
+                return await c.post(path, json=body)
+        return asyncio.run(run())
+    return post
+
+
+def test_rate_limited_request_gets_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(admission, "user_limiter", admission.UserRateLimiter(rate_per_minute=6, burst=1))
+    assert client("/api/chat", {"userId": "u1", "message": "first"}).status_code == 200
+    response = client("/api/chat", {"userId": "u1", "message": "second"})
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Too many requests"
+    assert 1 <= int(response.headers["Retry-After"]) <= 10 # One token per 10 s
+    assert client("/api/chat", {"userId": "u2", "message": "first"}).status_code == 200 # Buckets are per user
+
+
+def test_full_queue_gets_429_with_retry_after(client, monkeypatch):
+    limiter = admission.LLMLimiter(max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(admission, "llm_limiter", limiter)
+    monkeypatch.setattr(admission, "user_limiter", admission.UserRateLimiter(rate_per_minute=0, burst=1))
+    held = limiter.admit()
+    response = client("/api/chat", {"userId": "u1", "message": "hello"})
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Server busy"
+    assert int(response.headers["Retry-After"]) >= 1
+    held.release()
+    assert client("/api/chat", {"userId": "u1", "message": "hello"}).status_code == 200
+
+
+def test_busy_server_does_not_use_up_the_users_rate(client, monkeypatch):
+    limiter = admission.LLMLimiter(max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(admission, "llm_limiter", limiter)
+    monkeypatch.setattr(admission, "user_limiter", admission.UserRateLimiter(rate_per_minute=1, burst=1))
+    held = limiter.admit()
+    assert client("/api/chat", {"userId": "u1", "message": "hello"}).json()["detail"] == "Server busy"
+    held.release()
+    assert client("/api/chat", {"userId": "u1", "message": "hello"}).status_code == 200
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    limiter = admission.UserRateLimiter(rate_per_minute=60, burst=2)
+    limiter.check("u")
+    limiter.check("u")
+    with pytest.raises(admission.Rejected) as rejected:
+        limiter.check("u")
+    assert rejected.value.retry_after == 1
+    clock.now += 1.0
+    limiter.check("u") # One token back after a second
+    with pytest.raises(admission.Rejected):
+        limiter.check("u")
+    clock.now += 60.0
+    limiter.check("u")
+    limiter.check("u") # Refilled up to the burst, not beyond
+    with pytest.raises(admission.Rejected):
+        limiter.check("u")
+    assert limiter.rejected == 3
+
+
+def test_rate_zero_disables_the_bucket():
+    limiter = admission.UserRateLimiter(rate_per_minute=0, burst=1)
+    for _ in range(100):
+        limiter.check("u")
+
+
+def test_queue_bound_rejects_once_full():
+    limiter = admission.LLMLimiter(max_concurrency=2, max_queue=1)
+    tickets = [limiter.admit() for _ in range(3)]
+    with pytest.raises(admission.Rejected) as rejected:
+        limiter.admit()
+    assert rejected.value.retry_after >= 1
+    assert (limiter.admitted, limiter.rejected) == (3, 1)
+    tickets[0].release()
+    tickets[0].release() # Idempotent
+    assert limiter.admitted == 2
+    tickets.append(limiter.admit())
+    for ticket in tickets:
+        ticket.release()
+    assert limiter.admitted == 0
+
+
+def test_slots_bound_concurrent_calls():
+    limiter = admission.LLMLimiter(max_concurrency=2, max_queue=0)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.active_calls)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+    asyncio.run(run())
+    assert peak == 2
+    assert limiter.active_calls == 0
+
+
+def test_identical_requests_share_one_run():
+    coalescer = admission.Coalescer()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return object()
+
+    async def run():
+        return await asyncio.gather(*(coalescer.run("key", work) for _ in range(3)))
+    results = asyncio.run(run())
+    assert calls == 1
+    assert results[0] is results[1] is results[2]
+    assert coalescer.coalesced == 2
+    assert not coalescer.in_flight("key")
+
+
+def test_coalesced_failure_reaches_every_waiter():
+    coalescer = admission.Coalescer()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(*(coalescer.run("key", work) for _ in range(3)), return_exceptions=True)
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) and str(r) == "boom" for r in results)
+    assert not coalescer.in_flight("key")
+
+
+def test_coalesced_stream_is_replayed_to_every_subscriber():
+    coalescer = admission.Coalescer()
+    runs = 0
+
+    async def events():
+        nonlocal runs
+        runs += 1
+        for i in range(3):
+            await asyncio.sleep(0.005)
+            yield i
+        raise ValueError("boom")
+
+    async def consume(stream):
+        items = []
+        try:
+            async for item in stream:
+                items.append(item)
+        except ValueError as e:
+            items.append(str(e))
+        return items
+
+    async def run():
+        first = coalescer.stream("key", events)
+        await asyncio.sleep(0.012) # The second subscriber joins midway and still sees every item
+        second = coalescer.stream("key", events)
+        return await asyncio.gather(consume(first), consume(second))
+    assert asyncio.run(run()) == [[0, 1, 2, "boom"], [0, 1, 2, "boom"]]
+    assert runs == 1
+    assert coalescer.coalesced == 1
@@ -0,0 +1,146 @@
+"""The chat graph end to end with a fake LLM: job link prefetch, the fetch tool and sessions."""
+import asyncio
+from typing import Any, List
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from app.core.config import settings
+from app.services import chat_service, session_store, web_fetch
+from benchmarks.fakes import FakeAgentChatModel, FakeChatModel
+
+POSTING_URL = "https://jobs.example/42"
+POSTING = "Staff ML Engineer. Must know Rust, FAISS and retrieval-augmented generation."
+OTHER_URL = "https://jobs.example/43"
+OTHER_POSTING = "Data Engineer. Spark and Airflow."
+
+
+class RecordingChatModel(FakeAgentChatModel):
+    """FakeAgentChatModel that keeps the messages of every call."""
+    calls: List[List[BaseMessage]] = []
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        self.calls.append(list(messages))
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+class DroppedStreamChatModel(FakeChatModel):
+    """FakeChatModel whose first stream breaks off after two words with a retryable error."""
+    attempts: int = 0
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        self.attempts += 1
+        words = 0
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
+            words += 1
+            if self.attempts == 1 and words == 2:
+                raise ConnectionError("connection reset")
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Stub fetch_text: serves POSTING_URL and records every URL requested."""
+    requested: List[str] = []
+
+    async def fetch_text(url: str) -> str:
+        requested.append(url)
+        if url == OTHER_URL:
+            return OTHER_POSTING
+        return POSTING if url == POSTING_URL else "Error: Could not fetch content due to HTTP status 404."
+    monkeypatch.setattr(web_fetch, "fetch_text", fetch_text)
+    return requested
+
+
+@pytest.fixture
+def model():
+    return RecordingChatModel(latency=0, calls=[])
+
+
+def test_prefetched_posting_is_kept_for_follow_ups(fetches, model):
+    service = chat_service.ChatService(llm=model)
+    session_store.initialize_session_store()
+    store = session_store.get_session_store()
+
+    async def turn(message: str) -> List[BaseMessage]:
+        session = await store.get_session("u1")
+        _, new_messages = await service.process_message("u1", message, session=session)
+        await store.append_messages("u1", new_messages)
+        return new_messages
+
+    async def run():
+        first = await turn(f"How well does Nebula fit {POSTING_URL}?")
+        second = await turn("Does Nebula know the language that role asks for?")
+        return first, second
+    first, second = asyncio.run(run())
+
+    # Turn 1: the page is stored with the turn as a tool call and its result, answered in one LLM call.
+    assert [type(m) for m in first] == [chat_service.HumanMessage, AIMessage, ToolMessage, AIMessage]
+    assert first[1].tool_calls[0]["args"] == {"url": POSTING_URL}
+    assert first[2].content == POSTING and first[2].tool_call_id == first[1].tool_calls[0]["id"]
+    assert len(model.calls) == 2
+    # Turn 2: the posting still reaches the model from the history, without another fetch.
+    assert any(isinstance(m, ToolMessage) and m.content == POSTING for m in model.calls[1])
+    assert fetches == [POSTING_URL]
+    assert [type(m) for m in second] == [chat_service.HumanMessage, AIMessage]
+
+
+def tool_calls(*urls: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[
+        {"name": "fetch_job_description_content", "args": {"url": url}, "id": f"c{i}"} for i, url in enumerate(urls)
+    ])
+
+
+def run_tool_node(state) -> dict:
+    return asyncio.run(chat_service.tool_node(state, lambda progress: None))
+
+
+def test_tool_node_fetches_each_url_once(fetches):
+    missing = "https://jobs.example/404"
+    state = {"messages": [tool_calls(POSTING_URL, OTHER_URL, POSTING_URL + ".", missing)], "fetched_pages": {}}
+    result = run_tool_node(state)
+    assert sorted(fetches) == sorted([POSTING_URL, OTHER_URL, missing])
+    contents = [m.content for m in result["messages"]]
+    assert [m.tool_call_id for m in result["messages"]] == ["c0", "c1", "c2", "c3"]
+    assert contents[:2] == [POSTING, OTHER_POSTING]
+    assert contents[2] == f"The job posting at {POSTING_URL} is already provided above."
+    assert contents[3].startswith("Error:")
+    # Failed fetches are not remembered, so a later call in the turn tries again.
+    assert result["fetched_pages"] == {POSTING_URL: POSTING, OTHER_URL: OTHER_POSTING}
+
+
+def test_tool_node_reuses_pages_fetched_earlier_in_the_turn(fetches):
+    state = {"messages": [tool_calls(POSTING_URL, OTHER_URL)], "fetched_pages": {POSTING_URL: POSTING}}
+    result = run_tool_node(state)
+    assert fetches == [OTHER_URL]
+    assert [m.content for m in result["messages"]] == [
+        f"The job posting at {POSTING_URL} is already provided above.", OTHER_POSTING,
+    ]
+    assert result["fetched_pages"] == {POSTING_URL: POSTING, OTHER_URL: OTHER_POSTING}
+
+
+def test_history_with_a_posting_bypasses_the_semantic_cache(model, monkeypatch):
+    monkeypatch.setattr(chat_service.settings, "SEMANTIC_CACHE_ENABLED", True)
+    service = chat_service.ChatService(llm=model, embeddings=object())
+    call = AIMessage(content="", tool_calls=[{"name": "fetch_job_description_content", "args": {"url": POSTING_URL}, "id": "c1"}])
+    history = [chat_service.HumanMessage(content=POSTING_URL), call, ToolMessage(content=POSTING, tool_call_id="c1"), AIMessage(content="A fit.")]
+    assert not service._is_cacheable("What languages does Nebula know?", history)
+    assert service._is_cacheable("What languages does Nebula know?", [])
+
+
+def test_retry_after_streamed_tokens_resets_the_answer(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_SECONDS", 0)
+    model = DroppedStreamChatModel(latency=0)
+    service = chat_service.ChatService(llm=model)
+
+    async def run():
+        return [event async for event in service.stream_message("u1", "What does Nebula work on?")]
+    events = asyncio.run(run())
+
+    assert model.attempts == 2
+    names = [name for name, _ in events]
+    reset = names.index("reset")
+    # Tokens after the reset are the whole answer, as the client rebuilds it from scratch.
+    assert "token" in names[:reset]
+    assert "".join(data["text"] for name, data in events[reset:] if name == "token") == model.response
+    assert events[-1][0] == "done" and events[-1][1]["response"] == model.response
@@ -0,0 +1,89 @@
+"""Prompt assembly: chunk deduplication, budget allocation and section truncation."""
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.services import context
+
+PAGE = (
+    "Nebula led the retrieval team at Acme for four years. "
+    "She designed the FAISS-based search service that answers support questions. "
+    "Before that she built data pipelines in Python and Spark for the billing platform. "
+    "She mentors junior engineers and runs the internal LLM evaluation guild."
+)
+
+
+def test_duplicates_and_contained_chunks_are_dropped():
+    chunks = [PAGE[:120], PAGE[:120], PAGE[30:90], "  "]
+    assert context.dedupe_chunks(chunks, max_overlap=50) == [PAGE[:120]]
+
+
+def test_splitter_overlap_is_merged_in_either_order():
+    first, second = PAGE[:120], PAGE[90:220] # 30 characters of overlap, like CHUNK_OVERLAP
+    assert context.dedupe_chunks([first, second], max_overlap=50) == [PAGE[:220]]
+    assert context.dedupe_chunks([second, first], max_overlap=50) == [PAGE[:220]]
+
+
+def test_short_or_too_long_overlaps_are_not_merged():
+    # Under MIN_OVERLAP_CHARS the match is taken as coincidence.
+    assert len(context.dedupe_chunks([PAGE[:120], PAGE[110:220]], max_overlap=50)) == 2
+    # More than max_overlap is not what the splitter produces.
+    assert len(context.dedupe_chunks([PAGE[:120], PAGE[40:220]], max_overlap=50)) == 2
+
+
+def test_merged_spans_keep_retrieval_order_and_chain():
+    other = "Unrelated chunk about Nebula's hobbies: climbing and chess."
+    chunks = [PAGE[180:], other, PAGE[:120], PAGE[90:210]]
+    # PAGE[90:210] runs into PAGE[180:]; only the merged span then overlaps PAGE[:120].
+    assert context.dedupe_chunks(chunks, max_overlap=50) == [PAGE, other]
+
+
+def test_merge_spans_replaces_a_span_contained_in_a_later_chunk():
+    assert context._merge_spans([PAGE[30:90], PAGE[:120]], max_overlap=50) == [PAGE[:120]]
+
+
+def test_section_caps_cut_the_largest_sections_first():
+    sizes = {"context": 900, "job_description": 2000, "summary": 100, "history": 300}
+    assert context.section_caps(sizes, 5000) == sizes
+    caps = context.section_caps(sizes, 1400)
+    assert caps == {"summary": 100, "history": 300, "context": 500, "job_description": 500}
+    assert sum(caps.values()) == 1400
+    assert context.section_caps(sizes, -10) == dict.fromkeys(sizes, 0)
+
+
+def test_assemble_under_budget_only_dedupes():
+    question = [HumanMessage(content="Where did Nebula work?")]
+    prompt = context.assemble(50, [PAGE[:120], PAGE[90:220]], "", "", [], question, budget=4000)
+    assert prompt.truncated == []
+    assert prompt.chunks_merged == 1
+    assert prompt.inputs["context"] == PAGE[:220]
+    assert prompt.raw_tokens["context"] > prompt.tokens["context"]
+    assert prompt.inputs["messages"] == question
+
+
+def test_assemble_over_budget_cuts_the_job_posting_and_keeps_the_question():
+    posting = "Requirements: " + "Rust, Kubernetes and distributed systems. " * 200
+    call = AIMessage(content="", tool_calls=[{"name": "fetch_job_description_content", "args": {"url": "https://jobs.example/1"}, "id": "c1"}])
+    messages = [HumanMessage(content="Is Nebula a fit for https://jobs.example/1?"), call, ToolMessage(content=posting, tool_call_id="c1")]
+    prompt = context.assemble(100, [PAGE], "", "", [], messages, budget=600)
+
+    assert prompt.truncated == ["job_description"]
+    assert prompt.inputs["context"] == PAGE # Small sections are left whole
+    sent = prompt.inputs["messages"]
+    assert sent[:2] == messages[:2] # The question and the tool call are never cut
+    assert sent[2].tool_call_id == "c1" and sent[2].content.endswith("[truncated]")
+    assert sum(prompt.tokens.values()) <= 600 + 8 # Within the budget, give or take the marker
+
+
+def test_assemble_drops_old_turns_whole():
+    turns = []
+    for i in range(20):
+        call = AIMessage(content="", tool_calls=[{"name": "fetch_job_description_content", "args": {"url": f"https://jobs.example/{i}"}, "id": f"c{i}"}])
+        turns += [HumanMessage(content=f"Question {i}: " + "details " * 30), call, ToolMessage(content=f"Posting {i}", tool_call_id=f"c{i}"), AIMessage(content="Answer " * 30)]
+    question = [HumanMessage(content="And the last one?")]
+    prompt = context.assemble(100, [], "", "", turns, question, budget=400)
+
+    assert "history" in prompt.truncated
+    history = prompt.inputs["messages"][:-1]
+    assert 0 < len(history) < len(turns)
+    assert isinstance(history[0], HumanMessage) # Starts at a turn boundary
+    assert history == turns[-len(history):] # The newest turns, with every tool call and its result
+    assert prompt.tokens["history"] <= 400
@@ -0,0 +1,131 @@
+"""PDF ingestion and index reload on generated CVs with the hashing embedder (no network,
+no model download)."""
+import asyncio
+import os
+import random
+from typing import List
+
+import pytest
+
+from app.core.config import settings
+from app.services import chat_service, ingestion
+from app.services.embeddings import HashingEmbeddings
+from app.services.index_store import IndexStore
+from benchmarks.bench_ingestion import WORDS, make_pdf
+
+
+class PoisonedEmbeddings(HashingEmbeddings):
+    """HashingEmbeddings that fails every call containing a chunk with "poison" in it."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if any("poison" in text for text in texts):
+            raise RuntimeError("embedding service rejected the batch")
+        return super().embed_documents(texts)
+
+
+def write_cv(path: str, seed: int, extra: str = ""):
+    rng = random.Random(seed)
+    make_pdf(path, [" ".join(rng.choice(WORDS) for _ in range(12)) + extra for _ in range(40)])
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    """Three CVs; cv1 can be replaced to make it fail."""
+    paths = [str(tmp_path / f"cv{i}.pdf") for i in range(3)]
+    for i, path in enumerate(paths):
+        write_cv(path, i)
+    return paths
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IndexStore(str(tmp_path / "cache"))
+
+
+def statuses(report: ingestion.IngestionReport):
+    return {os.path.basename(f.path): f.status for f in report.files}
+
+
+def test_unreadable_pdf_is_reported_and_the_rest_indexed(pdfs, store):
+    with open(pdfs[1], "wb") as f:
+        f.write(b"not a pdf")
+    report = ingestion.ingest(pdfs, HashingEmbeddings(dim=64), store)
+    assert statuses(report) == {"cv0.pdf": "embedded", "cv1.pdf": "error", "cv2.pdf": "embedded"}
+    assert list(report.summary()["errors"]) == [pdfs[1]]
+    assert report.vector_store.index.ntotal == sum(f.chunks for f in report.files if f.status == "embedded")
+    assert report.lexical_index is not None
+
+
+def test_embedding_failure_marks_only_the_file_that_caused_it(pdfs, store, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_EMBED_BATCH_SIZE", 1000) # One batch spanning every file
+    write_cv(pdfs[1], 1, extra=" poison")
+    report = ingestion.ingest(pdfs, PoisonedEmbeddings(dim=64), store)
+    assert statuses(report) == {"cv0.pdf": "embedded", "cv1.pdf": "error", "cv2.pdf": "embedded"}
+    assert "embedding service rejected the batch" in report.files[1].error
+    assert report.vector_store.index.ntotal == report.files[0].chunks + report.files[2].chunks
+
+
+def test_small_sets_are_parsed_without_the_process_pool(pdfs, store, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("started the parse pool for three small PDFs")
+    monkeypatch.setattr(ingestion, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 4)
+    report = ingestion.ingest(pdfs, HashingEmbeddings(dim=64), store)
+    assert set(statuses(report).values()) == {"embedded"}
+
+
+def test_partial_build_is_versioned_by_the_files_it_indexed(pdfs, store):
+    # The embedding service fails on cv1 for a while; the files themselves do not change.
+    write_cv(pdfs[1], 1, extra=" poison")
+    partial = ingestion.ingest(pdfs, PoisonedEmbeddings(dim=64), store)
+    assert statuses(partial)["cv1.pdf"] == "error"
+
+    again = ingestion.ingest(pdfs, PoisonedEmbeddings(dim=64), store)
+    # Not cached as a whole: the failed file is tried again, the others come from their file entries.
+    assert statuses(again) == {"cv0.pdf": "cached", "cv1.pdf": "error", "cv2.pdf": "cached"}
+    assert again.version == partial.version
+
+    full = ingestion.ingest(pdfs, HashingEmbeddings(dim=64), store)
+    assert statuses(full)["cv1.pdf"] == "embedded"
+    assert full.version != partial.version # So a reload swaps the complete index in
+    assert set(statuses(ingestion.ingest(pdfs, HashingEmbeddings(dim=64), store)).values()) == {"cached"}
+
+
+@pytest.fixture
+def reload(tmp_path, monkeypatch):
+    """chat_service.reload_index over tmp_path, starting from an empty snapshot."""
+    monkeypatch.setattr(settings, "PDF_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(settings, "INDEX_CACHE_DIR", str(tmp_path / "reload_cache"))
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setattr(settings, "HASHING_EMBEDDING_DIM", 64)
+    monkeypatch.setattr(settings, "EMBEDDING_WORKERS", 1)
+    monkeypatch.setattr(chat_service, "embeddings_instance", None)
+    monkeypatch.setattr(chat_service, "chat_service_instance", None)
+    monkeypatch.setattr(chat_service, "index_snapshot", chat_service.IndexSnapshot())
+    return lambda: asyncio.run(chat_service.reload_index())
+
+
+def test_reload_swaps_in_a_changed_index(pdfs, reload):
+    first = reload()
+    assert first["status"] == "swapped" and first["previous_version"] is None
+    snapshot = chat_service.index_snapshot
+    assert snapshot.version == first["version"] and snapshot.vector_store is not None
+    assert reload()["status"] == "unchanged"
+    assert chat_service.index_snapshot is snapshot
+
+    write_cv(pdfs[0], 100) # An edited CV
+    second = reload()
+    assert second["status"] == "swapped" and second["previous_version"] == first["version"]
+    assert chat_service.index_snapshot.version == second["version"] != first["version"]
+
+
+def test_reload_keeps_the_old_index_when_every_pdf_fails(pdfs, reload):
+    reload()
+    snapshot = chat_service.index_snapshot
+    for path in pdfs:
+        with open(path, "wb") as f:
+            f.write(b"not a pdf")
+    result = reload()
+    assert result["status"] == "failed" and result["version"] == snapshot.version
+    assert result["ingestion"]["files"] == {"error": 3}
+    assert chat_service.index_snapshot is snapshot
@@ -0,0 +1,101 @@
+"""BM25 scoring, auto-mode routing and reciprocal rank fusion over a small in-memory index."""
+import asyncio
+import math
+from typing import List
+
+import pytest
+from langchain_community.vectorstores import FAISS
+
+from app.services import chat_service
+from app.services.bm25 import BM25Index, query_terms
+from app.services.embeddings import HashingEmbeddings
+
+CHUNKS = [
+    "Nebula ran Kubernetes clusters for the ML platform team.",
+    "Built retrieval pipelines in Python with FAISS and PyTorch.",
+    "Python Python Python scripting for data cleanup.",
+    "Led a team of five engineers shipping LLM features to production at Acme.",
+]
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    """HashingEmbeddings that counts query embeddings."""
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.queries: List[str] = []
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings(dim=256)
+
+
+@pytest.fixture
+def snapshot(embeddings):
+    store = FAISS.from_texts(CHUNKS, embeddings)
+    return chat_service.IndexSnapshot(store, "v1", lexical_index=BM25Index.from_vector_store(store))
+
+
+def retrieve(snapshot, query: str, mode: str = "auto", k: int = 2):
+    docs, used = asyncio.run(chat_service.retrieve(snapshot, query, mode, k))
+    return [d.page_content for d in docs], used
+
+
+def test_bm25_matches_the_textbook_score():
+    index = BM25Index(["kubernetes python", "python python go", "go"], k1=1.5, b=0.75)
+    avg_length = 2.0
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5)) # "python" occurs in 2 of 3 rows
+
+    def expected(tf: int, length: int) -> float:
+        return idf * tf * 2.5 / (tf + 1.5 * (1 - 0.75 + 0.75 * length / avg_length))
+    results = dict(index.search("python", k=3))
+    assert set(results) == {0, 1} # Rows without the term are never returned
+    assert results[0] == pytest.approx(expected(1, 2))
+    assert results[1] == pytest.approx(expected(2, 3))
+
+
+def test_bm25_prefers_rare_terms_and_ignores_stopwords():
+    index = BM25Index(CHUNKS)
+    assert query_terms("What is the experience with FAISS?") == ["faiss"]
+    [(row, _)] = index.search("Experience with FAISS", k=3)
+    assert row == 1
+    # "faiss" is in one chunk and "python" in two, so the FAISS chunk wins over repeated Python.
+    assert index.search("python faiss", k=1)[0][0] == 1
+
+
+def test_auto_mode_answers_keyword_lookups_from_bm25(snapshot, embeddings):
+    texts, used = retrieve(snapshot, "Kubernetes")
+    assert used == "lexical"
+    assert texts == [CHUNKS[0]]
+    assert embeddings.queries == [] # No embedding call
+
+
+def test_auto_mode_uses_hybrid_for_questions(snapshot, embeddings):
+    texts, used = retrieve(snapshot, "How did Nebula lead engineers shipping LLM features?")
+    assert used == "hybrid"
+    assert texts[0] == CHUNKS[3]
+    assert len(embeddings.queries) == 1
+    # A term missing from the corpus also needs the vector search.
+    assert retrieve(snapshot, "Terraform")[1] == "hybrid"
+
+
+def test_without_a_lexical_index_every_mode_is_vector(snapshot):
+    snapshot = chat_service.IndexSnapshot(snapshot.vector_store, "v1")
+    assert retrieve(snapshot, "Kubernetes", mode="lexical")[1] == "vector"
+    with pytest.raises(ValueError):
+        retrieve(snapshot, "Kubernetes", mode="fuzzy")
+
+
+def test_reciprocal_rank_fusion():
+    rankings = [[1, 2, 3], [3, 4]]
+    # Row 3 is in both rankings; 2 and 4 tie at rank two and keep their first-seen order.
+    assert chat_service.reciprocal_rank_fusion(rankings, limit=4, k=60) == [3, 1, 2, 4]
+    assert chat_service.reciprocal_rank_fusion(rankings, limit=2, k=60) == [3, 1]
+    # A small k lets a single top rank beat two low ones.
+    assert chat_service.reciprocal_rank_fusion([[1, 2, 3], [5, 6, 3]], limit=1, k=0) == [1]
+    assert chat_service.reciprocal_rank_fusion([[1, 2, 3], [5, 6, 3]], limit=1, k=60) == [3]
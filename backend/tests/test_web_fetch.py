@@ -0,0 +1,110 @@
+"""web_fetch against the local stub job board in benchmarks.stub_server (no network)."""
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import web_fetch
+from app.services.memory import count_tokens
+from benchmarks.stub_server import StubServer
+
+
+@pytest.fixture
+def server():
+    web_fetch.page_cache.clear()
+    with StubServer(latency=0.05) as stub:
+        yield stub
+    web_fetch.page_cache.clear()
+
+
+def fetch(*urls: str):
+    """fetch_text for every url concurrently, on a fresh event loop and pooled client."""
+    async def run():
+        try:
+            return await asyncio.gather(*(web_fetch.fetch_text(url) for url in urls))
+        finally:
+            await web_fetch.close_http_client()
+    return asyncio.run(run())
+
+
+def test_strips_scripts_styles_and_page_chrome(server):
+    [text] = fetch(f"{server.base_url}/jobs/7")
+    assert "Senior AI Engineer #7" in text
+    assert "5+ years building ML systems" in text
+    assert "window.analytics" not in text # <script>
+    assert ".job{" not in text # <style>
+    assert "Open role" not in text # <nav>
+    assert "Cookie policy" not in text # <footer>
+
+
+def test_text_is_capped_to_max_tokens(server, monkeypatch):
+    monkeypatch.setattr(settings, "WEB_FETCH_MAX_TOKENS", 10)
+    [text] = fetch(f"{server.base_url}/jobs/7")
+    assert text
+    assert count_tokens(text) <= 10
+
+
+def test_page_wrapped_in_a_form_keeps_its_text():
+    # ASP.NET and similar job boards put the whole page inside one <form>.
+    extractor = web_fetch.HTMLTextExtractor()
+    extractor.feed("<body><form id='aspnetForm'><h1>Data Engineer</h1><p>Spark and Airflow.</p>")
+    extractor.feed("<select><option>Sort by</option></select><button>Apply now</button></form></body>")
+    extractor.close()
+    assert extractor.text() == "Data Engineer\nSpark and Airflow."
+
+
+def test_stops_reading_after_max_bytes(server, monkeypatch):
+    # The stub page puts about 25 kB of styles and scripts before the description.
+    monkeypatch.setattr(settings, "WEB_FETCH_MAX_BYTES", 1000)
+    [text] = fetch(f"{server.base_url}/jobs/7")
+    assert "Senior AI Engineer" not in text
+
+
+def test_cache_hit_makes_no_request(server):
+    url = f"{server.base_url}/jobs/7"
+    [first] = fetch(url)
+    [second] = fetch(url)
+    assert second == first
+    assert server.requests == 1
+
+
+def test_expired_page_is_revalidated_with_304(server):
+    url = f"{server.base_url}/jobs/7"
+    [first] = fetch(url)
+    web_fetch.page_cache.get(url).expires_at = 0
+    [second] = fetch(url)
+    assert second == first
+    assert (server.requests, server.not_modified) == (2, 1)
+    assert web_fetch.page_cache.get(url).expires_at > time.monotonic() # Fresh again after the 304
+    fetch(url)
+    assert server.requests == 2
+
+
+def test_concurrent_fetches_of_one_url_share_a_request(server):
+    url = f"{server.base_url}/jobs/7"
+    texts = fetch(*[url] * 10)
+    assert len(set(texts)) == 1
+    assert "Senior AI Engineer #7" in texts[0]
+    assert server.requests == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_other_waiters(server):
+    url = f"{server.base_url}/jobs/7"
+
+    async def run():
+        try:
+            first = asyncio.ensure_future(web_fetch.fetch_text(url))
+            second = asyncio.ensure_future(web_fetch.fetch_text(url))
+            await asyncio.sleep(0.01) # Both are waiting on the stub's 50 ms latency
+            first.cancel()
+            text = await second
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return text
+        finally:
+            await web_fetch.close_http_client()
+    text = asyncio.run(run())
+    assert "Senior AI Engineer #7" in text
+    assert server.requests == 1
+    assert web_fetch.page_cache.get(url).text == text # The shared download still finished and was cached
@@ -85,41 +85,83 @@ const ChatPage: React.FC = () => {
       return;
     }
 
-    fetch('http://localhost:8000/api/chat', {
+    // Placeholder AI message that is filled in as progress/token events stream in
+    const aiMessageId = (Date.now() + 1).toString();
+    setMessages(prevMessages => [...prevMessages, { id: aiMessageId, text: "Thinking...", sender: 'ai', timestamp: new Date() }]);
+    const updateAiMessage = (text: string) => {
+      setMessages(prevMessages => prevMessages.map(msg => (msg.id === aiMessageId ? { ...msg, text } : msg)));
+    };
+
+    streamChat(userId, userMessage.text, updateAiMessage)
+    .catch(error => {
+      console.error('Error fetching AI response:', error);
+      // Show the failure in place of the placeholder message
+      updateAiMessage("Sorry, I couldn't connect to the AI. Please try again later.");
+    });
+  };
+
+  // POSTs to the SSE endpoint and renders tokens as they arrive.
+  // EventSource only supports GET, so the stream is read and parsed by hand.
+  const streamChat = async (userId: string, text: string, updateAiMessage: (text: string) => void) => {
+    const response = await fetch('http://localhost:8000/api/chat/stream', {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ userId: userId, message: userMessage.text }), // Used userId state
-    })
-    .then(response => response.json())
-    .then(data => {
-      if (data.response) {
-        const aiResponse: Message = { id: (Date.now() + 1).toString(), text: data.response, sender: 'ai', timestamp: new Date() };
-        setMessages(prevMessages => [...prevMessages, aiResponse]);
-      } else {
-        console.error('AI response not found in data:', data);
-        const errorResponse: Message = {
-          id: (Date.now() + 1).toString(),
-          text: "Sorry, I received an unexpected response from the AI. Please try again later.",
-          sender: 'ai',
-          timestamp: new Date()
-        };
-        setMessages(prevMessages => [...prevMessages, errorResponse]);
-      }
-    })
-    .catch(error => {
-      console.error('Error fetching AI response:', error);
-      // Optionally, handle this case in the UI, e.g., show an error message
-      // For example, you could add a message to the chat indicating the error:
-      const errorResponse: Message = {
-        id: (Date.now() + 1).toString(),
-        text: "Sorry, I couldn't connect to the AI. Please try again later.",
-        sender: 'ai',
-        timestamp: new Date()
-      };
-      setMessages(prevMessages => [...prevMessages, errorResponse]);
+      body: JSON.stringify({ userId: userId, message: text }),
     });
+    if (!response.ok || !response.body) {
+      throw new Error(`Unexpected response status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let streamedText = '';
+    let finished = false;
+
+    const handleEvent = (event: string, data: any) => {
+      if (event === 'progress' && !streamedText) {
+        updateAiMessage(`${data.message}...`);
+      } else if (event === 'token') {
+        streamedText += data.text;
+        updateAiMessage(streamedText);
+      } else if (event === 'reset') {
+        // The model call is being retried and will stream its answer again
+        streamedText = '';
+      } else if (event === 'done') {
+        finished = true;
+        updateAiMessage(data.response);
+      } else if (event === 'error') {
+        finished = true;
+        console.error('AI response error:', data);
+        updateAiMessage("Sorry, I received an unexpected response from the AI. Please try again later.");
+      }
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // SSE events are separated by a blank line
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (data) handleEvent(event, JSON.parse(data));
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+
+    if (!finished) {
+      throw new Error('Stream ended before the response completed');
+    }
   };
 
   const handleKeyPress = (event: React.KeyboardEvent<HTMLInputElement>) => {